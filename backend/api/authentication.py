@@ -0,0 +1,161 @@
+"""
+Authentication of the customer app.
+
+Customers sign in with JWTs (SIMPLE_JWT in settings): an access token sent
+as "Authorization: Bearer <token>" and a refresh token to get new ones.
+CustomerJWTAuthentication checks the signature and expiry and builds the
+user from the token's claims, so authenticating a request makes no query;
+the customer's profile is only loaded by the views that use it.
+
+Revoked tokens are kept in the cache until they would have expired anyway:
+single tokens by their jti on logout, and every token a user was issued up
+to a point in time when the account is deactivated. Both are read with one
+get_many per request. Like OTPs, the revocation list has to live in a cache
+shared by all workers (REDIS_URL) in production.
+
+Older app builds send opaque DRF tokens. CachedTokenAuthentication keeps
+each token with its user and customer profile in the cache for
+AUTH_CACHE_TIMEOUT seconds, and the customer of a JWT is cached the same
+way, so neither the token join nor the profile is queried on most
+requests. api.signals drops the entries when a token is deleted or a user
+or customer is saved or deleted.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Customer
+
+CUSTOMER_ID_CLAIM = 'customer_id'
+
+
+def _revoked_key(jti):
+    return f"jwt:revoked:{jti}"
+
+
+def _not_before_key(user_id):
+    return f"jwt:user:{user_id}:not_before"
+
+
+def revoke_token(token):
+    """Reject a validated access or refresh token from now until it expires."""
+    remaining = int(token['exp'] - time.time())
+    if remaining > 0:
+        cache.set(_revoked_key(token[jwt_settings.JTI_CLAIM]), True, timeout=remaining)
+
+
+def revoke_user_tokens(user_id):
+    """Reject every token issued to a user so far."""
+    lifetime = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+    cache.set(_not_before_key(user_id), int(time.time()), timeout=int(lifetime.total_seconds()) + 1)
+
+
+def is_revoked(token):
+    keys = [_revoked_key(token[jwt_settings.JTI_CLAIM]), _not_before_key(token[jwt_settings.USER_ID_CLAIM])]
+    found = cache.get_many(keys)
+    if keys[0] in found:
+        return True
+    not_before = found.get(keys[1])
+    return not_before is not None and token['iat'] <= not_before
+
+
+def _auth_cache_timeout():
+    return getattr(settings, 'AUTH_CACHE_TIMEOUT', 300)
+
+
+def _token_key(key):
+    # The key is a credential, keep it out of the cache's key space
+    return f"authtoken:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def _customer_key(customer_id):
+    return f"customer:{customer_id}"
+
+
+def forget_tokens(keys):
+    cache.delete_many([_token_key(key) for key in keys])
+
+
+def forget_customer(customer_id):
+    cache.delete(_customer_key(customer_id))
+
+
+def cached_customer(customer_id):
+    """The customer, from the cache when possible."""
+    customer = cache.get(_customer_key(customer_id))
+    if customer is None:
+        customer = Customer.objects.get(pk=customer_id)
+        cache.set(_customer_key(customer_id), customer, timeout=_auth_cache_timeout())
+    return customer
+
+
+def tokens_for(user, customer=None):
+    """A refresh token and its access token for `user`, as the login responses return them."""
+    refresh = RefreshToken.for_user(user)
+    if customer is None:
+        customer_id = Customer.objects.filter(user=user).values_list('pk', flat=True).first()
+    else:
+        customer_id = customer.pk
+    # Copied to the access tokens made from it
+    refresh[CUSTOMER_ID_CLAIM] = customer_id
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+class CustomerTokenUser(TokenUser):
+    """The user of a customer JWT, with the customer loaded on first use."""
+
+    @cached_property
+    def customer_profile(self):
+        customer_id = self.token.get(CUSTOMER_ID_CLAIM)
+        if customer_id is None:
+            raise Customer.DoesNotExist('The token has no customer')
+        return cached_customer(customer_id)
+
+
+class CustomerJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_revoked'})
+        return token
+
+    def get_user(self, validated_token):
+        if jwt_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return CustomerTokenUser(validated_token)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with the token, its user and their customer profile cached."""
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user', 'user__customer_profile').get(key=key)
+            except model.DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, token, timeout=_auth_cache_timeout())
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+
+# JWTs, and the opaque tokens of app builds from before them
+CUSTOMER_AUTHENTICATION_CLASSES = [CustomerJWTAuthentication, CachedTokenAuthentication]
+
+# Staff signed in to the admin site, or with their API token
+STAFF_AUTHENTICATION_CLASSES = [SessionAuthentication, CachedTokenAuthentication]
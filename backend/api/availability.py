@@ -0,0 +1,170 @@
+"""
+Free time of team members.
+
+A day is split into slots of settings.AVAILABILITY_SLOT_MINUTES, and each
+staff member's day is a bitmap (a plain int) with bit i set when slot i is
+free: the working hours with every booked appointment cleared. Something
+lasting n slots fits wherever n consecutive bits are set, which is found by
+AND-ing the bitmap with itself shifted n - 1 times.
+
+week_availability() builds the grid of a salon with three queries (staff,
+working hours and appointments) and one cache lookup for the slots held by
+customers checking out (api.holds), however many staff and days are asked for.
+"""
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Appointment, TeamMember, WorkingHours
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def slot_minutes():
+    return getattr(settings, 'AVAILABILITY_SLOT_MINUTES', 15)
+
+
+def slots_per_day():
+    return MINUTES_PER_DAY // slot_minutes()
+
+
+def slot_of(value, round_up=False):
+    """Index of the slot containing `value`, or of the next slot boundary with round_up."""
+    minutes = value.hour * 60 + value.minute
+    if round_up:
+        partial = value.second or value.microsecond or minutes % slot_minutes()
+        return minutes // slot_minutes() + (1 if partial else 0)
+    return minutes // slot_minutes()
+
+
+def slot_label(index):
+    """"HH:MM" of the start of slot `index`; the end of the day is "24:00"."""
+    minutes = index * slot_minutes()
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def span(start, end):
+    """Bitmap with the slots in [start, end) set."""
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def time_span(start_time, end_time):
+    """Bitmap of every slot touched by [start_time, end_time), at least one slot."""
+    start = slot_of(start_time)
+    end = slot_of(end_time, round_up=True) if end_time else start
+    return span(start, max(end, start + 1))
+
+
+def fitting(free, length):
+    """Bitmap of the slots where `length` consecutive free slots start."""
+    fits = free
+    for shift in range(1, length):
+        fits &= free >> shift
+        if not fits:
+            break
+    return fits
+
+
+def bits(bitmap):
+    """Indexes of the set bits, lowest first."""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def runs(bitmap):
+    """(start, end) slot ranges of consecutive set bits, lowest first."""
+    while bitmap:
+        low = bitmap & -bitmap
+        # Adding the lowest set bit carries through its run, clearing it and
+        # setting the first bit past its end
+        carried = bitmap + low
+        yield low.bit_length() - 1, (carried & ~bitmap).bit_length() - 1
+        bitmap &= carried
+
+
+def default_hours():
+    start, end = getattr(settings, 'DEFAULT_WORKING_HOURS', ('09:00', '21:00'))
+    return time.fromisoformat(start), time.fromisoformat(end)
+
+
+def free_bitmaps(business_id, staff_ids, dates, holds=True, owner=None):
+    """
+    {staff_id: {date: bitmap of free slots}} for the given team members of a
+    business on each of `dates`, with the past slots of today cleared. With
+    `holds` the slots held in api.holds by anyone but `owner` are cleared too.
+    """
+    dates = sorted(dates)
+    shifts = {}
+    for staff_id, weekday, start_time, end_time in WorkingHours.objects.filter(
+        business_id=business_id, staff_id__in=staff_ids
+    ).values_list('staff_id', 'weekday', 'start_time', 'end_time'):
+        weekdays = shifts.setdefault(staff_id, {})
+        weekdays[weekday] = weekdays.get(weekday, 0) | span(slot_of(start_time), slot_of(end_time, round_up=True))
+    default_start, default_end = default_hours()
+    default = span(slot_of(default_start), slot_of(default_end, round_up=True))
+
+    free = {}
+    for staff_id in staff_ids:
+        weekdays = shifts.get(staff_id)
+        free[staff_id] = {day: weekdays.get(day.weekday(), 0) if weekdays else default for day in dates}
+
+    if dates and staff_ids:
+        appointments = Appointment.objects.filter(
+            staff_id__in=staff_ids,
+            appointment_date__range=(dates[0], dates[-1]),
+        ).exclude(status='Cancelled')
+        for staff_id, day, start_time, end_time in appointments.values_list(
+            'staff_id', 'appointment_date', 'appointment_time', 'end_time'
+        ):
+            if day in free[staff_id]:
+                free[staff_id][day] &= ~time_span(start_time, end_time)
+
+    now = timezone.localtime()
+    if now.date() in dates:
+        past = span(0, slot_of(now.time(), round_up=True))
+        for days in free.values():
+            days[now.date()] &= ~past
+
+    if holds:
+        from .holds import slot_holds
+
+        held = slot_holds.held(free, exclude_owner=owner)
+        for staff_id, days in free.items():
+            for day in days:
+                days[day] &= ~held[staff_id][day]
+    return free
+
+
+def week_availability(business_id, start_date, days=7, staff_ids=None, duration_mins=None):
+    """
+    The availability grid of a salon: for every staff member and each day from
+    start_date, the free time ranges and the start times at which something
+    lasting duration_mins (one slot by default) fits.
+    """
+    staff = TeamMember.objects.filter(business_id=business_id).order_by('id').only('first_name', 'last_name')
+    if staff_ids is not None:
+        staff = staff.filter(id__in=staff_ids)
+    staff = list(staff)
+    dates = [start_date + timedelta(days=offset) for offset in range(days)]
+    free = free_bitmaps(business_id, [member.id for member in staff], dates)
+    length = max(1, -(-(duration_mins or 0) // slot_minutes()))
+    return [
+        {
+            'staff_id': member.id,
+            'name': str(member),
+            'days': [
+                {
+                    'date': day,
+                    'free': [{'start': slot_label(start), 'end': slot_label(end)} for start, end in runs(bitmap)],
+                    'slots': [slot_label(start) for start in bits(fitting(bitmap, length))],
+                }
+                for day, bitmap in free[member.id].items()
+            ],
+        }
+        for member in staff
+    ]
@@ -0,0 +1,118 @@
+"""
+Booking appointments without double booking a team member.
+
+Two appointments of the same staff member conflict when they are on the same
+date and their [appointment_time, end_time) ranges overlap. Cancelled
+appointments never conflict.
+
+On PostgreSQL the appointment_staff_no_overlap exclusion constraint (see
+migration 0054) rejects the conflicting row itself, with a GiST index lookup,
+so concurrent bookings need no locking in the application. Where it is not
+installed (other databases, or PostgreSQL without the btree_gist extension)
+bookings of a staff member are serialized by locking their TeamMember row,
+and overlapping appointments are looked up in appt_staff_date_idx.
+"""
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Appointment, TeamMember
+
+NO_OVERLAP_CONSTRAINT = 'appointment_staff_no_overlap'
+
+# True while save_appointment() replaces the services and packages of an
+# appointment whose totals it has already set, see api.signals
+totals_set_by_booking = ContextVar('totals_set_by_booking', default=False)
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The staff member is already booked at that time.'
+    default_code = 'booking_conflict'
+
+
+_constraint_installed = {}
+
+
+def has_overlap_constraint(using=DEFAULT_DB_ALIAS):
+    """Whether the database enforces NO_OVERLAP_CONSTRAINT, checked once per process."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    if using not in _constraint_installed:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [NO_OVERLAP_CONSTRAINT])
+            _constraint_installed[using] = cursor.fetchone() is not None
+    return _constraint_installed[using]
+
+
+def find_conflict(appointment):
+    """
+    An appointment of the same staff member overlapping `appointment`, or
+    None. Existing rows are not assumed to be disjoint, so the lookup is a
+    range scan of the member's day in the (staff, date, time) index up to
+    where `appointment` ends.
+    """
+    start, end = appointment.appointment_time, appointment.end_time
+    if appointment.staff_id is None or end is None or end <= start:
+        return None
+    return (
+        Appointment.objects.filter(
+            staff_id=appointment.staff_id,
+            appointment_date=appointment.appointment_date,
+            appointment_time__lt=end,
+            end_time__gt=start,
+        )
+        .exclude(status='Cancelled')
+        .exclude(pk=appointment.pk)
+        .only('appointment_time', 'end_time')
+        .first()
+    )
+
+
+def save_appointment(appointment, services=None, packages=None, reschedule=True):
+    """
+    Insert or update `appointment`, raising BookingConflict if its staff
+    member is already booked for any of that time and ValidationError if it
+    does not last any time at all. When services (and
+    packages) are given the totals are computed from them and the
+    many-to-many sets replaced in the same transaction.
+
+    Pass reschedule=False for an edit that changes neither the time, the
+    staff member nor what is booked, such as a status change: the row is
+    saved without checking its duration or looking for conflicts.
+    """
+    if services is not None:
+        packages = packages or []
+        appointment.calculate_totals(services, packages)
+    else:
+        appointment.end_time = appointment.compute_end_time()
+    if reschedule and (appointment.end_time is None or appointment.end_time <= appointment.appointment_time):
+        raise ValidationError({'services': 'An appointment needs at least one service or package that takes time.'})
+    locked = (
+        reschedule
+        and appointment.staff_id is not None
+        and appointment.status != 'Cancelled'
+        and not has_overlap_constraint()
+    )
+    try:
+        with transaction.atomic():
+            if locked:
+                list(TeamMember.objects.select_for_update().filter(pk=appointment.staff_id).values_list('pk'))
+                if find_conflict(appointment) is not None:
+                    raise BookingConflict()
+            appointment.save()
+            if services is not None:
+                token = totals_set_by_booking.set(True)
+                try:
+                    appointment.services.set(services)
+                    appointment.packages.set(packages)
+                finally:
+                    totals_set_by_booking.reset(token)
+    except IntegrityError as exc:
+        if NO_OVERLAP_CONSTRAINT in str(exc):
+            raise BookingConflict() from exc
+        raise
+    return appointment
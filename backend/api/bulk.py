@@ -0,0 +1,278 @@
+"""
+Batch create, update and delete of a business's services, packages, service
+categories and team members in one request and one transaction.
+
+The body is {"create": [...], "update": [{"id": ..., ...}], "delete": [ids]},
+any of the three optional. The business is looked up once and every item is
+validated before anything is written; references to other rows (a
+service's category, a category's parent) and unique columns are checked
+against sets loaded with one query for the whole batch rather than per item.
+If any item is invalid nothing is written and the errors come back per
+item, in the order of the request, with {} for the valid ones. Otherwise
+deletes, updates and creates run in that order with one DELETE, bulk_update
+and bulk_create each.
+
+bulk_create and bulk_update send no signals, so the business's cached
+responses are invalidated once at the end.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_business_version
+from .models import Packages, ServiceCategory, Services, TeamMember
+from .serializers import PackagesSerializer, ServiceCategorySerializer, ServicesSerializer, TeamMemberSerializer
+
+NOT_FOUND = 'No such row in this business.'
+REPEATED = 'Repeated in this request.'
+
+
+class ServiceItemSerializer(serializers.ModelSerializer):
+    category_id = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = Services
+        fields = ['service_name', 'service_type', 'duration_in_mins', 'price', 'category_id']
+
+
+class PackageItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Packages
+        fields = ['package_name', 'package_duration_in_mins', 'package_price']
+
+
+class CategoryItemSerializer(serializers.ModelSerializer):
+    parent_id = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = ServiceCategory
+        fields = ['name', 'description', 'parent_id']
+
+
+class TeamMemberItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TeamMember
+        fields = ['first_name', 'last_name', 'phone_number', 'member_email', 'date_of_joining', 'access_type']
+        # Checked for the whole batch by TeamMemberBulk.check()
+        extra_kwargs = {
+            'phone_number': {'validators': []},
+            'member_email': {'validators': []},
+        }
+
+
+class BulkMutation:
+    model = None
+    item_serializer_class = None
+    serializer_class = None
+    max_items = 500
+
+    def __init__(self, business):
+        self.business = business
+
+    def run(self, data):
+        """
+        Validate and apply a batch. Returns {'created': [...], 'updated': [...],
+        'deleted': [ids]}, or raises ValidationError with the per item errors.
+        """
+        create, update, delete = self.parse(data)
+        instances = {}
+        if update or delete:
+            ids = [item.get('id') for item in update if isinstance(item, dict)] + delete
+            queryset = self.model.objects.filter(business=self.business, pk__in=[pk for pk in ids if isinstance(pk, int)])
+            instances = {instance.pk: instance for instance in queryset}
+
+        errors = {'create': [], 'update': [], 'delete': []}
+        creates, updates, deletes = [], [], []
+        for item in create:
+            serializer = self.item_serializer_class(data=item)
+            errors['create'].append({} if serializer.is_valid() else serializer.errors)
+            creates.append(serializer.validated_data if not errors['create'][-1] else None)
+        updated_ids = set()
+        for item in update:
+            pk = item.get('id') if isinstance(item, dict) else None
+            if not isinstance(pk, int) or pk not in instances:
+                errors['update'].append({'id': [NOT_FOUND]})
+                updates.append(None)
+            elif pk in updated_ids:
+                errors['update'].append({'id': [REPEATED]})
+                updates.append(None)
+            else:
+                updated_ids.add(pk)
+                serializer = self.item_serializer_class(instances[pk], data=item, partial=True)
+                errors['update'].append({} if serializer.is_valid() else serializer.errors)
+                updates.append((instances[pk], serializer.validated_data) if not errors['update'][-1] else None)
+        for pk in delete:
+            if not isinstance(pk, int) or pk not in instances:
+                errors['delete'].append({'id': [NOT_FOUND]})
+            elif pk in deletes:
+                errors['delete'].append({'id': [REPEATED]})
+            elif pk in updated_ids:
+                errors['delete'].append({'id': ['Also updated in this request.']})
+            else:
+                errors['delete'].append({})
+                deletes.append(pk)
+
+        self.check(creates, updates, deletes, errors)
+        if any(any(item_errors) for item_errors in errors.values()):
+            raise ValidationError({key: value for key, value in errors.items() if value})
+
+        with transaction.atomic():
+            if deletes:
+                self.model.objects.filter(pk__in=deletes).delete()
+            updated = self.update([update for update in updates if update is not None])
+            created = self.create(creates)
+            transaction.on_commit(lambda: bump_business_version(self.business.pk))
+        context = {}
+        return {
+            'created': self.serializer_class(created, many=True, context=context).data,
+            'updated': self.serializer_class(updated, many=True, context=context).data,
+            'deleted': deletes,
+        }
+
+    def parse(self, data):
+        if not isinstance(data, dict) or not data or set(data) - {'create', 'update', 'delete'}:
+            raise ValidationError({'non_field_errors': ['Expected an object with "create", "update" and/or "delete" lists.']})
+        lists = [data.get(key, []) for key in ('create', 'update', 'delete')]
+        if not all(isinstance(items, list) for items in lists):
+            raise ValidationError({'non_field_errors': ['"create", "update" and "delete" must be lists.']})
+        if sum(len(items) for items in lists) > self.max_items:
+            raise ValidationError({'non_field_errors': [f"At most {self.max_items} items per request."]})
+        return lists
+
+    def check(self, creates, updates, deletes, errors):
+        """Checks needing the whole batch; add errors to the items' dicts in `errors`."""
+
+    def create(self, creates):
+        return self.model.objects.bulk_create(self.model(business=self.business, **data) for data in creates)
+
+    def update(self, updates):
+        fields = set()
+        now = timezone.now()
+        for instance, data in updates:
+            for field, value in data.items():
+                setattr(instance, field, value)
+            fields.update(data)
+            # bulk_update does not run auto_now
+            instance.updated_at = now
+        instances = [instance for instance, _ in updates]
+        if instances:
+            self.model.objects.bulk_update(instances, [*fields, 'updated_at'])
+        return instances
+
+
+class ServicesBulk(BulkMutation):
+    model = Services
+    item_serializer_class = ServiceItemSerializer
+    serializer_class = ServicesSerializer
+
+    def check(self, creates, updates, deletes, errors):
+        items = [(data, errors['create'][i]) for i, data in enumerate(creates) if data is not None]
+        items += [(update[1], errors['update'][i]) for i, update in enumerate(updates) if update is not None]
+        # 0 is an id like any other, only null leaves the category unset
+        if not any(data.get('category_id') is not None for data, _ in items):
+            return
+        categories = set(ServiceCategory.objects.filter(business=self.business).values_list('pk', flat=True))
+        for data, item_errors in items:
+            if data.get('category_id') is not None and data['category_id'] not in categories:
+                item_errors['category_id'] = ['No such category in this business.']
+
+
+class PackagesBulk(BulkMutation):
+    model = Packages
+    item_serializer_class = PackageItemSerializer
+    serializer_class = PackagesSerializer
+
+
+class CategoriesBulk(BulkMutation):
+    """
+    Parents have to exist before the request, so a tree is created one
+    level per request. New categories get their paths with one bulk_update
+    after the insert; moved ones go through save() to move their subtree.
+    """
+    model = ServiceCategory
+    item_serializer_class = CategoryItemSerializer
+    serializer_class = ServiceCategorySerializer
+
+    def check(self, creates, updates, deletes, errors):
+        items = [(None, data, errors['create'][i]) for i, data in enumerate(creates) if data is not None]
+        items += [(*update, errors['update'][i]) for i, update in enumerate(updates) if update is not None]
+        if not deletes and not any(data.get('parent_id') is not None for _, data, _ in items):
+            return
+        paths = dict(ServiceCategory.objects.filter(business=self.business).values_list('pk', 'path'))
+        # Deleting a category deletes its subtree
+        deleted = tuple(paths[pk] for pk in deletes)
+        for instance, data, item_errors in items:
+            if deleted and instance is not None and instance.path.startswith(deleted):
+                item_errors['id'] = ['Deleted with its parent in this request.']
+            parent_id = data.get('parent_id')
+            if parent_id is None:
+                continue
+            if parent_id not in paths or (deleted and paths[parent_id].startswith(deleted)):
+                item_errors['parent_id'] = ['No such category in this business.']
+            elif instance is not None and paths[parent_id].startswith(instance.path):
+                item_errors['parent_id'] = ['A category cannot be moved under itself or one of its subcategories.']
+
+    def create(self, creates):
+        categories = super().create(creates)
+        parents = {
+            parent.pk: parent
+            for parent in ServiceCategory.objects.filter(pk__in={category.parent_id for category in categories})
+        }
+        for category in categories:
+            parent = parents.get(category.parent_id)
+            category.path = (parent.path if parent else '') + ServiceCategory.path_segment(category.pk)
+            category.depth = parent.depth + 1 if parent else 0
+            category._loaded_parent_id = category.parent_id
+        ServiceCategory.objects.bulk_update(categories, ['path', 'depth'])
+        return categories
+
+    def update(self, updates):
+        moved = [(instance, data) for instance, data in updates if 'parent_id' in data and data['parent_id'] != instance.parent_id]
+        for instance, data in moved:
+            for field, value in data.items():
+                setattr(instance, field, value)
+            try:
+                instance.save()
+            except DjangoValidationError as exc:
+                # Two moves of this request that together make a cycle
+                raise ValidationError({'non_field_errors': exc.messages})
+        return super().update([update for update in updates if update not in moved]) + [instance for instance, _ in moved]
+
+
+class TeamMembersBulk(BulkMutation):
+    model = TeamMember
+    item_serializer_class = TeamMemberItemSerializer
+    serializer_class = TeamMemberSerializer
+
+    def check(self, creates, updates, deletes, errors):
+        items = [(None, data, errors['create'][i]) for i, data in enumerate(creates) if data is not None]
+        items += [(*update, errors['update'][i]) for i, update in enumerate(updates) if update is not None]
+        unique = ('phone_number', 'member_email')
+        values = {field: {data[field] for _, data, _ in items if field in data} for field in unique}
+        if not any(values.values()):
+            return
+        # Phone numbers and emails are unique across all businesses
+        taken = {field: {} for field in unique}
+        rows = TeamMember.objects.filter(
+            Q(phone_number__in=values['phone_number']) | Q(member_email__in=values['member_email'])
+        ).exclude(pk__in=deletes)
+        for pk, *row in rows.values_list('pk', *unique):
+            for field, value in zip(unique, row):
+                taken[field][value] = pk
+        # An update that changes a value frees the old one
+        for instance, data, _ in items:
+            for field in unique:
+                if instance is not None and field in data and taken[field].get(getattr(instance, field)) == instance.pk:
+                    del taken[field][getattr(instance, field)]
+        for instance, data, item_errors in items:
+            for field in unique:
+                if field not in data:
+                    continue
+                owner = taken[field].get(data[field])
+                if owner is not None and (instance is None or owner != instance.pk):
+                    item_errors[field] = [f"A team member with this {field.replace('_', ' ')} already exists."]
+                else:
+                    taken[field][data[field]] = instance.pk if instance is not None else 0
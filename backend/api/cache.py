@@ -0,0 +1,157 @@
+"""
+Response caching for the read endpoints.
+
+Every business has a version number in the cache and every cached response
+of the business is stored under a key containing that version. Writing any
+row of the business bumps the version (see api.signals), which orphans all
+of its cached responses at once without having to find or delete them; they
+fall out of the cache when their timeout passes. Other businesses keep their
+entries. A second version, ALL_BUSINESSES, is bumped by every write and
+covers the lists that span businesses.
+
+The same versions, or a row's updated_at, give the ETags of
+ConditionalGetMixin, so clients revalidating an unchanged resource get a 304
+without the view loading or serializing anything.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+ALL_BUSINESSES = 'all'
+
+
+def _version_key(business_id):
+    return f"business:{business_id}:version"
+
+
+def business_version(business_id):
+    """The current cache version of a business."""
+    key = _version_key(business_id)
+    version = cache.get(key)
+    if version is None:
+        # Starting from the clock rather than 1 keeps a version that was
+        # evicted from the cache from ever matching older entries again
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_business_version(business_id):
+    """Invalidate every cached response of a business, and of the lists spanning businesses."""
+    for key in (_version_key(business_id), _version_key(ALL_BUSINESSES)):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+class CacheStats:
+    """Per process hit and miss counters of the response cache, per view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, view, hit):
+        with self._lock:
+            self._counts[view]['hits' if hit else 'misses'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            views = {view: dict(counts) for view, counts in self._counts.items()}
+        hits = sum(counts['hits'] for counts in views.values())
+        misses = sum(counts['misses'] for counts in views.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+            'views': views,
+        }
+
+
+cache_stats = CacheStats()
+
+
+class BusinessScopedMixin:
+    def get_scope_business_id(self):
+        """
+        The business whose rows alone make up the response, or None. By
+        default a business_id URL argument, or query parameter on lists.
+        """
+        business_id = self.kwargs.get('business_id') or self.request.query_params.get('business_id')
+        return str(business_id) if business_id and str(business_id).isdigit() else None
+
+
+class ConditionalGetMixin(BusinessScopedMixin):
+    """
+    Strong ETags on GET and 304 Not Modified for a matching If-None-Match.
+    The tag comes from the row's updated_at on detail views of models
+    without nested rows (etag_from_row), from the business version when the
+    response is scoped to one business, and from the ALL_BUSINESSES version
+    otherwise.
+    """
+    etag_from_row = False
+
+    def get_etag(self):
+        if self.etag_from_row:
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            updated_at = (
+                self.get_queryset().filter(**{self.lookup_field: lookup}).values_list('updated_at', flat=True).first()
+            )
+            if updated_at is None:
+                return None
+            source = f"{lookup}:{updated_at.isoformat()}"
+        else:
+            business_id = self.get_scope_business_id() or ALL_BUSINESSES
+            source = f"{business_id}:{business_version(business_id)}"
+        # The same version renders differently per view and format
+        tag = f"{type(self).__name__}:{self.request.accepted_renderer.format}:{source}"
+        return f'"{hashlib.md5(tag.encode()).hexdigest()}"'
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag is not None:
+            if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+            if etag in if_none_match or '*' in if_none_match:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = super().get(request, *args, **kwargs)
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+
+class BusinessResponseCacheMixin(BusinessScopedMixin):
+    """
+    Caches the GET responses of a view per business, for the views whose
+    response only depends on one business's rows and the request URL.
+    """
+
+    def get_cache_key(self, business_id):
+        query = '&'.join(f"{key}={value}" for key, value in sorted(self.request.query_params.lists()))
+        digest = hashlib.md5(f"{self.request.path}?{query}".encode()).hexdigest()
+        return f"response:{business_id}:{business_version(business_id)}:{digest}"
+
+    def get(self, request, *args, **kwargs):
+        business_id = self.get_scope_business_id()
+        if business_id is None:
+            return super().get(request, *args, **kwargs)
+        key = self.get_cache_key(business_id)
+        data = cache.get(key)
+        cache_stats.record(type(self).__name__, hit=data is not None)
+        if data is not None:
+            return Response(data)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 600))
+        return response
@@ -0,0 +1,83 @@
+"""
+Streaming exports of a business's rows as CSV or JSON Lines.
+
+The queryset is read with .iterator(chunk_size=...), so only one chunk of
+rows (and, on PostgreSQL, a server side cursor) is held at a time, and each
+row is serialized and written to the StreamingHttpResponse as soon as it is
+read. Memory stays flat however many rows the business has. Many-to-many
+relations are prefetched per chunk.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+
+from .models import Business
+from .renderers import ORJSONRenderer
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/jsonl; charset=utf-8',
+}
+
+
+class Echo:
+    """A file-like object that hands back what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ';'.join(str(item) for item in value)
+    return value
+
+
+class StreamingExportMixin:
+    """
+    Streams the view's queryset in the format named by the file_format URL
+    argument, serializing each row with the view's serializer. Filters and
+    ordering are the list view's, through get_queryset().
+    """
+    chunk_size = 2000
+    export_name = None
+
+    def perform_content_negotiation(self, request, force=False):
+        # The response is not rendered, so any Accept header is fine
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, *args, **kwargs):
+        file_format = self.kwargs['file_format']
+        if file_format not in EXPORT_FORMATS:
+            raise NotFound(f"Unknown export format '{file_format}', use one of: {', '.join(EXPORT_FORMATS)}")
+        business_id = self.kwargs['business_id']
+        if not Business.objects.filter(pk=business_id).exists():
+            raise NotFound('Business not found')
+        # One serializer for every row rather than one per row
+        serializer = self.get_serializer()
+        rows = (
+            serializer.to_representation(instance)
+            for instance in self.get_queryset().iterator(chunk_size=self.chunk_size)
+        )
+        if file_format == 'csv':
+            fields = [name for name, field in serializer.fields.items() if not field.write_only]
+            content = self.export_csv(fields, rows)
+        else:
+            content = self.export_jsonl(rows)
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}-{business_id}.{file_format}"'
+        return response
+
+    def export_csv(self, fields, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([csv_value(row.get(field)) for field in fields])
+
+    def export_jsonl(self, rows):
+        renderer = ORJSONRenderer()
+        for row in rows:
+            yield renderer.render(row) + b'\n'
@@ -0,0 +1,208 @@
+"""
+Spatial lookup for businesses.
+
+Every business stores the id of the fixed size latitude/longitude grid cell it
+falls in (Business.geo_cell). A radius search turns its bounding box into a
+handful of contiguous geo_cell ranges, one per grid row, so the database only
+returns the businesses in those cells and the exact distance is computed for
+those candidates alone.
+
+CoordinateIndex keeps the same coordinates in NumPy arrays in each worker so
+the customer search can rank salons in one vectorized pass.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371
+# Cells are GEO_CELL_DEGREES wide in latitude and longitude (about 11 km at the equator)
+GEO_CELL_DEGREES = 0.1
+LAT_CELLS = round(180 / GEO_CELL_DEGREES)
+LON_CELLS = round(360 / GEO_CELL_DEGREES)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def cell_row(latitude):
+    return min(max(int((latitude + 90) / GEO_CELL_DEGREES), 0), LAT_CELLS - 1)
+
+
+def cell_column(longitude):
+    return int(((longitude + 180) % 360) / GEO_CELL_DEGREES) % LON_CELLS
+
+
+def geo_cell(latitude, longitude):
+    """Id of the grid cell containing the point, row major from (-90, -180)."""
+    return cell_row(latitude) * LON_CELLS + cell_column(longitude)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_lat, max_lat, longitude_intervals) covering every point within
+    radius_km. Longitude intervals are split at the antimeridian.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = max(latitude - delta_lat, -90)
+    max_lat = min(latitude + delta_lat, 90)
+    # Circles reaching a pole span every longitude
+    if min_lat == -90 or max_lat == 90:
+        return min_lat, max_lat, [(-180, 180)]
+    delta_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    if delta_lon >= 180:
+        return min_lat, max_lat, [(-180, 180)]
+
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180), (-180, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180), (-180, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def bounding_box_filter(latitude, longitude, radius_km):
+    """
+    Q object selecting the businesses inside the search bounding box. The
+    geo_cell ranges hit the index, the coordinate bounds trim the cell edges.
+    """
+    min_lat, max_lat, longitude_intervals = bounding_box(latitude, longitude, radius_km)
+    cells = Q()
+    for row in range(cell_row(min_lat), cell_row(max_lat) + 1):
+        for min_lon, max_lon in longitude_intervals:
+            first = row * LON_CELLS + cell_column(min_lon)
+            last = row * LON_CELLS + (LON_CELLS - 1 if max_lon >= 180 else cell_column(max_lon))
+            cells |= Q(geo_cell__range=(first, last))
+
+    longitudes = Q()
+    for min_lon, max_lon in longitude_intervals:
+        longitudes |= Q(longitude__range=(min_lon, max_lon))
+    return cells & Q(latitude__range=(min_lat, max_lat)) & longitudes
+
+
+def nearby_businesses(latitude, longitude, radius_km=10, limit=20, queryset=None):
+    """
+    Businesses within radius_km of the point as (business, distance_km) pairs,
+    nearest first, at most `limit` of them (all of them when limit is None).
+    """
+    from .models import Business
+
+    if queryset is None:
+        queryset = Business.objects.all()
+    candidates = queryset.filter(bounding_box_filter(latitude, longitude, radius_km))
+
+    results = []
+    for business in candidates:
+        distance = haversine(latitude, longitude, business.latitude, business.longitude)
+        if distance <= radius_km:
+            results.append((business, distance))
+    results.sort(key=lambda result: result[1])
+    return results[:limit]
+
+
+class CoordinateIndex:
+    """
+    In-process (id, latitude, longitude) arrays of every business, sorted by
+    latitude. A search slices the latitude band with a binary search and
+    computes the distance to every salon in the band at once.
+
+    Saves and deletes in this process are applied incrementally (see
+    api.signals); other workers' changes are picked up by a full rebuild once
+    the index is older than settings.GEO_INDEX_MAX_AGE seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (ids, latitudes, longitudes), replaced as a whole so readers never
+        # need the lock
+        self._arrays = None
+        self._built_at = 0.0
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'GEO_INDEX_MAX_AGE', 300)
+
+    def invalidate(self):
+        self._arrays = None
+
+    def build(self):
+        from .models import Business
+
+        rows = np.array(list(Business.objects.values_list('id', 'latitude', 'longitude')), dtype=np.float64).reshape(-1, 3)
+        order = np.argsort(rows[:, 1], kind='stable')
+        arrays = (rows[order, 0].astype(np.int64), rows[order, 1].copy(), rows[order, 2].copy())
+        with self._lock:
+            self._arrays = arrays
+            self._built_at = time.monotonic()
+        return arrays
+
+    def get_arrays(self):
+        arrays = self._arrays
+        if arrays is None or time.monotonic() - self._built_at > self.max_age:
+            arrays = self.build()
+        return arrays
+
+    def upsert(self, business_id, latitude, longitude):
+        with self._lock:
+            if self._arrays is None:
+                return
+            ids, latitudes, longitudes = self._without(business_id)
+            position = np.searchsorted(latitudes, latitude)
+            self._arrays = (
+                np.insert(ids, position, business_id),
+                np.insert(latitudes, position, latitude),
+                np.insert(longitudes, position, longitude),
+            )
+
+    def remove(self, business_id):
+        with self._lock:
+            if self._arrays is not None:
+                self._arrays = self._without(business_id)
+
+    def _without(self, business_id):
+        ids, latitudes, longitudes = self._arrays
+        keep = ids != business_id
+        if keep.all():
+            return self._arrays
+        return ids[keep], latitudes[keep], longitudes[keep]
+
+    def nearest(self, latitude, longitude, radius_km=10, limit=20):
+        """
+        (business_id, distance_km) pairs within radius_km, nearest first, at
+        most `limit` of them.
+        """
+        ids, latitudes, longitudes = self.get_arrays()
+        delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        start = np.searchsorted(latitudes, latitude - delta_lat, side='left')
+        end = np.searchsorted(latitudes, latitude + delta_lat, side='right')
+        band_ids = ids[start:end]
+
+        phi1 = math.radians(latitude)
+        phi2 = np.radians(latitudes[start:end])
+        delta_phi = phi2 - phi1
+        delta_lambda = np.radians(longitudes[start:end] - longitude)
+        a = np.sin(delta_phi / 2)**2 + math.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2)**2
+        distances = 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+        within = np.flatnonzero(distances <= radius_km)
+        if len(within) > limit:
+            within = within[np.argpartition(distances[within], limit - 1)[:limit]]
+        within = within[np.argsort(distances[within], kind='stable')]
+        return [(int(band_ids[i]), float(distances[i])) for i in within]
+
+
+coordinate_index = CoordinateIndex()
@@ -0,0 +1,102 @@
+"""
+Short lived holds on a staff member's slots while a customer checks out.
+
+A hold takes every availability slot (see api.availability) it covers with
+one cache.add() per slot, which only succeeds when nobody holds that slot, so
+two customers racing for the same time are told apart in the cache before
+either writes an appointment. Keys expire with the hold, so an abandoned
+checkout frees its slots without any cleanup. Like OTPs, holds have to live in
+a cache shared by all workers (REDIS_URL) in production.
+"""
+import uuid
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .availability import bits
+
+
+class SlotHolds:
+    prefix = 'hold'
+
+    @property
+    def default_minutes(self):
+        return getattr(settings, 'SLOT_HOLD_MINUTES', 5)
+
+    @property
+    def max_minutes(self):
+        return getattr(settings, 'SLOT_HOLD_MAX_MINUTES', 15)
+
+    def _slot_key(self, staff_id, day, slot):
+        return f"{self.prefix}:{staff_id}:{day.isoformat()}:{slot}"
+
+    def _hold_key(self, hold_id):
+        return f"{self.prefix}:{hold_id}"
+
+    def hold(self, owner, staff_id, day, slots, minutes=None, **details):
+        """
+        Hold `slots` (slot indexes) of a staff member's day for `owner`, for
+        `minutes` (default_minutes when None, at most max_minutes). Returns
+        the hold, a dict with its id, expiry and `details`, or None if any of
+        the slots is already held.
+        """
+        if minutes is None:
+            minutes = self.default_minutes
+        hold_id = uuid.uuid4().hex
+        value = f"{owner}:{hold_id}"
+        taken = []
+        for slot in slots:
+            key = self._slot_key(staff_id, day, slot)
+            if not cache.add(key, value, timeout=minutes * 60):
+                cache.delete_many(taken)
+                return None
+            taken.append(key)
+        record = {
+            **details,
+            'id': hold_id,
+            'owner': owner,
+            'staff_id': staff_id,
+            'date': day.isoformat(),
+            'slots': list(slots),
+            'expires_at': timezone.now() + timedelta(minutes=minutes),
+        }
+        cache.set(self._hold_key(hold_id), record, timeout=minutes * 60)
+        return record
+
+    def get(self, hold_id):
+        """The hold, or None once it has expired or been released."""
+        return cache.get(self._hold_key(hold_id))
+
+    def release(self, record):
+        """Free the hold's slots, leaving any that were re-held after it expired."""
+        day = date.fromisoformat(record['date'])
+        keys = [self._slot_key(record['staff_id'], day, slot) for slot in record['slots']]
+        value = f"{record['owner']}:{record['id']}"
+        cache.delete_many([key for key, held in cache.get_many(keys).items() if held == value])
+        cache.delete(self._hold_key(record['id']))
+
+    def held(self, free, exclude_owner=None):
+        """
+        Takes {staff_id: {date: bitmap}} and returns the same shape with the
+        bits of the slots held by someone other than exclude_owner, looking
+        up only the slots set in `free` with a single get_many.
+        """
+        keys = {}
+        for staff_id, days in free.items():
+            for day, bitmap in days.items():
+                for slot in bits(bitmap):
+                    keys[self._slot_key(staff_id, day, slot)] = (staff_id, day, slot)
+        held = {staff_id: dict.fromkeys(days, 0) for staff_id, days in free.items()}
+        if not keys:
+            return held
+        for key, value in cache.get_many(list(keys)).items():
+            if exclude_owner is not None and value.split(':', 1)[0] == str(exclude_owner):
+                continue
+            staff_id, day, slot = keys[key]
+            held[staff_id][day] |= 1 << slot
+        return held
+
+
+slot_holds = SlotHolds()
@@ -0,0 +1,138 @@
+"""
+Bulk import of a business's clients from CSV or JSON.
+
+Rows are validated a chunk at a time. client_email and client_phone are
+unique across all businesses: the business's own addresses are loaded into
+memory once, and the addresses of a chunk that other businesses use are
+found with one query per chunk, so checking a row costs no query of its
+own. A chunk's valid rows are inserted with one bulk_create. Invalid and
+duplicate rows, including duplicates within the file, are reported by row
+number and skipped; the rest of the file is still imported.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+
+from .cache import bump_business_version
+from .models import Client
+from .serializers import ClientImportSerializer
+
+DUPLICATE_EMAIL = 'A client with this email already exists.'
+DUPLICATE_PHONE = 'A client with this phone number already exists.'
+DUPLICATE = 'A client with this email or phone number already exists.'
+
+
+def read_csv(file):
+    """The rows of a binary CSV file with a header line, read lazily, without empty cells."""
+    try:
+        for row in csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline='')):
+            yield {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ParseError(f"Invalid CSV: {exc}")
+
+
+def read_json(file):
+    """The rows of a binary file holding a JSON array of client objects."""
+    try:
+        rows = json.load(file)
+    except ValueError as exc:
+        raise ParseError(f"Invalid JSON: {exc}")
+    if not isinstance(rows, list):
+        raise ParseError('Expected a JSON array of clients.')
+    return rows
+
+
+class ClientImport:
+    batch_size = 500
+
+    def __init__(self, business, batch_size=None):
+        self.business = business
+        self.batch_size = batch_size or self.batch_size
+        existing = Client.objects.filter(business=business).values_list('client_email', 'client_phone')
+        self.emails = set()
+        self.phones = set()
+        for email, phone in existing:
+            self.emails.add(email)
+            self.phones.add(phone)
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        """
+        Import `rows`, an iterable of dicts, and return a report:
+        {'created': n, 'failed': n, 'errors': [{'row': number, 'errors': {...}}]}
+        with rows numbered from 1.
+        """
+        rows = enumerate(rows, start=1)
+        while chunk := list(islice(rows, self.batch_size)):
+            self.import_chunk(chunk)
+        return {'created': self.created, 'failed': len(self.errors), 'errors': self.errors}
+
+    def import_chunk(self, chunk):
+        valid = []
+        for number, row in chunk:
+            if not isinstance(row, dict):
+                self.errors.append({'row': number, 'errors': {'non_field_errors': ['Expected an object.']}})
+                continue
+            serializer = ClientImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.errors.append({'row': number, 'errors': serializer.errors})
+        if not valid:
+            return
+
+        # The chunk's addresses that other businesses already use
+        emails = {data['client_email'] for _, data in valid}
+        phones = {data['client_phone'] for _, data in valid}
+        taken = (
+            Client.objects.filter(Q(client_email__in=emails) | Q(client_phone__in=phones))
+            .exclude(business=self.business)
+            .values_list('client_email', 'client_phone')
+        )
+        for email, phone in taken:
+            self.emails.add(email)
+            self.phones.add(phone)
+
+        clients = []
+        for number, data in valid:
+            errors = {}
+            if data['client_email'] in self.emails:
+                errors['client_email'] = [DUPLICATE_EMAIL]
+            if data['client_phone'] in self.phones:
+                errors['client_phone'] = [DUPLICATE_PHONE]
+            if errors:
+                self.errors.append({'row': number, 'errors': errors})
+                continue
+            self.emails.add(data['client_email'])
+            self.phones.add(data['client_phone'])
+            clients.append((number, Client(business=self.business, **data)))
+        self.save(clients)
+
+    def save(self, clients):
+        try:
+            with transaction.atomic():
+                Client.objects.bulk_create([client for _, client in clients])
+                # bulk_create sends no post_save, so invalidate the cached
+                # responses with each chunk: an error later in the file does
+                # not undo the chunks already saved
+                transaction.on_commit(lambda: bump_business_version(self.business.pk))
+            self.created += len(clients)
+            return
+        except IntegrityError:
+            pass
+        # Someone else inserted one of the addresses since the chunk was
+        # checked; insert the rows one at a time to find out which
+        for number, client in clients:
+            client.pk = None
+            try:
+                with transaction.atomic():
+                    client.save()
+                self.created += 1
+            except IntegrityError:
+                self.errors.append({'row': number, 'errors': {'non_field_errors': [DUPLICATE]}})
@@ -0,0 +1,179 @@
+"""
+Per-request SQL and timing instrumentation.
+
+RequestMetricsMiddleware measures a sample of the requests
+(REQUEST_METRICS_SAMPLE_RATE): the number of queries and the time spent in
+the database, through an execute wrapper on every connection, the time the
+view spent outside the database (where the serializers run), the time
+spent rendering the response, the total time and the response size. The
+view and render times come from the middleware's process_view() and
+process_template_response() hooks, so nothing outside the request being
+measured is patched; they are unknown for responses that are not
+TemplateResponses, such as the streamed exports. A sampled response gets
+them in a Server-Timing header, which browser dev tools show next to the
+request, and a JSON line on the 'api.requests' logger.
+
+Each process keeps the last REQUEST_METRICS_WINDOW samples of every route
+and serves their percentiles from the request-stats/ endpoint. Requests
+that are not sampled only pay for one random() call.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.requests')
+
+METRICS = ('total_ms', 'db_ms', 'queries', 'view_ms', 'render_ms', 'bytes')
+
+
+class RequestMetrics:
+    """What one sampled request has used so far."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.view = None
+        self.render = None
+        self._view_started = None
+        self._render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+class RouteStats:
+    """The last `window` samples of every route in this process."""
+
+    def __init__(self, window=None):
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = defaultdict(int)
+
+    @property
+    def window(self):
+        return self._window or getattr(settings, 'REQUEST_METRICS_WINDOW', 1000)
+
+    def record(self, route, sample):
+        with self._lock:
+            if route not in self._samples:
+                self._samples[route] = deque(maxlen=self.window)
+            self._samples[route].append(sample)
+            self._counts[route] += 1
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {route: list(route_samples) for route, route_samples in self._samples.items()}
+            counts = dict(self._counts)
+        routes = {}
+        for route, route_samples in sorted(samples.items()):
+            stats = {'sampled': counts[route], 'window': len(route_samples)}
+            for metric in METRICS:
+                values = sorted(sample[metric] for sample in route_samples if sample[metric] is not None)
+                if values:
+                    stats[metric] = {
+                        'p50': percentile(values, 0.5),
+                        'p95': percentile(values, 0.95),
+                        'p99': percentile(values, 0.99),
+                        'max': values[-1],
+                    }
+            routes[route] = stats
+        return {'sample_rate': getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.1), 'routes': routes}
+
+
+route_stats = RouteStats()
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.1):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = f"{request.method} /{match.route}" if match is not None else f"{request.method} <unresolved>"
+        sample = {
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(metrics.db * 1000, 2),
+            'queries': metrics.queries,
+            'view_ms': None if metrics.view is None else round(metrics.view * 1000, 2),
+            'render_ms': None if metrics.render is None else round(metrics.render * 1000, 2),
+            # Unknown until a streamed response has been sent
+            'bytes': None if response.streaming else len(response.content),
+        }
+        route_stats.record(route, sample)
+        timings = [f'db;dur={sample["db_ms"]};desc="{metrics.queries} queries"']
+        for name in ('view', 'render'):
+            if sample[f'{name}_ms'] is not None:
+                timings.append(f'{name};dur={sample[f"{name}_ms"]}')
+        timings.append(f'total;dur={sample["total_ms"]}')
+        response['Server-Timing'] = ', '.join(timings)
+        logger.info(json.dumps({
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            **sample,
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics._view_started = (time.perf_counter(), metrics.db)
+
+    def process_template_response(self, request, response):
+        # Called with the view's response, right before it is rendered
+        metrics = _current.get()
+        if metrics is None or metrics._view_started is None:
+            return response
+        now = time.perf_counter()
+        started, db = metrics._view_started
+        metrics.view = (now - started) - (metrics.db - db)
+        metrics._render_started = (now, metrics.db)
+
+        def rendered(response):
+            started, db = metrics._render_started
+            metrics.render = (time.perf_counter() - started) - (metrics.db - db)
+
+        response.add_post_render_callback(rendered)
+        return response
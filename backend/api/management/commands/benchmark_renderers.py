@@ -0,0 +1,158 @@
+import time
+import tracemalloc
+import uuid
+from datetime import date, time as clock, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Appointment, Business, Client, Packages, ServiceCategory, Services, TeamMember
+from api.renderers import ORJSONRenderer, orjson
+from api.serializers import AppointmentSerializer, BusinessSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the render time and peak memory of DRF's JSONRenderer and the orjson "
+        "renderer on the full business payload and the appointment list of a business. "
+        "Seeds a business with --appointments appointments in a transaction that is rolled "
+        "back afterwards, unless an existing --business is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--business", type=int, help="benchmark an existing business instead of seeding one")
+        parser.add_argument("--appointments", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5, help="renders per renderer and payload, best is reported")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed, so ORJSONRenderer falls back to JSONRenderer.")
+        with transaction.atomic():
+            if options["business"]:
+                business_id = options["business"]
+                if not Business.objects.filter(pk=business_id).exists():
+                    raise CommandError(f"Business {business_id} does not exist.")
+            else:
+                business_id = self.seed(options["appointments"])
+            payloads = self.payloads(business_id)
+            transaction.set_rollback(True)
+
+        for name, data in payloads:
+            self.stdout.write(name)
+            results = {}
+            for renderer in (JSONRenderer(), ORJSONRenderer()):
+                results[type(renderer).__name__] = self.measure(renderer, data, options["repeat"])
+            for renderer, (seconds, peak, size) in results.items():
+                self.stdout.write(f"  {renderer:<16} {seconds * 1000:8.1f} ms  peak {peak / 1024:8.0f} KiB  {size / 1024:8.0f} KiB out")
+            (stdlib, stdlib_peak, _), (fast, fast_peak, _) = results.values()
+            self.stdout.write(
+                self.style.SUCCESS(f"  {stdlib / fast:.1f}x faster, {stdlib_peak / max(fast_peak, 1):.1f}x less memory")
+            )
+
+    def measure(self, renderer, data, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rendered = renderer.render(data)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        tracemalloc.start()
+        try:
+            renderer.render(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return best, peak, len(rendered)
+
+    def payloads(self, business_id):
+        business = BusinessSerializer.setup_eager_loading(Business.objects.filter(pk=business_id)).get()
+        appointments = Appointment.objects.filter(business_id=business_id).prefetch_related("services", "packages")
+        return [
+            ("business detail", BusinessSerializer(business).data),
+            ("appointment list", AppointmentSerializer(appointments, many=True).data),
+        ]
+
+    def seed(self, appointments):
+        token = uuid.uuid4().hex[:6]
+        business = Business.objects.create(
+            phone_number=f"bench-{token}",
+            owner_name="Benchmark",
+            salon_name="Benchmark Salon",
+            owner_email=f"bench-{token}@example.com",
+            latitude=12.97,
+            longitude=77.59,
+        )
+        category = ServiceCategory.objects.create(business=business, name="Hair")
+        services = Services.objects.bulk_create(
+            Services(
+                business=business,
+                service_name=f"Service {i}",
+                service_type="Basic",
+                duration_in_mins=30,
+                price=100 + i,
+                category=category,
+            )
+            for i in range(20)
+        )
+        packages = Packages.objects.bulk_create(
+            Packages(business=business, package_name=f"Package {i}", package_duration_in_mins=60, package_price=500)
+            for i in range(5)
+        )
+        staff = TeamMember.objects.bulk_create(
+            TeamMember(
+                business=business,
+                first_name="Staff",
+                last_name=str(i),
+                phone_number=f"{token}-{i}",
+                member_email=f"staff-{token}-{i}@example.com",
+                date_of_joining=date(2024, 1, 1),
+                access_type="Admin",
+            )
+            for i in range(20)
+        )
+        clients = Client.objects.bulk_create(
+            Client(
+                business=business,
+                client_name=f"Client {i}",
+                client_type="Regular",
+                client_email=f"client-{token}-{i}@example.com",
+                client_phone=f"{token}-{i}",
+                client_gender="Female",
+            )
+            for i in range(500)
+        )
+        start = date(2025, 1, 1)
+        rows = Appointment.objects.bulk_create(
+            (
+                Appointment(
+                    business=business,
+                    staff=staff[i % len(staff)],
+                    client_appointments=clients[i % len(clients)],
+                    appointment_date=start + timedelta(days=i // 200),
+                    appointment_time=clock(9 + i % 10),
+                    end_time=clock(9 + i % 10, 30),
+                    total_amount=services[i % len(services)].price,
+                    total_duration_mins=30,
+                    notes="Prefers the window seat" if i % 3 == 0 else None,
+                )
+                for i in range(appointments)
+            ),
+            batch_size=1000,
+        )
+        Appointment.services.through.objects.bulk_create(
+            (
+                Appointment.services.through(appointment_id=row.pk, services_id=services[i % len(services)].pk)
+                for i, row in enumerate(rows)
+            ),
+            batch_size=1000,
+        )
+        Appointment.packages.through.objects.bulk_create(
+            (
+                Appointment.packages.through(appointment_id=row.pk, packages_id=packages[i % len(packages)].pk)
+                for i, row in enumerate(rows)
+                if i % 4 == 0
+            ),
+            batch_size=1000,
+        )
+        return business.pk
@@ -0,0 +1,101 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.geo import CoordinateIndex, geo_cell, haversine, nearby_businesses
+from api.models import Business
+
+# Salons are scattered around these city centres
+CITY_CENTRES = [
+    (12.97, 77.59),
+    (19.07, 72.87),
+    (28.61, 77.20),
+    (13.08, 80.27),
+    (22.57, 88.36),
+    (17.38, 78.48),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the indexed salon radius search and the in-memory coordinate index "
+        "against a full-table haversine scan. The generated salons are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--salons", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--radius", type=float, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        radius = options["radius"]
+        points = [self.random_point(rng) for _ in range(options["queries"])]
+
+        with transaction.atomic():
+            self.create_salons(rng, options["salons"])
+
+            naive_time, naive_results = self.run(points, lambda lat, lon: self.naive_search(lat, lon, radius))
+            indexed_time, indexed_results = self.run(
+                points, lambda lat, lon: [business.id for business, _ in nearby_businesses(lat, lon, radius, limit=None)]
+            )
+            index = CoordinateIndex()
+            build_start = time.perf_counter()
+            index.build()
+            build_time = time.perf_counter() - build_start
+            vectorized_time, vectorized_results = self.run(
+                points, lambda lat, lon: [business_id for business_id, _ in index.nearest(lat, lon, radius, limit=options["salons"])]
+            )
+            transaction.set_rollback(True)
+
+        if naive_results != indexed_results:
+            self.stderr.write(self.style.ERROR("Indexed search returned different salons than the full scan"))
+        if naive_results != vectorized_results:
+            self.stderr.write(self.style.ERROR("Coordinate index returned different salons than the full scan"))
+
+        queries = len(points)
+        self.stdout.write(f"{options['salons']} salons, {queries} searches, radius {radius} km")
+        self.stdout.write(f"full scan: {naive_time / queries * 1000:.2f} ms/search")
+        self.stdout.write(f"indexed:   {indexed_time / queries * 1000:.2f} ms/search")
+        self.stdout.write(self.style.SUCCESS(f"speedup:   {naive_time / indexed_time:.1f}x"))
+        self.stdout.write(f"coordinate index: {vectorized_time / queries * 1_000_000:.0f} us/search (built in {build_time * 1000:.0f} ms)")
+
+    def random_point(self, rng):
+        latitude, longitude = rng.choice(CITY_CENTRES)
+        return latitude + rng.gauss(0, 0.3), longitude + rng.gauss(0, 0.3)
+
+    def create_salons(self, rng, count):
+        salons = []
+        for i in range(count):
+            latitude, longitude = self.random_point(rng)
+            salons.append(
+                Business(
+                    phone_number=f"bench-{i}",
+                    owner_name="Benchmark",
+                    salon_name=f"Salon {i}",
+                    owner_email="benchmark@example.com",
+                    latitude=latitude,
+                    longitude=longitude,
+                    # bulk_create skips Business.save()
+                    geo_cell=geo_cell(latitude, longitude),
+                )
+            )
+        Business.objects.bulk_create(salons, batch_size=5000)
+
+    def naive_search(self, latitude, longitude, radius):
+        results = []
+        for business in Business.objects.all():
+            distance = haversine(latitude, longitude, business.latitude, business.longitude)
+            if distance <= radius:
+                results.append((distance, business.id))
+        return [business_id for _, business_id in sorted(results)]
+
+    def run(self, points, search):
+        results = []
+        start = time.perf_counter()
+        for latitude, longitude in points:
+            results.append(search(latitude, longitude))
+        return time.perf_counter() - start, results
@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.availability import slots_per_day, span
+from api.holds import SlotHolds
+
+
+class BenchmarkHolds(SlotHolds):
+    # Keeps the benchmark's keys apart from real holds in a shared cache
+    prefix = 'holdbench'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throughput of the slot hold store on the configured cache: concurrent "
+        "customers holding and releasing slots of a few popular staff members, then the "
+        "held-slot lookup used by the availability search."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--operations", type=int, default=2000, help="holds attempted per thread")
+        parser.add_argument("--staff", type=int, default=5)
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        store = BenchmarkHolds()
+        start_date = date(2030, 1, 7)
+        days = [start_date + timedelta(days=offset) for offset in range(options["days"])]
+        latencies = []
+        outcomes = {"held": 0, "conflict": 0}
+        lock = threading.Lock()
+
+        def customer(number):
+            rng = random.Random(options["seed"] * 1000 + number)
+            own_latencies = []
+            own = {"held": 0, "conflict": 0}
+            for _ in range(options["operations"]):
+                staff_id = rng.randrange(options["staff"])
+                # Popular times: most customers want the same few hours
+                first = int(rng.triangular(36, 84, 72))
+                slots = range(first, min(first + rng.randint(1, 4), slots_per_day()))
+                started = time.perf_counter()
+                hold = store.hold(number, staff_id, rng.choice(days), slots, minutes=1)
+                if hold is not None and rng.random() < 0.5:
+                    store.release(hold)
+                own_latencies.append(time.perf_counter() - started)
+                own["held" if hold is not None else "conflict"] += 1
+            with lock:
+                latencies.extend(own_latencies)
+                for key, value in own.items():
+                    outcomes[key] += value
+
+        threads = [threading.Thread(target=customer, args=(number,)) for number in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        free = {staff_id: dict.fromkeys(days, span(0, slots_per_day())) for staff_id in range(options["staff"])}
+        lookup_started = time.perf_counter()
+        store.held(free)
+        lookup = time.perf_counter() - lookup_started
+
+        latencies.sort()
+        total = len(latencies)
+
+        def percentile(p):
+            return latencies[min(int(total * p), total - 1)] * 1_000_000
+
+        self.stdout.write(
+            f"{options['threads']} threads, {total} hold attempts on {options['staff']} staff x {options['days']} days"
+        )
+        self.stdout.write(self.style.SUCCESS(f"throughput: {total / elapsed:.0f} holds/s"))
+        self.stdout.write(
+            f"held: {outcomes['held']}, conflicts: {outcomes['conflict']} ({outcomes['conflict'] / total:.0%})"
+        )
+        self.stdout.write(f"latency: p50 {percentile(0.5):.0f} us, p95 {percentile(0.95):.0f} us, p99 {percentile(0.99):.0f} us")
+        self.stdout.write(
+            f"held slots lookup for {options['staff']} staff x {options['days']} days: {lookup * 1000:.1f} ms"
+        )
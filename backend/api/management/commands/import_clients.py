@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ParseError
+
+from api.imports import ClientImport, read_csv, read_json
+from api.models import Business
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a business's clients from a CSV file with a header line or a JSON array. "
+        "Invalid and duplicate rows are skipped and listed; the other rows are imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("business_id", type=int)
+        parser.add_argument("path", help="a .csv or .json file")
+        parser.add_argument("--batch-size", type=int, default=ClientImport.batch_size)
+
+    def handle(self, *args, **options):
+        business = Business.objects.filter(pk=options["business_id"]).first()
+        if business is None:
+            raise CommandError(f"Business {options['business_id']} does not exist.")
+        path = options["path"]
+        if not path.lower().endswith((".csv", ".json")):
+            raise CommandError("Expected a .csv or .json file.")
+        try:
+            with open(path, "rb") as file:
+                rows = read_csv(file) if path.lower().endswith(".csv") else read_json(file)
+                report = ClientImport(business, batch_size=options["batch_size"]).run(rows)
+        except (OSError, ParseError) as exc:
+            raise CommandError(str(exc))
+        for error in report["errors"]:
+            messages = "; ".join(f"{field}: {' '.join(map(str, errors))}" for field, errors in error["errors"].items())
+            self.stderr.write(f"row {error['row']}: {messages}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['created']} clients, skipped {report['failed']} rows"))
@@ -0,0 +1,311 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as clock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.cache import bump_business_version
+from api.geo import coordinate_index, geo_cell
+from api.models import OTP, Appointment, Business, Client, Customer, Packages, ServiceCategory, Services, TeamMember, WorkingHours
+
+# Salons are scattered around these city centres
+CITY_CENTRES = [
+    (12.97, 77.59),
+    (19.07, 72.87),
+    (28.61, 77.20),
+    (13.08, 80.27),
+    (22.57, 88.36),
+    (17.38, 78.48),
+    (18.52, 73.86),
+    (23.02, 72.57),
+]
+
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Meera", "Kabir", "Ananya", "Rohan", "Saanvi", "Vivaan", "Anika", "Arjun", "Zara"]
+LAST_NAMES = ["Sharma", "Iyer", "Reddy", "Khan", "Patel", "Das", "Menon", "Singh", "Gupta", "Nair"]
+CATEGORY_NAMES = ["Hair", "Skin", "Nails", "Spa", "Makeup", "Beard", "Colour", "Treatment", "Styling"]
+SERVICE_NAMES = ["Cut", "Wash", "Trim", "Facial", "Massage", "Manicure", "Pedicure", "Wax", "Blow Dry", "Polish"]
+SERVICE_DURATIONS = [15, 30, 45, 60]
+PACKAGE_DURATIONS = [30, 60, 90]
+
+# Every staff member works Monday to Saturday, 9:00 to 17:00, and is booked
+# in two hour slots, so appointments of at most two hours never overlap
+OPENING, CLOSING = 9, 17
+SLOT_HOURS = 2
+SLOTS_PER_DAY = (CLOSING - OPENING) // SLOT_HOURS
+WORKING_DAYS = 6
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate businesses around a few city centres with category trees, services, packages, "
+        "staff, clients and appointments, plus customers and OTPs. The same --seed and "
+        "--start-date give the same data on an empty database. Rows are written with "
+        "bulk_create and the appointments' services and packages straight into the through "
+        "tables. Vouchers are seeded by the voucherify_clone project's own seed_benchmark_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--businesses", type=int, default=10)
+        parser.add_argument("--category-depth", type=int, default=3)
+        parser.add_argument("--category-breadth", type=int, default=3, help="root categories, and subcategories of each category")
+        parser.add_argument("--services-per-category", type=int, default=3)
+        parser.add_argument("--packages", type=int, default=5, help="per business")
+        parser.add_argument("--team-members", type=int, default=8, help="per business")
+        parser.add_argument("--clients", type=int, default=200, help="per business")
+        parser.add_argument("--appointments", type=int, default=1000, help="per business")
+        parser.add_argument("--customers", type=int, default=1000)
+        parser.add_argument("--otps", type=int, default=1000)
+        parser.add_argument("--start-date", type=date.fromisoformat, help="first appointment day, YYYY-MM-DD (default: 26 weeks ago)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        needed = ("clients", "team_members", "category_depth", "category_breadth", "services_per_category")
+        if options["appointments"] and not all(options[name] > 0 for name in needed):
+            raise CommandError("Appointments need clients, team members and services: --clients, --team-members, "
+                               "--category-depth, --category-breadth and --services-per-category above 0.")
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        start_date = options["start_date"]
+        if start_date is None:
+            today = timezone.localdate()
+            start_date = today - timedelta(days=today.weekday(), weeks=26)
+        self.start = datetime.combine(start_date, clock(OPENING))
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            businesses = self.create_businesses(options["businesses"])
+            totals = dict.fromkeys(["categories", "services", "packages", "team members", "clients", "appointments"], 0)
+            for number, business in enumerate(businesses, start=1):
+                for name, count in self.populate(business, options).items():
+                    totals[name] += count
+                self.stdout.write(f"business {number}/{len(businesses)} done, {time.perf_counter() - started:.1f}s")
+            users = self.create_customers(options["customers"])
+            self.create_otps(options["otps"])
+            business_ids = [business.pk for business in businesses]
+
+            def invalidate():
+                for business_id in business_ids:
+                    bump_business_version(business_id)
+                coordinate_index.invalidate()
+
+            # bulk_create sends no signals
+            transaction.on_commit(invalidate)
+
+        counts = {"businesses": len(businesses), **totals, "customers": len(users), "otps": options["otps"]}
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in counts.items()))
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s"))
+
+    def next_number(self, model):
+        # Unique columns are numbered after the rows already there, so a
+        # second run adds to the data instead of failing
+        return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+    def bulk_create(self, model, rows):
+        return model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def person(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def create_businesses(self, count):
+        first = self.next_number(Business)
+        businesses = []
+        for n in range(first, first + count):
+            centre_latitude, centre_longitude = self.rng.choice(CITY_CENTRES)
+            latitude = round(centre_latitude + self.rng.gauss(0, 0.15), 6)
+            longitude = round(centre_longitude + self.rng.gauss(0, 0.15), 6)
+            first_name, last_name = self.person()
+            businesses.append(Business(
+                phone_number=f"+9170{n:08d}",
+                owner_name=f"{first_name} {last_name}",
+                salon_name=f"{last_name} Salon {n}",
+                owner_email=f"owner{n}@bench.example.com",
+                salon_description=f"{self.rng.choice(CATEGORY_NAMES)} and {self.rng.choice(CATEGORY_NAMES)} studio",
+                latitude=latitude,
+                longitude=longitude,
+                # bulk_create skips Business.save()
+                geo_cell=geo_cell(latitude, longitude),
+            ))
+        return self.bulk_create(Business, businesses)
+
+    def populate(self, business, options):
+        categories = self.create_categories(business, options["category_depth"], options["category_breadth"])
+        services = self.bulk_create(Services, [
+            Services(
+                business=business,
+                category=category,
+                service_name=f"{category.name} {self.rng.choice(SERVICE_NAMES)}",
+                service_type=self.rng.choice(["Basic", "Basic", "Premium", "Add-on"]),
+                duration_in_mins=self.rng.choice(SERVICE_DURATIONS),
+                price=self.rng.randrange(100, 3000, 50),
+            )
+            for category in categories
+            for _ in range(options["services_per_category"])
+        ])
+        packages = self.bulk_create(Packages, [
+            Packages(
+                business=business,
+                package_name=f"Package {i + 1}",
+                package_duration_in_mins=self.rng.choice(PACKAGE_DURATIONS),
+                package_price=self.rng.randrange(1000, 10000, 250),
+            )
+            for i in range(options["packages"])
+        ])
+        staff = self.create_team(business, options["team_members"])
+        clients = self.create_clients(business, options["clients"])
+        appointments = self.create_appointments(business, options["appointments"], staff, clients, services, packages)
+        return {
+            "categories": len(categories),
+            "services": len(services),
+            "packages": len(packages),
+            "team members": len(staff),
+            "clients": len(clients),
+            "appointments": appointments,
+        }
+
+    def create_categories(self, business, depth, breadth):
+        """A tree `depth` levels deep, inserted a level at a time so the paths can use the new ids."""
+        categories, parents = [], [None]
+        for level in range(depth):
+            children = self.bulk_create(ServiceCategory, [
+                ServiceCategory(business=business, parent=parent, name=self.rng.choice(CATEGORY_NAMES), depth=level)
+                for parent in parents
+                for _ in range(breadth)
+            ])
+            for category in children:
+                parent_path = category.parent.path if category.parent is not None else ""
+                category.path = parent_path + ServiceCategory.path_segment(category.pk)
+            ServiceCategory.objects.bulk_update(children, ["path"], batch_size=self.batch_size)
+            categories += children
+            parents = children
+        return categories
+
+    def create_team(self, business, count):
+        staff = []
+        for i in range(count):
+            first_name, last_name = self.person()
+            staff.append(TeamMember(
+                business=business,
+                first_name=first_name,
+                last_name=last_name,
+                phone_number=f"+7{business.pk:06d}{i:05d}",
+                member_email=f"staff{business.pk}-{i}@bench.example.com",
+                date_of_joining=self.start.date() - timedelta(days=self.rng.randrange(30, 1500)),
+                access_type="Super Admin" if i == 0 else "Admin",
+            ))
+        staff = self.bulk_create(TeamMember, staff)
+        self.bulk_create(WorkingHours, [
+            # bulk_create skips WorkingHours.save(), which copies the business
+            WorkingHours(business=business, staff=member, weekday=weekday, start_time=clock(OPENING), end_time=clock(CLOSING))
+            for member in staff
+            for weekday in range(WORKING_DAYS)
+        ])
+        return staff
+
+    def create_clients(self, business, count):
+        clients = []
+        for i in range(count):
+            first_name, last_name = self.person()
+            clients.append(Client(
+                business=business,
+                client_name=f"{first_name} {last_name}",
+                client_type=self.rng.choice(["Regular", "Regular", "Premium", "Corporate", "Walk-in"]),
+                client_email=f"client{business.pk}-{i}@bench.example.com",
+                client_phone=f"+8{business.pk:06d}{i:07d}",
+                client_dob=date(1960, 1, 1) + timedelta(days=self.rng.randrange(45 * 365)),
+                client_gender=self.rng.choice(["Male", "Female", "Rather Not to Say"]),
+            ))
+        return self.bulk_create(Client, clients)
+
+    def slot_start(self, slot):
+        day, period = divmod(slot, SLOTS_PER_DAY)
+        week, weekday = divmod(day, WORKING_DAYS)
+        return self.start + timedelta(weeks=week, days=weekday, hours=period * SLOT_HOURS)
+
+    def create_appointments(self, business, count, staff, clients, services, packages):
+        """
+        `count` appointments spread over the staff's slots, written a batch at a
+        time with their totals, and their services and packages written straight
+        to the through tables.
+        """
+        services_through = Appointment.services.through
+        packages_through = Appointment.packages.through
+        next_slot = [0] * len(staff)
+        created = 0
+        while created < count:
+            batch, links = [], []
+            for i in range(created, min(created + self.batch_size, count)):
+                member = i % len(staff)
+                # Leave some slots free
+                next_slot[member] += self.rng.choice([0, 0, 0, 1])
+                starts = self.slot_start(next_slot[member])
+                next_slot[member] += 1
+
+                chosen = self.rng.sample(services, min(self.rng.randint(1, 3), len(services)))
+                while len(chosen) > 1 and sum(service.duration_in_mins for service in chosen) > SLOT_HOURS * 60:
+                    chosen.pop()
+                duration = sum(service.duration_in_mins for service in chosen)
+                package = self.rng.choice(packages) if packages and self.rng.random() < 0.3 else None
+                if package is not None and duration + package.package_duration_in_mins > SLOT_HOURS * 60:
+                    package = None
+                status = self.rng.choices(["Completed", "Scheduled", "Cancelled"], weights=[6, 3, 1])[0]
+                appointment = Appointment(
+                    business=business,
+                    staff=staff[member],
+                    client_appointments=self.rng.choice(clients),
+                    appointment_date=starts.date(),
+                    appointment_time=starts.time(),
+                    status=status,
+                    payment_status="Completed" if status == "Completed" else "Pending",
+                    pay_mode=self.rng.choice(["Online", "Offline"]),
+                )
+                appointment.calculate_totals(chosen, [package] if package is not None else [])
+                batch.append(appointment)
+                links.append((chosen, package))
+
+            batch = self.bulk_create(Appointment, batch)
+            self.bulk_create(services_through, [
+                services_through(appointment_id=appointment.pk, services_id=service.pk)
+                for appointment, (chosen, _) in zip(batch, links)
+                for service in chosen
+            ])
+            self.bulk_create(packages_through, [
+                packages_through(appointment_id=appointment.pk, packages_id=package.pk)
+                for appointment, (_, package) in zip(batch, links)
+                if package is not None
+            ])
+            created += len(batch)
+        return created
+
+    def create_customers(self, count):
+        first = self.next_number(Customer)
+        numbers = range(first, first + count)
+        # Unusable passwords, hashing a real one would dominate the run
+        users = self.bulk_create(User, [User(username=f"bench-customer-{n}", password="!") for n in numbers])
+        customers = []
+        for n, user in zip(numbers, users):
+            first_name, last_name = self.person()
+            customers.append(Customer(
+                user=user,
+                unique_id=f"B{n:09d}",
+                name=f"{first_name} {last_name}",
+                email=f"customer{n}@bench.example.com",
+                phone_number=f"+6{n:010d}",
+                date_of_birth=date(1960, 1, 1) + timedelta(days=self.rng.randrange(45 * 365)),
+            ))
+        self.phone_numbers = [customer.phone_number for customer in self.bulk_create(Customer, customers)]
+        return users
+
+    def create_otps(self, count):
+        if not count:
+            return
+        phone_numbers = self.phone_numbers or [f"+6{n:010d}" for n in range(1, 1001)]
+        self.bulk_create(OTP, [
+            OTP(phone_number=self.rng.choice(phone_numbers), otp=str(self.rng.randrange(1000, 10000)), is_verified=self.rng.random() < 0.7)
+            for _ in range(count)
+        ])
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+# Must match ServiceCategory.PATH_SEGMENT_WIDTH at the time of this migration
+PATH_SEGMENT_WIDTH = 10
+
+
+def backfill_category_paths(apps, schema_editor):
+    ServiceCategory = apps.get_model("api", "ServiceCategory")
+    categories = list(ServiceCategory.objects.only("id", "parent_id"))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    # Walk down from the roots so every parent path is known before its children
+    pending = [(category, "", 0) for category in children.get(None, [])]
+    updated = []
+    while pending:
+        category, parent_path, depth = pending.pop()
+        category.path = f"{parent_path}{category.id:0{PATH_SEGMENT_WIDTH}d}/"
+        category.depth = depth
+        updated.append(category)
+        pending.extend(
+            (child, category.path, depth + 1) for child in children.get(category.id, [])
+        )
+    ServiceCategory.objects.bulk_update(updated, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0047_business_created_at_alter_business_profile_img"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicecategory",
+            name="depth",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="servicecategory",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0048_servicecategory_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="end_time",
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="appointment",
+            name="total_amount",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="appointment",
+            name="total_duration_mins",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+# Grid size of api.geo at the time of this migration
+GEO_CELL_DEGREES = 0.1
+LON_CELLS = 3600
+LAT_CELLS = 1800
+
+
+def backfill_geo_cells(apps, schema_editor):
+    Business = apps.get_model("api", "Business")
+    businesses = list(Business.objects.only("id", "latitude", "longitude"))
+    for business in businesses:
+        row = min(
+            max(int((business.latitude + 90) / GEO_CELL_DEGREES), 0), LAT_CELLS - 1
+        )
+        column = int(((business.longitude + 180) % 360) / GEO_CELL_DEGREES) % LON_CELLS
+        business.geo_cell = row * LON_CELLS + column
+    Business.objects.bulk_update(businesses, ["geo_cell"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0049_appointment_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="business",
+            name="geo_cell",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0050_business_geo_cell"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["business", "appointment_date", "appointment_time"],
+                name="appt_business_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["business", "status"], name="appt_business_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["staff", "appointment_date", "appointment_time"],
+                name="appt_staff_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["phone_number"], name="customer_phone_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["email"], name="customer_email_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="otp",
+            index=models.Index(
+                fields=["phone_number", "created_at"], name="otp_phone_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="otp",
+            index=models.Index(fields=["created_at"], name="otp_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="servicecategory",
+            index=models.Index(
+                fields=["business", "path"], name="category_business_path_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="services",
+            index=models.Index(
+                fields=["business", "category"], name="services_business_cat_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0051_tenant_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["appointment_date", "appointment_time", "id"],
+                name="appt_date_time_idx",
+            ),
+        ),
+    ]
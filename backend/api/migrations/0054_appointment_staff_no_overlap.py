@@ -0,0 +1,52 @@
+import warnings
+
+from django.db import DatabaseError, migrations, transaction
+
+CONSTRAINT = "appointment_staff_no_overlap"
+
+
+def add_no_overlap_constraint(apps, schema_editor):
+    """
+    Reject overlapping appointments of a staff member in the database. Only on
+    PostgreSQL with btree_gist available; otherwise api.booking falls back to
+    locking the staff member's row.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cursor.execute(
+                f"""
+                ALTER TABLE api_appointment ADD CONSTRAINT {CONSTRAINT}
+                EXCLUDE USING gist (
+                    staff_id WITH =,
+                    tsrange(appointment_date + appointment_time, appointment_date + end_time, '[)') WITH &&
+                )
+                WHERE (status <> 'Cancelled' AND staff_id IS NOT NULL AND end_time IS NOT NULL)
+                """
+            )
+    except DatabaseError as exc:
+        warnings.warn(
+            f"{CONSTRAINT} was not created ({exc}). Bookings are checked with row locks instead. "
+            f"To add it later install btree_gist, resolve overlapping appointments and run "
+            f"'migrate api 0053' followed by 'migrate api'.",
+            RuntimeWarning,
+        )
+
+
+def remove_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"ALTER TABLE api_appointment DROP CONSTRAINT IF EXISTS {CONSTRAINT}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0053_workinghours"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_no_overlap_constraint, remove_no_overlap_constraint),
+    ]
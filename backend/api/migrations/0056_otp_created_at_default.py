@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0055_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="otp",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from datetime import datetime, time, timedelta
+
+from django.db import migrations
+from django.db.models import Sum
+
+BATCH_SIZE = 1000
+
+
+def end_of(appointment):
+    # Appointment.compute_end_time() as of this migration
+    start = datetime.combine(appointment.appointment_date, appointment.appointment_time)
+    end = start + timedelta(minutes=appointment.total_duration_mins)
+    return min(end, datetime.combine(appointment.appointment_date, time.max)).time()
+
+
+def backfill_totals(apps, schema_editor):
+    """
+    Fill total_amount, total_duration_mins and end_time, added empty by 0049,
+    from each appointment's services and packages, a batch at a time.
+    """
+    Appointment = apps.get_model("api", "Appointment")
+    relations = (
+        (Appointment.services.through, "services", "price", "duration_in_mins"),
+        (Appointment.packages.through, "packages", "package_price", "package_duration_in_mins"),
+    )
+    appointments = Appointment.objects.order_by("pk").only("appointment_date", "appointment_time")
+    last_pk = 0
+    while batch := list(appointments.filter(pk__gt=last_pk)[:BATCH_SIZE]):
+        last_pk = batch[-1].pk
+        ids = [appointment.pk for appointment in batch]
+        sums = {}
+        for through, related, price, duration in relations:
+            rows = (
+                through.objects.filter(appointment_id__in=ids)
+                .values("appointment_id")
+                .annotate(amount=Sum(f"{related}__{price}"), duration=Sum(f"{related}__{duration}"))
+                .values_list("appointment_id", "amount", "duration")
+            )
+            for appointment_id, amount, minutes in rows:
+                total = sums.setdefault(appointment_id, [0, 0])
+                total[0] += amount or 0
+                total[1] += minutes or 0
+        for appointment in batch:
+            appointment.total_amount, appointment.total_duration_mins = sums.get(appointment.pk, (0, 0))
+            appointment.end_time = end_of(appointment)
+        Appointment.objects.bulk_update(batch, ["total_amount", "total_duration_mins", "end_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0056_otp_created_at_default"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
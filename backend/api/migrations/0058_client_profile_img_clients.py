@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0057_backfill_appointment_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="profile_img_clients",
+            field=models.ImageField(
+                blank=True, null=True, upload_to="client-profiles/"
+            ),
+        ),
+    ]
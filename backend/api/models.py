@@ -1,12 +1,15 @@
 from django.db import models
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Concat, Substr
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 import random
 from phonenumber_field.modelfields import PhoneNumberField
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.utils.timezone import now
 from django.contrib.auth.models import User
 import string
+from .geo import geo_cell
 
 # Validation for image size
 def validate_image_size(file):
@@ -16,6 +19,7 @@ def validate_image_size(file):
 
 class Business(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     phone_number = models.CharField(max_length=20, unique=True)
     owner_name = models.CharField(max_length=100)
     salon_name = models.CharField(max_length=100)
@@ -24,10 +28,19 @@ class Business(models.Model):
     salon_description = models.TextField(blank=True)
     latitude = models.FloatField()
     longitude = models.FloatField()
+    # Grid cell of (latitude, longitude) for indexed radius searches, see api.geo
+    geo_cell = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     profile_img = models.ImageField(upload_to="profiles/", null=True, blank=True, validators=[validate_image_size])
 
     def __str__(self):
         return self.salon_name
+
+    def save(self, *args, **kwargs):
+        self.geo_cell = geo_cell(float(self.latitude), float(self.longitude))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
     
 def generate_unique_id() : 
     length = 8
@@ -37,10 +50,6 @@ def generate_unique_id() :
             break
     return unique_id
 
-def validate_image_size(file):
-    max_size = 2 * 1024 * 1024  # 2 MB
-    if file.size > max_size:
-        raise ValidationError("File size exceeds the 2 MB limit.")
 # Create your models here.
 class Customer(models.Model) :
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='customer_profile', null=True, blank=True)
@@ -52,15 +61,76 @@ class Customer(models.Model) :
     created_at = models.DateTimeField(auto_now_add=True)
     profile_picture = models.ImageField(null=True, blank=True, validators=[validate_image_size])
 
+    class Meta:
+        indexes = [
+            # user_exists() and the signup lookups
+            models.Index(fields=['phone_number'], name='customer_phone_idx'),
+            models.Index(fields=['email'], name='customer_email_idx'),
+        ]
+
 class ServiceCategory(models.Model):
+    PATH_SEGMENT_WIDTH = 10
+
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='business_categories')
     name = models.CharField(max_length=50)
     description = models.TextField(null=True, blank=True, max_length=255)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
+    # Materialized path of zero padded ancestor ids ending with this category's
+    # own id, e.g. "0000000001/0000000007/". A subtree is a path prefix match.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default="")
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    _loaded_parent_id = None
+
+    class Meta:
+        indexes = [
+            # A business's whole tree in path order
+            models.Index(fields=['business', 'path'], name='category_business_path_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.parent_id
+        return instance
+
+    @classmethod
+    def path_segment(cls, pk):
+        return f"{pk:0{cls.PATH_SEGMENT_WIDTH}d}/"
+
+    def save(self, *args, **kwargs):
+        parent_changed = self._state.adding or self.parent_id != self._loaded_parent_id
+        parent = None
+        if parent_changed and self.parent_id is not None:
+            parent = ServiceCategory.objects.only('path', 'depth').get(pk=self.parent_id)
+            if self.path and parent.path.startswith(self.path):
+                raise ValidationError("A category cannot be moved under itself or one of its subcategories.")
+        super().save(*args, **kwargs)
+        if parent_changed:
+            self._move_subtree(parent)
+        self._loaded_parent_id = self.parent_id
+
+    def _move_subtree(self, parent):
+        """
+        Recompute this category's path under `parent` and rewrite the paths of
+        all its descendants with a single UPDATE.
+        """
+        old_path, old_depth = self.path, self.depth
+        segment = self.path_segment(self.pk)
+        self.path = parent.path + segment if parent else segment
+        self.depth = parent.depth + 1 if parent else 0
+        ServiceCategory.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth, updated_at=now())
+        if old_path and old_path != self.path:
+            ServiceCategory.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+                updated_at=now(),
+            )
+
 class Services(models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='business_services')
     service_name = models.CharField(max_length=50)
@@ -72,6 +142,12 @@ class Services(models.Model):
     price = models.PositiveIntegerField()
     category = models.ForeignKey(ServiceCategory, on_delete=models.CASCADE, null=True, blank=True, related_name="services")
     service_image = models.ImageField(upload_to="services-images/", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'category'], name='services_business_cat_idx'),
+        ]
 
     def __str__(self):
         return self.service_name
@@ -81,6 +157,7 @@ class Packages(models.Model):
     package_name = models.CharField(max_length=50)
     package_duration_in_mins = models.PositiveIntegerField()
     package_price = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.package_name
@@ -100,6 +177,7 @@ class Client(models.Model):
         max_length=20,
         choices=[("Male", "Male"), ("Female", "Female"), ("Rather Not to Say", "Rather Not to Say")]
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.client_name
@@ -116,10 +194,55 @@ class TeamMember(models.Model):
         max_length=50,
         choices=[("Super Admin", "Super Admin"), ("Admin", "Admin")]
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+class WorkingHours(models.Model):
+    """
+    One shift of a team member on a day of the week. A day can have several
+    shifts (e.g. around a lunch break); a member without any rows works the
+    salon's default hours (settings.DEFAULT_WORKING_HOURS), see api.availability.
+    """
+    WEEKDAYS = [
+        (0, "Monday"),
+        (1, "Tuesday"),
+        (2, "Wednesday"),
+        (3, "Thursday"),
+        (4, "Friday"),
+        (5, "Saturday"),
+        (6, "Sunday"),
+    ]
+
+    # Copied from the staff member so a salon's hours load with one query
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='working_hours', editable=False)
+    staff = models.ForeignKey(TeamMember, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['staff', 'weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['business', 'weekday'], name='hours_business_weekday_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')), name='hours_end_after_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.staff} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+    def clean(self):
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError("The shift must end after it starts.")
+
+    def save(self, *args, **kwargs):
+        self.business_id = self.staff.business_id
+        super().save(*args, **kwargs)
+
 class Appointment(models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='business_appointments')
     services = models.ManyToManyField(Services, related_name="appointments")
@@ -151,29 +274,136 @@ class Appointment(models.Model):
         max_length=10
     )
     notes = models.TextField(null=True, blank=True)
+    # Denormalized from the services and packages, recomputed by refresh_totals()
+    # whenever either set changes (see api.signals)
+    total_amount = models.PositiveIntegerField(default=0, editable=False)
+    total_duration_mins = models.PositiveIntegerField(default=0, editable=False)
+    end_time = models.TimeField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Date bounded appointment lists of a business, in calendar order
+            models.Index(fields=['business', 'appointment_date', 'appointment_time'], name='appt_business_date_idx'),
+            models.Index(fields=['business', 'status'], name='appt_business_status_idx'),
+            # Keyset pages of the unfiltered appointment list
+            models.Index(fields=['appointment_date', 'appointment_time', 'id'], name='appt_date_time_idx'),
+            # A staff member's day
+            models.Index(fields=['staff', 'appointment_date', 'appointment_time'], name='appt_staff_date_idx'),
+        ]
 
     def __str__(self):
         return f"Appointment for {self.client_appointments.client_name} on {self.appointment_date}"
-    
-    def total_amount(self):
+
+    def save(self, *args, **kwargs):
+        self.end_time = self.compute_end_time()
+        super().save(*args, **kwargs)
+
+    def compute_end_time(self):
         """
-        Calculate the total amount for the appointment by summing up the prices of all services and packages.
+        Start time plus the total duration, capped at the end of the day since
+        an appointment does not carry over into the next date.
         """
-        # Sum of service prices
-        service_total = sum(service.price for service in self.services.all())
-        
-        # Sum of package prices
-        package_total = sum(package.package_price for package in self.packages.all())
-        
-        # Return the total amount
-        return service_total + package_total
+        appointment_date = self._meta.get_field('appointment_date').to_python(self.appointment_date)
+        appointment_time = self._meta.get_field('appointment_time').to_python(self.appointment_time)
+        if appointment_date is None or appointment_time is None:
+            return None
+        start = datetime.combine(appointment_date, appointment_time)
+        end = start + timedelta(minutes=self.total_duration_mins)
+        return min(end, datetime.combine(appointment_date, time.max)).time()
+
+    def calculate_totals(self, services, packages):
+        """
+        Set total_amount, total_duration_mins and end_time from the given
+        services and packages without saving.
+        """
+        self.total_amount = sum(service.price for service in services) + sum(
+            package.package_price for package in packages
+        )
+        self.total_duration_mins = sum(service.duration_in_mins for service in services) + sum(
+            package.package_duration_in_mins for package in packages
+        )
+        self.end_time = self.compute_end_time()
+
+    def refresh_totals(self):
+        """
+        Recompute the stored totals from the current services and packages and
+        write them with a single UPDATE.
+        """
+        services = self.services.aggregate(amount=Sum('price'), duration=Sum('duration_in_mins'))
+        packages = self.packages.aggregate(amount=Sum('package_price'), duration=Sum('package_duration_in_mins'))
+        self.total_amount = (services['amount'] or 0) + (packages['amount'] or 0)
+        self.total_duration_mins = (services['duration'] or 0) + (packages['duration'] or 0)
+        self.end_time = self.compute_end_time()
+        self.updated_at = now()
+        Appointment.objects.filter(pk=self.pk).update(
+            total_amount=self.total_amount,
+            total_duration_mins=self.total_duration_mins,
+            end_time=self.end_time,
+            updated_at=self.updated_at,
+        )
+
+    @classmethod
+    def refresh_totals_of(cls, appointment_ids):
+        """
+        refresh_totals() for many appointments with four queries whatever
+        their number: the services' and packages' sums per appointment, the
+        appointments' start, and one UPDATE setting each column with a CASE
+        over the appointments grouped by their new value.
+        """
+        sums = {}
+        for through, related, price, duration in (
+            (cls.services.through, 'services', 'price', 'duration_in_mins'),
+            (cls.packages.through, 'packages', 'package_price', 'package_duration_in_mins'),
+        ):
+            rows = (
+                through.objects.filter(appointment_id__in=appointment_ids)
+                .values('appointment_id')
+                .annotate(amount=Sum(f'{related}__{price}'), duration=Sum(f'{related}__{duration}'))
+                .values_list('appointment_id', 'amount', 'duration')
+            )
+            for appointment_id, amount, minutes in rows:
+                total = sums.setdefault(appointment_id, [0, 0])
+                total[0] += amount
+                total[1] += minutes
+        # column -> new value -> ids of the appointments getting it
+        values = {'total_amount': {}, 'total_duration_mins': {}, 'end_time': {}}
+        found = []
+        for appointment in cls.objects.filter(pk__in=appointment_ids).only('appointment_date', 'appointment_time'):
+            amount, minutes = sums.get(appointment.pk, (0, 0))
+            appointment.total_duration_mins = minutes
+            values['total_amount'].setdefault(amount, []).append(appointment.pk)
+            values['total_duration_mins'].setdefault(minutes, []).append(appointment.pk)
+            values['end_time'].setdefault(appointment.compute_end_time(), []).append(appointment.pk)
+            found.append(appointment.pk)
+        if not found:
+            return
+        cls.objects.filter(pk__in=found).update(
+            updated_at=now(),
+            **{
+                column: Case(
+                    *(When(pk__in=ids, then=Value(value)) for value, ids in by_value.items()),
+                    output_field=cls._meta.get_field(column),
+                )
+                for column, by_value in values.items()
+            },
+        )
 
 
 class OTP(models.Model):
     phone_number = PhoneNumberField(unique=False)
     otp = models.CharField(max_length=4)
     is_verified = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: audit rows are written in bulk after the fact and
+    # carry the time the code was issued
+    created_at = models.DateTimeField(default=now, editable=False)
+
+    class Meta:
+        indexes = [
+            # Latest code for a number, and the purge_otps retention cut-off
+            models.Index(fields=['phone_number', 'created_at'], name='otp_phone_created_idx'),
+            models.Index(fields=['created_at'], name='otp_created_idx'),
+        ]
 
     def generate_otp(self):
         self.otp = str(random.randint(1000, 9999))
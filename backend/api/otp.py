@@ -0,0 +1,150 @@
+"""
+One-time passwords for both the business login (send-otp/ and verify-otp/)
+and the customer app (auth/login, auth/signup, auth/verify-otp).
+
+Live codes and their attempt counters are kept in the cache with a native
+TTL, so issuing and checking a code never touches the database. The OTP table
+is only an optional audit log: rows are buffered in memory and written with
+bulk_create, and the purge_otps command deletes rows past their retention.
+
+The audit log is best effort. The buffer is written when the process exits
+normally, but rows still buffered when a worker is killed are lost, and a
+batch the database refuses is logged and dropped rather than failing the
+request that happened to fill it.
+"""
+import atexit
+import logging
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VERIFIED = 'verified'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+TOO_MANY_ATTEMPTS = 'too_many_attempts'
+
+
+class OTPAuditLog:
+    """Buffers OTP audit rows and writes them to the OTP table in bulk."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._issued = []
+        self._verified = []
+        self._last_flush = time.monotonic()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'OTP_AUDIT_LOG', True)
+
+    def record_issued(self, phone_number, code):
+        if self.enabled:
+            self._add(self._issued, (phone_number, code, timezone.now()))
+
+    def record_verified(self, phone_number, code):
+        if self.enabled:
+            self._add(self._verified, (phone_number, code, timezone.now()))
+
+    def _add(self, buffer, entry):
+        with self._lock:
+            buffer.append(entry)
+            pending = len(self._issued) + len(self._verified)
+            due = time.monotonic() - self._last_flush >= getattr(settings, 'OTP_AUDIT_FLUSH_INTERVAL', 60)
+        if pending >= getattr(settings, 'OTP_AUDIT_BATCH_SIZE', 100) or due:
+            # Not inside the request's transaction, so a failed write cannot
+            # roll back or fail the request
+            transaction.on_commit(self.flush)
+
+    def flush(self):
+        with self._lock:
+            issued, self._issued = self._issued, []
+            verified, self._verified = self._verified, []
+            self._last_flush = time.monotonic()
+        try:
+            self._write(issued, verified)
+        except DatabaseError:
+            logger.exception("Dropped %d OTP audit rows", len(issued) + len(verified))
+
+    def _write(self, issued, verified):
+        from .models import OTP
+
+        if issued:
+            OTP.objects.bulk_create([
+                OTP(phone_number=phone_number, otp=code, created_at=issued_at)
+                for phone_number, code, issued_at in issued
+            ])
+        if verified:
+            # Issuing a code replaces the previous one, so a verified code is
+            # the one of the last row issued to the number before then; an
+            # older row that happened to get the same code is left alone
+            matches = Q()
+            for phone_number, code, verified_at in verified:
+                latest = (
+                    OTP.objects.filter(phone_number=phone_number, created_at__lte=verified_at)
+                    .order_by('-created_at', '-pk')
+                    .values('pk')[:1]
+                )
+                matches |= Q(pk=Subquery(latest), otp=code)
+            OTP.objects.filter(matches, is_verified=False).update(is_verified=True)
+
+
+class OTPService:
+    def __init__(self, audit_log=None):
+        self.audit_log = audit_log or OTPAuditLog()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'OTP_TTL_SECONDS', 300)
+
+    @property
+    def max_attempts(self):
+        return getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+    def _code_key(self, phone_number):
+        return f"otp:{phone_number}"
+
+    def _attempts_key(self, phone_number):
+        return f"otp:{phone_number}:attempts"
+
+    def issue(self, phone_number):
+        """Create a new 4 digit code for phone_number, replacing any previous one."""
+        phone_number = str(phone_number)
+        code = str(1000 + secrets.randbelow(9000))
+        cache.set_many({self._code_key(phone_number): code, self._attempts_key(phone_number): 0}, timeout=self.ttl)
+        self.audit_log.record_issued(phone_number, code)
+        return code
+
+    def verify(self, phone_number, code):
+        """
+        Check a code. Returns VERIFIED (the code is consumed), INVALID,
+        EXPIRED (also when none was issued) or TOO_MANY_ATTEMPTS.
+        """
+        phone_number = str(phone_number)
+        expected = cache.get(self._code_key(phone_number))
+        if expected is None:
+            return EXPIRED
+        try:
+            attempts = cache.incr(self._attempts_key(phone_number))
+        except ValueError:
+            # The counter expired between the two reads
+            return EXPIRED
+        if attempts > self.max_attempts:
+            cache.delete_many([self._code_key(phone_number), self._attempts_key(phone_number)])
+            return TOO_MANY_ATTEMPTS
+        if not secrets.compare_digest(str(expected), str(code)):
+            return INVALID
+        cache.delete_many([self._code_key(phone_number), self._attempts_key(phone_number)])
+        self.audit_log.record_verified(phone_number, str(expected))
+        return VERIFIED
+
+
+otp_service = OTPService()
+atexit.register(otp_service.audit_log.flush)
@@ -0,0 +1,124 @@
+"""
+Keyset pagination.
+
+A page is the rows strictly after the last row of the previous page in the
+list's ordering, so fetching page 1000 costs the same index range scan as
+page 1, and rows inserted while a client pages through the list do not shift
+or repeat results the way LIMIT/OFFSET pages do. No COUNT query is made.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Orders by `ordering`, all ascending and ending with a unique column, and
+    returns {'next': url, 'results': [...]}; next is null on the last page.
+    The cursor is the opaque, URL safe encoding of the last row's ordering
+    values.
+    """
+
+    ordering = ('id',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.position_of(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def position_of(self, row):
+        # str() keeps dates and times in their ISO form, which the field's
+        # to_python() reads back when the cursor is decoded
+        return [str(getattr(row, field)) for field in self.ordering]
+
+    def after(self, values):
+        """
+        (a, b, c) > (x, y, z) spelled out as
+        a >= x AND (a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)).
+        The leading a >= x is redundant but lets the database start an index
+        range scan at the cursor instead of filtering the whole index.
+        """
+        later = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            later |= equal & Q(**{f'{field}__gt': value})
+            equal &= Q(**{field: value})
+        return Q(**{f'{self.ordering[0]}__gte': values[0]}) & later
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if not all(isinstance(value, (str, int)) and not isinstance(value, bool) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        values = []
+        try:
+            for field, value in zip(self.ordering, position):
+                field = model._meta.get_field(field)
+                value = field.to_python(value)
+                # Range checks, so an id too big for the column is not sent to the database
+                field.run_validators(value)
+                values.append(value)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return values
@@ -1,7 +1,27 @@
 # serializers.py
 from rest_framework import serializers
-from .models import Business, OTP, ServiceCategory, Services, Client, TeamMember, Appointment, Packages, Customer
+from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from .models import Business, OTP, ServiceCategory, Services, Client, TeamMember, WorkingHours, Appointment, Packages, Customer
 from phonenumber_field.serializerfields import PhoneNumberField
+from .booking import save_appointment
+
+class DynamicFieldsMixin:
+    """
+    Takes an optional `fields` argument naming the fields to keep, so a client
+    can ask for a subset of the representation with ?fields=a,b,c.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def readable_fields(cls):
+        return [name for name, field in cls().fields.items() if not field.write_only]
 
 class CustomerSerializer(serializers.ModelSerializer) :
     class Meta:
@@ -30,6 +50,18 @@ class ClientSerializer(serializers.ModelSerializer):
         return client
 
 
+class ClientImportSerializer(serializers.ModelSerializer):
+    """One row of a client import. api.imports checks uniqueness for a whole chunk of rows at once."""
+
+    class Meta:
+        model = Client
+        fields = ['client_name', 'client_type', 'client_email', 'client_phone', 'client_dob', 'client_gender']
+        extra_kwargs = {
+            'client_email': {'validators': []},
+            'client_phone': {'validators': []},
+        }
+
+
 class OTPSerializer(serializers.ModelSerializer):
     phone_number = PhoneNumberField
     
@@ -65,6 +97,38 @@ class ServicesSerializer(serializers.ModelSerializer):
         service = Services.objects.create(business=business, **validated_data)
         return service
     
+def category_children_map(categories):
+    """
+    Group categories under their parent id, in materialized path order, so a
+    whole tree loaded with one query can be nested in memory.
+    """
+    children = {}
+    for category in sorted(categories, key=lambda category: category.path):
+        if category.parent_id is not None:
+            children.setdefault(category.parent_id, []).append(category)
+    return children
+
+
+class ServiceCategoryListSerializer(serializers.ListSerializer):
+    """
+    A queryset or related manager of categories is taken to hold whole
+    trees, like a business's categories or the category list, and is nested
+    as it is. A plain list is a page of them and the trees its rows belong
+    to are loaded with one more query.
+    """
+    def to_representation(self, data):
+        if isinstance(data, (models.Manager, models.QuerySet)):
+            categories = list(data.all())
+            self.context.setdefault('category_children', {}).update(category_children_map(categories))
+            return super().to_representation(categories)
+        categories = list(data)
+        if 'category_children' not in self.context:
+            business_ids = {category.business_id for category in categories}
+            tree = ServiceCategory.objects.filter(business_id__in=business_ids).prefetch_related('services')
+            self.context['category_children'] = category_children_map(tree)
+        return super().to_representation(categories)
+
+
 class ServiceCategorySerializer(serializers.ModelSerializer):
     business_id = serializers.IntegerField(write_only=True)
     subcategories = serializers.SerializerMethodField()
@@ -74,12 +138,25 @@ class ServiceCategorySerializer(serializers.ModelSerializer):
         model = ServiceCategory
         fields = '__all__'
         read_only_fields = ['business']
+        list_serializer_class = ServiceCategoryListSerializer
         
     def get_subcategories(self, obj):
-        # Fetch subcategories for the current category
-        subcategories = obj.subcategories.all()
+        children = self.context.get('category_children')
+        if children is None:
+            # A single category: its subtree is one path prefix query
+            subtree = (
+                ServiceCategory.objects.filter(path__startswith=obj.path)
+                .exclude(pk=obj.pk)
+                .prefetch_related('services')
+            )
+            children = self.context['category_children'] = category_children_map(subtree)
         # Serialize the subcategories using the same serializer
-        return ServiceCategorySerializer(subcategories, many=True).data
+        return ServiceCategorySerializer(children.get(obj.id, []), many=True, context=self.context).data
+
+    def validate_parent(self, parent):
+        if parent and self.instance and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its subcategories.")
+        return parent
 
     def create(self, validated_data):
         business_id = validated_data.pop('business_id')
@@ -128,7 +205,19 @@ class TeamMemberSerializer(serializers.ModelSerializer):
         team_member = TeamMember.objects.create(business=business, **validated_data)
         return team_member
     
-class AppointmentSerializer(serializers.ModelSerializer):
+class WorkingHoursSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkingHours
+        fields = '__all__'
+
+    def validate(self, attrs):
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and end_time <= start_time:
+            raise serializers.ValidationError("The shift must end after it starts.")
+        return attrs
+
+class AppointmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     services = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Services.objects.all()
     )
@@ -142,19 +231,12 @@ class AppointmentSerializer(serializers.ModelSerializer):
     staff = serializers.PrimaryKeyRelatedField(
         queryset=TeamMember.objects.all()
     )
-    total_amount = serializers.SerializerMethodField()
 
     class Meta:
         model = Appointment
         fields = '__all__'
         read_only_fields = ['business', 'client_appointments', 'staff', 'services']
         
-    def get_total_amount(self, obj):
-        """
-        Calculate and return the total amount for the appointment.
-        """
-        return obj.total_amount()
-
     def create(self, validated_data):
         business_id = validated_data.pop('business_id')
         services = validated_data.pop('services', [])
@@ -165,23 +247,52 @@ class AppointmentSerializer(serializers.ModelSerializer):
         except Business.DoesNotExist:
             raise serializers.ValidationError("Business with the given ID does not exist.")
 
-        # Save the appointment instance first
-        appointment = Appointment.objects.create(business=business, **validated_data)
+        # Store the totals with the insert, the services/packages are already
+        # loaded. Raises BookingConflict (409) if the staff member is taken.
+        appointment = Appointment(business=business, **validated_data)
+        return save_appointment(appointment, services, packages)
 
-        # Set many-to-many relationships
-        appointment.services.set(services)
-        if packages:
-            appointment.packages.set(packages)
+    def update(self, instance, validated_data):
+        services = validated_data.pop('services', None)
+        packages = validated_data.pop('packages', None)
+        # Only a new time, staff member or set of services is checked for
+        # conflicts, and so is an appointment that is no longer cancelled
+        reschedule = (
+            services is not None
+            or packages is not None
+            or any(
+                field in validated_data and validated_data[field] != getattr(instance, field)
+                for field in ('appointment_date', 'appointment_time')
+            )
+            or ('staff' in validated_data and getattr(validated_data['staff'], 'pk', None) != instance.staff_id)
+            or (instance.status == 'Cancelled' and validated_data.get('status', 'Cancelled') != 'Cancelled')
+        )
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if services is not None or packages is not None:
+            if services is None:
+                services = list(instance.services.all())
+            if packages is None:
+                packages = list(instance.packages.all())
+        return save_appointment(instance, services, packages, reschedule=reschedule)
 
-        # Calculate the duration (if needed)
-        service_duration = sum(service.duration_in_mins for service in services)
-        package_duration = sum(package.package_duration_in_mins for package in packages)
-        appointment.duration = service_duration + package_duration
-        appointment.save()
 
-        return appointment
 
-        
+class BookingRequestSerializer(serializers.Serializer):
+    """The fields of a customer booking, see BookingRequestMixin.read_booking()."""
+    business_id = serializers.IntegerField()
+    service_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    package_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    appointment_date = serializers.DateField()
+    appointment_time = serializers.TimeField()
+    staff_id = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate(self, attrs):
+        if not (attrs.get('service_ids') or attrs.get('package_ids')):
+            raise serializers.ValidationError("service_ids or package_ids are required.")
+        return attrs
+
+
 class BusinessSerializer(serializers.ModelSerializer):
     clients = ClientSerializer(many=True, read_only=True)
     business_team_members = TeamMemberSerializer(many=True, read_only=True)
@@ -195,6 +306,27 @@ class BusinessSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['created_at']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Prefetch every nested relation so a business costs a constant number
+        of queries regardless of how many rows each collection holds.
+        """
+        return queryset.prefetch_related(
+            'clients',
+            'business_team_members',
+            'business_services',
+            'business_packages',
+            Prefetch(
+                'business_categories',
+                queryset=ServiceCategory.objects.prefetch_related('services'),
+            ),
+            Prefetch(
+                'business_appointments',
+                queryset=Appointment.objects.prefetch_related('services', 'packages'),
+            ),
+        )
+
     def create(self, validated_data):
         business = Business.objects.create(**validated_data)
         return business
@@ -204,4 +336,49 @@ class BusinessSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
-        return instance
\ No newline at end of file
+        return instance
+
+
+class BusinessSummarySerializer(serializers.ModelSerializer):
+    """
+    Business profile plus the size of each nested collection. The collections
+    themselves are served paginated from /business/<id>/<collection>/.
+    """
+    COUNTED_RELATIONS = {
+        'clients_count': Client,
+        'team_members_count': TeamMember,
+        'services_count': Services,
+        'packages_count': Packages,
+        'categories_count': ServiceCategory,
+        'appointments_count': Appointment,
+    }
+
+    clients_count = serializers.IntegerField(read_only=True)
+    team_members_count = serializers.IntegerField(read_only=True)
+    services_count = serializers.IntegerField(read_only=True)
+    packages_count = serializers.IntegerField(read_only=True)
+    categories_count = serializers.IntegerField(read_only=True)
+    appointments_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Business
+        fields = '__all__'
+        read_only_fields = ['created_at']
+
+    @classmethod
+    def annotate_counts(cls, queryset):
+        """
+        Annotate every count as a correlated subquery so the summary stays a
+        single query (joining all six tables would multiply the rows instead).
+        """
+        annotations = {}
+        for name, model in cls.COUNTED_RELATIONS.items():
+            counts = (
+                model.objects.filter(business=OuterRef('pk'))
+                .order_by()
+                .values('business')
+                .annotate(total=Count('pk'))
+                .values('total')
+            )
+            annotations[name] = Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+        return queryset.annotate(**annotations)
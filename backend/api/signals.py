@@ -0,0 +1,161 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_customer, forget_tokens, revoke_user_tokens
+from .booking import totals_set_by_booking
+from .cache import bump_business_version
+from .geo import coordinate_index
+from .models import Appointment, Business, Client, Customer, Packages, ServiceCategory, Services, TeamMember, WorkingHours
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+@receiver(m2m_changed, sender=Appointment.packages.through)
+def refresh_appointment_totals(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep Appointment.total_amount / total_duration_mins / end_time in sync with
+    the services and packages sets, from either side of the relation.
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear') and not totals_set_by_booking.get():
+            instance.refresh_totals()
+        return
+
+    # instance is a Services/Packages row, the appointments are in pk_set,
+    # except for clear() where they have to be captured before removal
+    if action == 'pre_clear':
+        # Auto-created through models name their foreign keys after the models
+        related_field = instance._meta.model_name
+        instance._cleared_appointment_ids = list(
+            sender.objects.filter(**{related_field: instance}).values_list('appointment_id', flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_appointment_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    Appointment.refresh_totals_of(pk_set)
+
+
+@receiver(pre_delete, sender=Services)
+@receiver(pre_delete, sender=Packages)
+def remember_linked_appointments(sender, instance, origin=None, **kwargs):
+    """
+    Deleting services or packages removes their through rows without
+    m2m_changed, so note the appointments that lose them and refresh those
+    once they are gone. A queryset delete notes them for all its rows with
+    one query. Not when the whole business goes, its appointments go too.
+    """
+    if isinstance(origin, Business):
+        return
+    through = Appointment.services.through if sender is Services else Appointment.packages.through
+    related_field = sender._meta.model_name
+    if isinstance(origin, QuerySet) and origin.model is sender:
+        if '_linked_appointment_ids' not in origin.__dict__:
+            origin._linked_appointment_ids = set(
+                through.objects.filter(**{f'{related_field}__in': origin}).values_list('appointment_id', flat=True)
+            )
+        return
+    instance._linked_appointment_ids = set(
+        through.objects.filter(**{related_field: instance}).values_list('appointment_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Services)
+@receiver(post_delete, sender=Packages)
+def refresh_linked_appointments(sender, instance, origin=None, **kwargs):
+    # Sent once the rows of this model and their through rows are deleted
+    holder = origin if isinstance(origin, QuerySet) and origin.model is sender else instance
+    appointment_ids = holder.__dict__.pop('_linked_appointment_ids', None)
+    if appointment_ids:
+        Appointment.refresh_totals_of(appointment_ids)
+
+
+@receiver(post_save, sender=Business)
+def index_business_coordinates(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: coordinate_index.upsert(instance.pk, instance.latitude, instance.longitude)
+    )
+
+
+@receiver(post_delete, sender=Business)
+def unindex_business_coordinates(sender, instance, **kwargs):
+    business_id = instance.pk
+    transaction.on_commit(lambda: coordinate_index.remove(business_id))
+
+
+def invalidate_business_cache(business_id):
+    if business_id is not None:
+        # After the commit, so a reader cannot cache the old rows under the new version
+        transaction.on_commit(lambda: bump_business_version(business_id))
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def invalidate_business(sender, instance, **kwargs):
+    invalidate_business_cache(instance.pk)
+
+
+@receiver(post_save, sender=Services)
+@receiver(post_delete, sender=Services)
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+@receiver(post_save, sender=Packages)
+@receiver(post_delete, sender=Packages)
+@receiver(post_save, sender=TeamMember)
+@receiver(post_delete, sender=TeamMember)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def invalidate_business_rows(sender, instance, **kwargs):
+    invalidate_business_cache(instance.business_id)
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+@receiver(m2m_changed, sender=Appointment.packages.through)
+def invalidate_appointment_links(sender, instance, action, **kwargs):
+    # Either side of the relation carries the business
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_business_cache(instance.business_id)
+
+
+@receiver(post_save, sender=User)
+def revoke_inactive_user_tokens(sender, instance, **kwargs):
+    # JWTs are not checked against the database, so deactivating has to revoke them
+    if not instance.is_active:
+        revoke_user_tokens(instance.pk)
+
+
+def forget_user_auth(user_id, customer_id=None):
+    """Drop the cached opaque tokens and customer of a user, see api.authentication."""
+    def forget():
+        forget_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+        if customer_id is not None:
+            forget_customer(customer_id)
+    # After the commit, so a request cannot cache the old rows again in between
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    forget_user_auth(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def forget_customer_profile(sender, instance, **kwargs):
+    forget_user_auth(instance.user_id, instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: forget_tokens([key]))
@@ -0,0 +1,231 @@
+"""
+Outgoing SMS.
+
+Every message goes through the gateway named by settings.SMS_GATEWAY, one
+instance per process. Request handlers only enqueue messages on the process
+wide `sms_dispatcher`; its worker threads deliver them through the gateway,
+retrying failed sends with exponential backoff.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def otp_message(otp):
+    return f"Your OTP for Wavvy is {otp}. Please do not share it with anyone."
+
+
+class SendMetrics:
+    """Counters and a rolling window of send latencies for one gateway."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.sent = 0
+        self.failed = 0
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._latencies.append(seconds)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            sent, failed = self.sent, self.failed
+        if not latencies:
+            return {'sent': sent, 'failed': failed}
+
+        def percentile(p):
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)
+
+        return {
+            'sent': sent,
+            'failed': failed,
+            'avg_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(latencies[-1] * 1000, 2),
+        }
+
+
+class BaseSMSGateway:
+    """
+    Gateway interface. Subclasses implement deliver(); send() and send_many()
+    add the latency metrics.
+    """
+
+    def __init__(self):
+        self.metrics = SendMetrics()
+
+    def deliver(self, to, body):
+        """Send one message and return the provider's message id."""
+        raise NotImplementedError
+
+    def send(self, to, body):
+        start = time.perf_counter()
+        try:
+            message_id = self.deliver(str(to), body)
+        except Exception:
+            self.metrics.record(time.perf_counter() - start, ok=False)
+            raise
+        self.metrics.record(time.perf_counter() - start, ok=True)
+        return message_id
+
+    def send_many(self, messages):
+        """
+        Send (to, body) pairs. Returns one result per message, either the
+        message id or the exception that send raised, so one bad number does
+        not abort the batch.
+        """
+        return [self._send_or_error(to, body) for to, body in messages]
+
+    def _send_or_error(self, to, body):
+        try:
+            return self.send(to, body)
+        except Exception as exc:
+            return exc
+
+
+class TwilioGateway(BaseSMSGateway):
+    """
+    Sends through Twilio with one REST client, and so one pooled HTTP session,
+    per process. Batches are sent concurrently over that session.
+    """
+
+    def __init__(self):
+        super().__init__()
+        from requests.adapters import HTTPAdapter
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+
+        self.concurrency = getattr(settings, 'SMS_BATCH_CONCURRENCY', 8)
+        http_client = TwilioHttpClient(pool_connections=True, timeout=getattr(settings, 'SMS_GATEWAY_TIMEOUT', 10))
+        http_client.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency))
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+        self.from_number = settings.TWILIO_PHONE_NUMBER
+
+    def deliver(self, to, body):
+        return self.client.messages.create(body=body, from_=self.from_number, to=to).sid
+
+    def send_many(self, messages):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(lambda message: self._send_or_error(*message), messages))
+
+
+class ConsoleGateway(BaseSMSGateway):
+    """Logs messages instead of sending them."""
+
+    def deliver(self, to, body):
+        logger.info("SMS to %s: %s", to, body)
+        return "console"
+
+
+class LocalGateway(BaseSMSGateway):
+    """Records messages in memory instead of sending them, for tests and load tests."""
+
+    def __init__(self):
+        super().__init__()
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def deliver(self, to, body):
+        with self._lock:
+            self.outbox.append({'to': to, 'body': body})
+            return f"local-{len(self.outbox)}"
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(path=None):
+    """The process wide instance of the configured gateway class."""
+    path = path or getattr(settings, 'SMS_GATEWAY', 'api.sms.TwilioGateway')
+    with _gateways_lock:
+        if path not in _gateways:
+            _gateways[path] = import_string(path)()
+        return _gateways[path]
+
+
+class SMSDispatcher:
+    """Background queue delivering SMS off the request thread."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self._workers = []
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, to, body):
+        self.enqueue_many([(to, body)])
+
+    def enqueue_many(self, messages):
+        """Queue (to, body) pairs to be sent as one gateway batch."""
+        messages = [(str(to), body) for to, body in messages]
+        if not messages:
+            return
+        self._ensure_workers()
+        self.queue.put(messages)
+
+    def join(self):
+        """Block until every queued message has been sent or given up on."""
+        self.queue.join()
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        with self._start_lock:
+            if self._workers:
+                return
+            for i in range(getattr(settings, 'SMS_DISPATCH_WORKERS', 2)):
+                worker = threading.Thread(target=self._run, name=f"sms-dispatch-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            messages = self.queue.get()
+            try:
+                self._deliver(messages)
+            except Exception:
+                logger.exception("SMS dispatch failed")
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, messages):
+        max_retries = getattr(settings, 'SMS_MAX_RETRIES', 3)
+        backoff = getattr(settings, 'SMS_RETRY_BACKOFF', 1.0)
+        gateway = get_gateway()
+        for attempt in range(max_retries + 1):
+            results = gateway.send_many(messages)
+            failed = [
+                (message, result) for message, result in zip(messages, results) if isinstance(result, Exception)
+            ]
+            if not failed:
+                return
+            if attempt == max_retries:
+                for (to, _), error in failed:
+                    logger.error("Giving up on SMS to %s after %d attempts: %s", to, attempt + 1, error)
+                return
+            logger.warning("%d of %d SMS failed, retrying", len(failed), len(messages))
+            messages = [message for message, _ in failed]
+            time.sleep(backoff * 2 ** attempt)
+
+
+sms_dispatcher = SMSDispatcher()
+
+
+def send_otp_sms(phone_number, otp):
+    """Queue the OTP message for phone_number, returning without waiting for the gateway."""
+    sms_dispatcher.enqueue(phone_number, otp_message(otp))
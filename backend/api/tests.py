@@ -1,3 +1,2605 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import uuid
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+from unittest import mock
+from datetime import date, datetime, time, timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from phonenumber_field.phonenumber import PhoneNumber
+from phonenumbers import parse
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from .otp import EXPIRED, INVALID, TOO_MANY_ATTEMPTS, VERIFIED, otp_service
+from .sms import BaseSMSGateway, get_gateway, otp_message, sms_dispatcher
+from .geo import coordinate_index, geo_cell, nearby_businesses
+from . import urls as api_urls, views
+from .booking import BookingConflict, has_overlap_constraint, save_appointment
+from .availability import fitting, runs, span, week_availability
+from .holds import slot_holds
+from .cache import business_version, cache_stats
+from .renderers import ORJSONParser, ORJSONRenderer
+from .authentication import tokens_for
+from .instrumentation import route_stats
+from .imports import ClientImport
+from .serializers import BusinessSummarySerializer, ClientImportSerializer
+from .models import OTP, Business, Customer, ServiceCategory, Services, Packages, Client, TeamMember, WorkingHours, Appointment
+
+
+def tearDownModule():
+    # Write the audit rows still buffered while the test database exists,
+    # rather than from the exit handler after it is gone
+    otp_service.audit_log.flush()
+
+
+def create_business(phone_number="+911234567890"):
+    return Business.objects.create(
+        phone_number=phone_number,
+        owner_name="Owner",
+        salon_name="Salon",
+        owner_email="owner@example.com",
+        latitude=12.97,
+        longitude=77.59,
+    )
+
+
+def populate_business(business, size):
+    """Give a business `size` rows in every nested collection."""
+    prefix = f"{business.id}-{size}-"
+    root = ServiceCategory.objects.create(business=business, name="Hair")
+    parent = root
+    for level in range(size):
+        parent = ServiceCategory.objects.create(business=business, name=f"Level {level}", parent=parent)
+    services = [
+        Services.objects.create(
+            business=business,
+            service_name=f"Service {i}",
+            service_type="Basic",
+            duration_in_mins=30,
+            price=100 + i,
+            category=parent,
+        )
+        for i in range(size)
+    ]
+    packages = [
+        Packages.objects.create(
+            business=business,
+            package_name=f"Package {i}",
+            package_duration_in_mins=60,
+            package_price=500,
+        )
+        for i in range(size)
+    ]
+    staff = [
+        TeamMember.objects.create(
+            business=business,
+            first_name="Staff",
+            last_name=str(i),
+            phone_number=f"{prefix}{i}",
+            member_email=f"staff{prefix}{i}@example.com",
+            date_of_joining=date(2024, 1, 1),
+            access_type="Admin",
+        )
+        for i in range(size)
+    ]
+    clients = [
+        Client.objects.create(
+            business=business,
+            client_name=f"Client {i}",
+            client_type="Regular",
+            client_email=f"client{prefix}{i}@example.com",
+            client_phone=f"{prefix}{i}",
+            client_gender="Female",
+        )
+        for i in range(size)
+    ]
+    for i in range(size):
+        appointment = Appointment.objects.create(
+            business=business,
+            staff=staff[i],
+            client_appointments=clients[i],
+            appointment_date=date(2025, 1, 1 + i % 28),
+            appointment_time=time(10, 0),
+        )
+        appointment.services.set(services[: i + 1])
+        appointment.packages.set(packages[:1])
+
+
+class BusinessDetailQueryCountTests(TestCase):
+    # business, clients, team members, services, packages, categories,
+    # category services, appointments, appointment services, appointment packages
+    EXPECTED_QUERIES = 10
+
+    def setUp(self):
+        # Measure the uncached responses
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_detail_queries(self, business):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(f"/api/business/{business.id}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_data(self):
+        small = create_business("+911000000001")
+        populate_business(small, 2)
+        large = create_business("+911000000002")
+        populate_business(large, 12)
+
+        self.assert_detail_queries(small)
+        data = self.assert_detail_queries(large)
+
+        self.assertEqual(len(data["business_appointments"]), 12)
+        self.assertEqual(len(data["clients"]), 12)
+
+    def test_category_tree_is_nested_from_prefetched_rows(self):
+        business = create_business()
+        populate_business(business, 3)
+
+        data = self.assert_detail_queries(business)
+
+        root = next(c for c in data["business_categories"] if c["parent"] is None)
+        depth = 0
+        node = root
+        while node["subcategories"]:
+            node = node["subcategories"][0]
+            depth += 1
+        self.assertEqual(depth, 3)
+        self.assertEqual(len(node["services"]), 3)
+
+    def test_business_list_nests_every_business_tree(self):
+        for phone_number in ("+911000000001", "+911000000002"):
+            populate_business(create_business(phone_number), 2)
+
+        businesses = self.client.get("/api/business/").json()
+
+        self.assertEqual(len(businesses), 2)
+        for business in businesses:
+            root = next(c for c in business["business_categories"] if c["parent"] is None)
+            self.assertEqual(len(root["subcategories"]), 1)
+            self.assertEqual(len(root["subcategories"][0]["subcategories"]), 1)
+
+
+class BusinessSummaryAndCollectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business("+911000000001")
+        populate_business(cls.business, 3)
+        cls.other = create_business("+911000000002")
+        populate_business(cls.other, 1)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_summary_counts_each_collection(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(f"/api/business/{self.business.id}/?view=summary").json()
+
+        self.assertEqual(data["id"], self.business.id)
+        self.assertEqual(data["salon_name"], self.business.salon_name)
+        self.assertEqual(
+            {name: data[name] for name in BusinessSummarySerializer.COUNTED_RELATIONS},
+            {
+                "clients_count": 3,
+                "team_members_count": 3,
+                "services_count": 3,
+                "packages_count": 3,
+                # A root category and three levels under it
+                "categories_count": 4,
+                "appointments_count": 3,
+            },
+        )
+        self.assertNotIn("clients", data)
+        self.assertNotIn("business_appointments", data)
+
+        empty = create_business("+911000000003")
+        data = self.client.get(f"/api/business/{empty.id}/?view=summary").json()
+        self.assertEqual({data[name] for name in BusinessSummarySerializer.COUNTED_RELATIONS}, {0})
+
+    def test_collection_pages(self):
+        url = f"/api/business/{self.business.id}/clients/"
+        first = self.client.get(url, {"page_size": 2}).json()
+        self.assertEqual(first["count"], 3)
+        self.assertEqual(len(first["results"]), 2)
+        second = self.client.get(first["next"]).json()
+        self.assertIsNone(second["next"])
+        ids = [client["id"] for client in first["results"] + second["results"]]
+        self.assertEqual(ids, list(Client.objects.filter(business=self.business).order_by("id").values_list("id", flat=True)))
+
+        for collection, model in (("team-members", TeamMember), ("services", Services), ("packages", Packages)):
+            with self.subTest(collection=collection):
+                data = self.client.get(f"/api/business/{self.business.id}/{collection}/").json()
+                self.assertEqual(data["count"], 3)
+                self.assertEqual(
+                    [row["id"] for row in data["results"]],
+                    list(model.objects.filter(business=self.business).order_by("id").values_list("id", flat=True)),
+                )
+
+    def test_categories_page_nests_subcategories_under_roots(self):
+        data = self.client.get(f"/api/business/{self.business.id}/service-categories/").json()
+        self.assertEqual(data["count"], 1)
+        node, depth = data["results"][0], 0
+        while node["subcategories"]:
+            node = node["subcategories"][0]
+            depth += 1
+        self.assertEqual(depth, 3)
+        self.assertEqual(len(node["services"]), 3)
+
+    def test_appointments_page_filters_by_date(self):
+        url = f"/api/business/{self.business.id}/appointments/"
+        data = self.client.get(url).json()
+        self.assertEqual([row["appointment_date"] for row in data["results"]], ["2025-01-01", "2025-01-02", "2025-01-03"])
+        self.assertEqual(len(data["results"][2]["services"]), 3)
+
+        data = self.client.get(url, {"start_date": "2025-01-02", "end_date": "2025-01-02"}).json()
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(data["results"][0]["appointment_date"], "2025-01-02")
+
+    def test_bad_dates_and_unknown_business(self):
+        for url in (f"/api/business/{self.business.id}/appointments/", f"/api/business/{self.business.id}/appointments/export.csv"):
+            with self.subTest(url=url):
+                response = self.client.get(url, {"start_date": "bad"})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+                self.assertEqual(self.client.get(url, {"end_date": "2025-13-01"}).status_code, 400)
+
+        for collection in ("clients", "team-members", "services", "packages", "service-categories", "appointments"):
+            with self.subTest(collection=collection):
+                self.assertEqual(self.client.get(f"/api/business/999999/{collection}/").status_code, 404)
+
+
+class ServiceCategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.business = create_business()
+
+    def create_category(self, name, parent=None):
+        return ServiceCategory.objects.create(business=self.business, name=name, parent=parent)
+
+    def test_path_follows_parent(self):
+        hair = self.create_category("Hair")
+        cut = self.create_category("Cut", hair)
+        fade = self.create_category("Fade", cut)
+
+        self.assertEqual(fade.path, hair.path + ServiceCategory.path_segment(cut.id) + ServiceCategory.path_segment(fade.id))
+        self.assertEqual(fade.depth, 2)
+
+    def test_moving_a_category_rewrites_its_subtree(self):
+        hair = self.create_category("Hair")
+        nails = self.create_category("Nails")
+        cut = self.create_category("Cut", hair)
+        fade = self.create_category("Fade", cut)
+
+        cut.parent = nails
+        cut.save()
+
+        fade.refresh_from_db()
+        self.assertTrue(fade.path.startswith(nails.path + ServiceCategory.path_segment(cut.id)))
+        self.assertEqual(fade.depth, 2)
+
+        cut.parent = None
+        cut.save()
+        fade.refresh_from_db()
+        self.assertEqual(fade.depth, 1)
+
+    def test_cannot_move_under_own_descendant(self):
+        hair = self.create_category("Hair")
+        cut = self.create_category("Cut", hair)
+
+        response = self.client.patch(f"/api/service-categories/{hair.id}/", {"parent": cut.id}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_query_count_does_not_grow_with_depth(self):
+        populate_business(self.business, 2)
+        with self.assertNumQueries(2):
+            self.client.get(f"/api/service-categories/?business_id={self.business.id}")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            populate_business(self.business, 8)
+        # The listed categories are the whole tree: they and their services
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/service-categories/?business_id={self.business.id}")
+        roots = [c for c in response.json() if c["parent"] is None]
+        self.assertEqual(len(roots), 2)
+
+    def test_detail_loads_subtree_with_one_query(self):
+        populate_business(self.business, 6)
+        root = ServiceCategory.objects.filter(business=self.business, parent__isnull=True).first()
+
+        # the business for the ETag, category, its services, the subtree and its services
+        with self.assertNumQueries(5):
+            response = self.client.get(f"/api/service-categories/{root.id}/")
+
+        depth = 0
+        node = response.json()
+        while node["subcategories"]:
+            node = node["subcategories"][0]
+            depth += 1
+        self.assertEqual(depth, 6)
+
+
+class AppointmentTotalsTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        populate_business(self.business, 3)
+        self.cut, self.colour, self.wash = Services.objects.filter(business=self.business).order_by("id")
+        self.package = Packages.objects.filter(business=self.business).first()
+        self.appointment = Appointment.objects.create(
+            business=self.business,
+            staff=TeamMember.objects.filter(business=self.business).first(),
+            client_appointments=Client.objects.filter(business=self.business).first(),
+            appointment_date=date(2025, 2, 1),
+            appointment_time=time(10, 0),
+        )
+
+    def test_totals_follow_services_and_packages(self):
+        self.appointment.services.set([self.cut, self.colour])
+        self.appointment.packages.add(self.package)
+        self.appointment.refresh_from_db()
+
+        self.assertEqual(self.appointment.total_amount, self.cut.price + self.colour.price + self.package.package_price)
+        self.assertEqual(self.appointment.total_duration_mins, 120)
+        self.assertEqual(self.appointment.end_time, time(12, 0))
+
+        self.appointment.packages.clear()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.total_duration_mins, 60)
+
+    def test_totals_follow_reverse_side(self):
+        self.appointment.services.set([self.cut])
+        self.wash.appointments.add(self.appointment)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.total_amount, self.cut.price + self.wash.price)
+
+        self.wash.appointments.clear()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.total_amount, self.cut.price)
+
+    def test_created_through_api_with_totals(self):
+        response = APIClient().post(
+            "/api/appointments/",
+            {
+                "business_id": self.business.id,
+                "services": [self.cut.id],
+                "packages": [self.package.id],
+                "client_appointments": self.appointment.client_appointments_id,
+                "staff": self.appointment.staff_id,
+                "appointment_date": "2025-02-02",
+                "appointment_time": "23:30",
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["total_amount"], self.cut.price + self.package.package_price)
+        self.assertEqual(response.json()["total_duration_mins"], 90)
+        # Capped at the end of the appointment's day
+        self.assertEqual(response.json()["end_time"], "23:59:59.999999")
+
+    def test_deleting_a_service_or_package_refreshes_totals(self):
+        self.appointment.services.set([self.cut, self.colour])
+        self.appointment.packages.set([self.package])
+        self.appointment.refresh_from_db()
+        updated_at = self.appointment.updated_at
+
+        self.colour.delete()
+        self.package.delete()
+
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.total_amount, self.cut.price)
+        self.assertEqual(self.appointment.total_duration_mins, 30)
+        self.assertEqual(self.appointment.end_time, time(10, 30))
+        self.assertGreater(self.appointment.updated_at, updated_at)
+
+    def test_queryset_delete_refreshes_totals_in_one_go(self):
+        self.appointment.services.set([self.cut, self.colour, self.wash])
+        # The rows, the appointments linked to any of them, the through rows,
+        # the rows, the services' and packages' sums, the appointments and
+        # their UPDATE
+        with self.assertNumQueries(8):
+            Services.objects.filter(pk__in=[self.colour.pk, self.wash.pk]).delete()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.total_amount, self.cut.price)
+        self.assertEqual(self.appointment.end_time, time(10, 30))
+
+    def test_save_appointment_writes_totals_once(self):
+        # The insert, the services and packages sets, and nothing from the signals
+        appointment = Appointment(
+            business=self.business,
+            staff=self.appointment.staff,
+            client_appointments=self.appointment.client_appointments,
+            appointment_date=date(2025, 2, 3),
+            appointment_time=time(10, 0),
+        )
+        with CaptureQueriesContext(connection) as queries:
+            save_appointment(appointment, [self.cut], [self.package])
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(updates, [])
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.total_amount, self.cut.price + self.package.package_price)
+
+    def test_backfill_migration(self):
+        self.appointment.services.set([self.cut])
+        Appointment.objects.update(total_amount=0, total_duration_mins=0, end_time=None)
+
+        backfill = import_module("api.migrations.0057_backfill_appointment_totals")
+        backfill.backfill_totals(django_apps, None)
+
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.total_amount, self.cut.price)
+        self.assertEqual(self.appointment.total_duration_mins, self.cut.duration_in_mins)
+        self.assertEqual(self.appointment.end_time, time(10, 30))
+
+
+class SalonSearchTests(TestCase):
+    def setUp(self):
+        coordinate_index.invalidate()
+
+    def create_salon(self, name, latitude, longitude):
+        return Business.objects.create(
+            phone_number=name,
+            owner_name="Owner",
+            salon_name=name,
+            owner_email="owner@example.com",
+            latitude=latitude,
+            longitude=longitude,
+        )
+
+    def test_geo_cell_follows_coordinates(self):
+        salon = self.create_salon("Moved", 12.97, 77.59)
+        salon.latitude = 19.07
+        salon.save(update_fields=["latitude"])
+
+        salon.refresh_from_db()
+        self.assertEqual(salon.geo_cell, geo_cell(19.07, 77.59))
+
+    def test_results_are_within_radius_and_sorted(self):
+        self.create_salon("Far", 13.05, 77.59)  # ~9 km
+        self.create_salon("Near", 12.98, 77.59)  # ~1 km
+        self.create_salon("Other city", 19.07, 72.87)
+
+        results = nearby_businesses(12.97, 77.59, radius_km=10)
+
+        self.assertEqual([business.salon_name for business, _ in results], ["Near", "Far"])
+        self.assertLess(results[0][1], results[1][1])
+        self.assertEqual(len(nearby_businesses(12.97, 77.59, radius_km=5)), 1)
+        self.assertEqual(len(nearby_businesses(12.97, 77.59, radius_km=10, limit=1)), 1)
+
+    def test_search_crosses_the_antimeridian(self):
+        self.create_salon("East", -17.0, 179.98)
+        self.create_salon("West", -17.0, -179.98)
+
+        results = nearby_businesses(-17.0, 179.99, radius_km=10)
+
+        self.assertEqual({business.salon_name for business, _ in results}, {"East", "West"})
+
+    def test_salons_endpoint(self):
+        self.create_salon("Near", 12.98, 77.59)
+        user = User.objects.create_user(username="customer")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+        response = client.get("/api/salons/", {"latitude": 12.97, "longitude": 77.59, "radius": 5})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([salon["salon_name"] for salon in response.json()], ["Near"])
+        self.assertEqual(client.get("/api/salons/").status_code, 400)
+        for params in (
+            {"latitude": "inf", "longitude": 0},
+            {"latitude": 0, "longitude": "nan"},
+            {"latitude": 91, "longitude": 0},
+            {"latitude": 0, "longitude": -180.5},
+            {"latitude": 12.97, "longitude": 77.59, "radius": "nan"},
+            {"latitude": 12.97, "longitude": 77.59, "radius": 0},
+            {"latitude": 12.97, "longitude": 77.59, "limit": 0},
+        ):
+            with self.subTest(params=params):
+                response = client.get("/api/salons/", params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_coordinate_index_is_updated_incrementally(self):
+        near = self.create_salon("Near", 12.98, 77.59)
+        self.assertEqual([business_id for business_id, _ in coordinate_index.nearest(12.97, 77.59, 10)], [near.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nearer = self.create_salon("Nearer", 12.971, 77.59)
+            near.latitude = 19.07
+            near.save()
+        self.assertEqual([business_id for business_id, _ in coordinate_index.nearest(12.97, 77.59, 10)], [nearer.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nearer.delete()
+        self.assertEqual(coordinate_index.nearest(12.97, 77.59, 10), [])
+
+    def test_coordinate_index_matches_sql_search(self):
+        for i in range(30):
+            self.create_salon(f"Salon {i}", 12.9 + i * 0.01, 77.59 - i * 0.005)
+
+        expected = [(business.id, distance) for business, distance in nearby_businesses(12.97, 77.59, 10, limit=5)]
+        actual = coordinate_index.nearest(12.97, 77.59, 10, limit=5)
+
+        self.assertEqual([business_id for business_id, _ in actual], [business_id for business_id, _ in expected])
+        for (_, actual_distance), (_, expected_distance) in zip(actual, expected):
+            self.assertAlmostEqual(actual_distance, expected_distance)
+
+
+def sent_code(message):
+    return re.search(r"\b\d{4}\b", message["body"]).group()
+
+
+class FlakyGateway(BaseSMSGateway):
+    """Fails the first send of every message."""
+
+    def __init__(self):
+        super().__init__()
+        self.attempts = []
+        self.sent = []
+
+    def deliver(self, to, body):
+        self.attempts.append(to)
+        if self.attempts.count(to) == 1:
+            raise ConnectionError("gateway timeout")
+        self.sent.append(to)
+
+
+@override_settings(SMS_GATEWAY="api.sms.LocalGateway", SMS_RETRY_BACKOFF=0)
+class SMSDispatchTests(TestCase):
+    def setUp(self):
+        self.outbox = get_gateway().outbox
+        self.outbox.clear()
+
+    def test_send_otp_view_queues_the_message(self):
+        response = APIClient().post("/api/send-otp/", {"phone_number": "+919876543210"}, format="json")
+        sms_dispatcher.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.outbox), 1)
+        self.assertEqual(self.outbox[0]["to"], "+919876543210")
+        self.assertEqual(self.outbox[0]["body"], otp_message(sent_code(self.outbox[0])))
+
+    def test_batch_send_records_latency(self):
+        sms_dispatcher.enqueue_many([(f"+9198765432{i:02d}", "reminder") for i in range(20)])
+        sms_dispatcher.join()
+
+        self.assertEqual(len(self.outbox), 20)
+        metrics = get_gateway().metrics.snapshot()
+        self.assertGreaterEqual(metrics["sent"], 20)
+        self.assertIn("p95_ms", metrics)
+
+    @override_settings(SMS_GATEWAY="api.tests.FlakyGateway")
+    def test_failed_sends_are_retried(self):
+        with self.assertLogs("api.sms", level="WARNING"):
+            sms_dispatcher.enqueue("+919876543210", "hello")
+            sms_dispatcher.join()
+
+        gateway = get_gateway()
+        self.assertEqual(gateway.attempts, ["+919876543210", "+919876543210"])
+        self.assertEqual(gateway.sent, ["+919876543210"])
+        self.assertEqual(gateway.metrics.snapshot()["failed"], 1)
+
+
+@override_settings(SMS_GATEWAY="api.sms.LocalGateway", OTP_AUDIT_BATCH_SIZE=2)
+class OTPServiceTests(TestCase):
+    phone_number = "+919876543210"
+
+    def setUp(self):
+        cache.clear()
+        # Drop rows buffered by earlier tests
+        otp_service.audit_log.flush()
+        OTP.objects.all().delete()
+
+    def test_code_is_single_use(self):
+        code = otp_service.issue(self.phone_number)
+
+        self.assertEqual(otp_service.verify(self.phone_number, "0000"), INVALID)
+        self.assertEqual(otp_service.verify(self.phone_number, code), VERIFIED)
+        self.assertEqual(otp_service.verify(self.phone_number, code), EXPIRED)
+
+    @override_settings(OTP_MAX_ATTEMPTS=2)
+    def test_attempts_are_limited(self):
+        code = otp_service.issue(self.phone_number)
+        otp_service.verify(self.phone_number, "0000")
+        otp_service.verify(self.phone_number, "0000")
+
+        self.assertEqual(otp_service.verify(self.phone_number, code), TOO_MANY_ATTEMPTS)
+        self.assertEqual(otp_service.verify(self.phone_number, code), EXPIRED)
+
+    def test_audit_rows_are_written_in_bulk(self):
+        code = otp_service.issue(self.phone_number)
+        self.assertFalse(OTP.objects.exists())
+
+        # The verification fills the batch of two, written once the
+        # transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            otp_service.verify(self.phone_number, code)
+
+        self.assertTrue(OTP.objects.get().is_verified)
+
+    def test_audit_write_errors_do_not_fail_the_request(self):
+        with mock.patch("api.models.OTP.objects.bulk_create", side_effect=DatabaseError("down")):
+            with self.assertLogs("api.otp", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+                response = APIClient().post("/api/send-otp/", {"phone_number": self.phone_number}, format="json")
+                otp_service.issue(self.phone_number)
+        sms_dispatcher.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(OTP.objects.exists())
+
+    def test_audit_rows_keep_the_issue_time_and_mark_the_latest_row(self):
+        issued_at = timezone.now()
+        with mock.patch("api.otp.secrets.randbelow", return_value=234):
+            with mock.patch("api.otp.timezone.now", return_value=issued_at - timedelta(minutes=10)):
+                otp_service.issue(self.phone_number)
+            code = otp_service.issue(self.phone_number)
+        self.assertEqual(otp_service.verify(self.phone_number, code), VERIFIED)
+        otp_service.audit_log.flush()
+
+        older, latest = OTP.objects.order_by("created_at")
+        self.assertEqual((older.otp, latest.otp), (code, code))
+        self.assertEqual(older.created_at, issued_at - timedelta(minutes=10))
+        self.assertFalse(older.is_verified)
+        self.assertTrue(latest.is_verified)
+
+    def test_business_flow(self):
+        client = APIClient()
+        client.post("/api/send-otp/", {"phone_number": self.phone_number}, format="json")
+        sms_dispatcher.join()
+        code = sent_code(get_gateway().outbox[-1])
+
+        wrong = client.post("/api/verify-otp/", {"phone_number": self.phone_number, "otp": "0000"}, format="json")
+        right = client.post("/api/verify-otp/", {"phone_number": self.phone_number, "otp": code}, format="json")
+
+        self.assertEqual(wrong.status_code, 400)
+        self.assertEqual(right.status_code, 200)
+
+    def test_purge_command(self):
+        otp_service.issue(self.phone_number)
+        otp_service.audit_log.flush()
+        OTP.objects.update(created_at=timezone.now() - timedelta(days=31))
+
+        call_command("purge_otps", stdout=StringIO())
+
+        self.assertFalse(OTP.objects.exists())
+
+
+class IndexUsageTests(TestCase):
+    """
+    The tenant scoped list queries have to be answerable from an index. On
+    PostgreSQL sequential scans are disabled for the test, so the planner only
+    picks one when no usable index exists; SQLite reports SCAN instead of
+    SEARCH in that case.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 10)
+        cls.category = Services.objects.filter(business=cls.business).first().category
+        cls.staff = TeamMember.objects.filter(business=cls.business).first()
+        # A year of bookings spread over other tenants and staff, so each
+        # filter is selective and the planner has a reason to pick its index
+        for phone_number in ("+911234567891", "+911234567892", "+911234567893"):
+            populate_business(create_business(phone_number), 10)
+        staff = list(TeamMember.objects.select_related("business"))
+        clients = {client.business_id: client for client in Client.objects.all()}
+        statuses = ["Scheduled", "Completed", "Cancelled"]
+        Appointment.objects.bulk_create(
+            Appointment(
+                business=member.business,
+                staff=member,
+                client_appointments=clients[member.business_id],
+                appointment_date=date(2024, 1, 1) + timedelta(days=i % 365),
+                appointment_time=time(9 + i % 10, 0),
+                status=statuses[i % 3],
+            )
+            for i in range(4000)
+            for member in [staff[i % len(staff)]]
+        )
+        OTP.objects.bulk_create(OTP(phone_number=f"+9198765432{i % 50:02d}", otp="1234") for i in range(500))
+        if connection.vendor == "postgresql":
+            # Give the planner real statistics for the seeded rows
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def assert_uses_index(self, queryset, index=None):
+        table = queryset.model._meta.db_table
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+            self.assertNotIn(f"Seq Scan on {table}", plan, plan)
+        elif connection.vendor == "sqlite":
+            plan = queryset.explain()
+            self.assertNotRegex(plan, rf"SCAN {table}\b", plan)
+        else:
+            self.skipTest(f"No plan check for {connection.vendor}")
+        if index:
+            self.assertIn(index, plan)
+
+    def view_queryset(self, view_class, kwargs=None, **params):
+        view = view_class()
+        view.request = Request(APIRequestFactory().get("/", params))
+        view.kwargs = kwargs or {}
+        view.format_kwarg = None
+        return view.get_queryset()
+
+    def test_appointment_list(self):
+        self.assert_uses_index(
+            self.view_queryset(
+                views.AppointmentListCreateView,
+                business_id=self.business.id,
+                start_date="2025-01-01",
+                end_date="2025-01-07",
+            ),
+            index="appt_business_date_idx",
+        )
+
+    def test_business_appointments(self):
+        self.assert_uses_index(
+            self.view_queryset(
+                views.BusinessAppointmentsView, {"business_id": self.business.id}, start_date="2025-01-01"
+            ),
+            index="appt_business_date_idx",
+        )
+
+    def test_appointments_by_status(self):
+        self.assert_uses_index(
+            Appointment.objects.filter(business=self.business, status="Scheduled"), index="appt_business_status_idx"
+        )
+
+    def test_staff_day(self):
+        self.assert_uses_index(
+            Appointment.objects.filter(staff=self.staff, appointment_date=date(2025, 1, 1)).order_by("appointment_time"),
+            index="appt_staff_date_idx",
+        )
+
+    def test_tenant_lists(self):
+        for view_class in (
+            views.ClientListCreateView,
+            views.TeamMemberListCreateView,
+            views.PackagesListCreateView,
+            views.ServicesListCreateView,
+            views.ServiceCategoryListCreateView,
+        ):
+            with self.subTest(view=view_class.__name__):
+                self.assert_uses_index(self.view_queryset(view_class, business_id=self.business.id))
+
+    def test_services_by_category(self):
+        self.assert_uses_index(
+            self.view_queryset(views.ServicesListCreateView, business_id=self.business.id, category_id=self.category.id),
+            index="services_business_cat_idx",
+        )
+
+    def test_latest_otp(self):
+        self.assert_uses_index(
+            OTP.objects.filter(phone_number="+919876543210").order_by("-created_at"), index="otp_phone_created_idx"
+        )
+
+    def test_appointment_keyset_page(self):
+        pagination = views.AppointmentPagination()
+        after = pagination.after([date(2025, 1, 5), time(10, 0), 1])
+        queryset = Appointment.objects.filter(after).order_by(*pagination.ordering)[:50]
+        self.assert_uses_index(queryset, index="appt_date_time_idx")
+
+
+class AppointmentListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 10)
+        # Rows sharing a date and time are ordered by id
+        appointment = Appointment.objects.filter(business=cls.business).first()
+        Appointment.objects.bulk_create(
+            Appointment(
+                business=cls.business,
+                staff=appointment.staff,
+                client_appointments=appointment.client_appointments,
+                appointment_date=date(2025, 1, 3),
+                appointment_time=time(10, 0),
+            )
+            for _ in range(20)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_pages_follow_calendar_order(self):
+        expected = list(
+            Appointment.objects.order_by("appointment_date", "appointment_time", "id").values_list("id", flat=True)
+        )
+        seen = []
+        url = f"/api/appointments/?business_id={self.business.id}&page_size=7"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 7)
+            seen.extend(appointment["id"] for appointment in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, expected)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get("/api/appointments/", {"page_size": 10000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(views.AppointmentPagination.max_page_size, 200)
+        self.assertEqual(len(response.data["results"]), 30)
+        self.assertIsNone(response.data["next"])
+
+    def test_field_selection(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/appointments/", {"fields": "id,appointment_date,appointment_time,end_time", "page_size": 5}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data["results"][0]), {"id", "appointment_date", "appointment_time", "end_time"}
+        )
+
+        # The cursor keeps working with a narrowed column list
+        response = self.client.get(response.data["next"])
+        self.assertEqual(set(response.data["results"][0]), {"id", "appointment_date", "appointment_time", "end_time"})
+
+    def test_nested_fields_are_prefetched(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/appointments/", {"fields": "id,services"})
+        self.assertEqual(max(len(appointment["services"]) for appointment in response.data["results"]), 10)
+
+    def test_unknown_field(self):
+        response = self.client.get("/api/appointments/", {"fields": "id,business_id,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("business_id, secret", response.data["fields"])
+
+    def test_invalid_cursor(self):
+        encode = views.AppointmentListCreateView.pagination_class().encode_cursor
+        cursors = ["garbage", "WzEsMl0", "WyJub3QtYS1kYXRlIiwgIjEwOjAwIiwgMV0"] + [
+            encode(position)
+            for position in (
+                [{"a": 1}, "10:00", 1],
+                ["2030-01-07", ["10:00"], 1],
+                ["2030-01-07", "10:00", None],
+                ["2030-01-07", "10:00", True],
+                ["2030-01-07", "10:00", 10 ** 30],
+            )
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/appointments/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class AvailabilityTests(TestCase):
+    # A Monday far enough ahead that none of its slots are in the past
+    day = date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 2)
+        cls.staff, cls.other = TeamMember.objects.filter(business=cls.business).order_by("id")
+        WorkingHours.objects.create(staff=cls.staff, weekday=0, start_time=time(9, 0), end_time=time(12, 0))
+        WorkingHours.objects.create(staff=cls.staff, weekday=0, start_time=time(13, 0), end_time=time(17, 0))
+        cls.service = Services.objects.filter(business=cls.business).first()
+        cls.service.duration_in_mins = 45
+        cls.service.save()
+        client = Client.objects.filter(business=cls.business).first()
+        for start, status in ((time(10, 0), "Scheduled"), (time(14, 0), "Cancelled")):
+            appointment = Appointment.objects.create(
+                business=cls.business,
+                staff=cls.staff,
+                client_appointments=client,
+                appointment_date=cls.day,
+                appointment_time=start,
+                status=status,
+            )
+            appointment.services.set([cls.service])
+
+    def test_bitmap_helpers(self):
+        free = span(2, 5) | span(8, 9)
+        self.assertEqual(list(runs(free)), [(2, 5), (8, 9)])
+        self.assertEqual(fitting(free, 2), span(2, 4))
+        self.assertEqual(fitting(free, 4), 0)
+
+    def test_free_time_around_appointments(self):
+        staff, other = week_availability(self.business.id, self.day, days=2, duration_mins=60)
+        monday, tuesday = staff["days"]
+        # The cancelled appointment does not block anything
+        self.assertEqual(
+            monday["free"],
+            [
+                {"start": "09:00", "end": "10:00"},
+                {"start": "10:45", "end": "12:00"},
+                {"start": "13:00", "end": "17:00"},
+            ],
+        )
+        self.assertIn("09:00", monday["slots"])
+        self.assertIn("11:00", monday["slots"])
+        self.assertNotIn("11:15", monday["slots"])
+        self.assertNotIn("10:00", monday["slots"])
+        self.assertEqual(monday["slots"][-1], "16:00")
+        # No shift on Tuesdays
+        self.assertEqual(tuesday["free"], [])
+        # Members without working hours get the default shift
+        self.assertEqual(other["days"][0]["free"], [{"start": "09:00", "end": "21:00"}])
+
+    def test_week_grid_query_count(self):
+        with self.assertNumQueries(3):
+            grid = week_availability(self.business.id, self.day, days=7)
+        self.assertEqual([len(member["days"]) for member in grid], [7, 7])
+
+    def test_endpoint(self):
+        response = APIClient().get(
+            "/api/availability",
+            {"business_id": self.business.id, "start_date": "2030-01-07", "days": 1, "service_ids": self.service.id},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["duration_mins"], 45)
+        self.assertEqual(response.data["staff"][0]["days"][0]["slots"][:4], ["09:00", "09:15", "10:45", "11:00"])
+
+        response = APIClient().get(
+            "/api/availability", {"business_id": self.business.id, "staff_id": self.other.id, "days": 100}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["staff"]), 1)
+        self.assertEqual(len(response.data["staff"][0]["days"]), 14)
+
+    def test_endpoint_validation(self):
+        self.assertEqual(APIClient().get("/api/availability").status_code, 400)
+        self.assertEqual(
+            APIClient().get("/api/availability", {"business_id": self.business.id, "start_date": "soon"}).status_code,
+            400,
+        )
+        self.assertEqual(
+            APIClient().get("/api/availability", {"business_id": self.business.id, "service_ids": "999999"}).status_code,
+            400,
+        )
+
+    def test_working_hours_endpoint(self):
+        response = APIClient().post(
+            "/api/working-hours/",
+            {"staff": self.other.id, "weekday": 1, "start_time": "12:00", "end_time": "11:00"},
+        )
+        self.assertEqual(response.status_code, 400)
+        response = APIClient().post(
+            "/api/working-hours/",
+            {"staff": self.other.id, "weekday": 1, "start_time": "11:00", "end_time": "15:00"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(WorkingHours.objects.get(pk=response.data["id"]).business, self.business)
+
+
+def book(staff, day, start, services, status="Scheduled"):
+    return save_appointment(
+        Appointment(
+            business=staff.business,
+            staff=staff,
+            client_appointments=Client.objects.filter(business=staff.business).first(),
+            appointment_date=day,
+            appointment_time=start,
+            status=status,
+        ),
+        services,
+    )
+
+
+class BookingTests(TestCase):
+    day = date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 2)
+        cls.staff, cls.other = TeamMember.objects.filter(business=cls.business).order_by("id")
+        cls.service = Services.objects.filter(business=cls.business).first()
+        cls.service.duration_in_mins = 45
+        cls.service.save()
+        cls.existing = book(cls.staff, cls.day, time(10, 0), [cls.service])
+
+    def test_overlaps_are_rejected(self):
+        for start in (time(9, 30), time(10, 0), time(10, 30)):
+            with self.subTest(start=start), self.assertRaises(BookingConflict):
+                book(self.staff, self.day, start, [self.service])
+        # Back to back, another member, a cancelled booking or another day are fine
+        book(self.staff, self.day, time(9, 15), [self.service])
+        book(self.staff, self.day, time(10, 45), [self.service])
+        book(self.other, self.day, time(10, 0), [self.service])
+        book(self.staff, self.day, time(10, 15), [self.service], status="Cancelled")
+        book(self.staff, self.day + timedelta(days=1), time(10, 0), [self.service])
+
+    def test_zero_length_appointments_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            book(self.staff, self.day, time(12, 0), [])
+        data = {
+            "business_id": self.business.id,
+            "staff": self.staff.id,
+            "client_appointments": self.existing.client_appointments_id,
+            "services": [],
+            "appointment_date": "2030-01-07",
+            "appointment_time": "10:15",
+        }
+        self.assertEqual(APIClient().post("/api/appointments/", data, format="json").status_code, 400)
+        self.assertEqual(Appointment.objects.filter(staff=self.staff, appointment_date=self.day).count(), 1)
+
+    def test_overlapping_rows_do_not_hide_a_conflict(self):
+        # A zero length row starting inside the existing booking, as written
+        # before those were rejected, is not the only row to check
+        Appointment.objects.bulk_create([Appointment(
+            business=self.business,
+            staff=self.staff,
+            client_appointments=self.existing.client_appointments,
+            appointment_date=self.day,
+            appointment_time=time(10, 15),
+            end_time=time(10, 15),
+        )])
+        with mock.patch("api.booking.has_overlap_constraint", return_value=False):
+            with self.assertRaises(BookingConflict):
+                book(self.staff, self.day, time(10, 30), [self.service])
+
+    def test_status_change_skips_the_booking_checks(self):
+        # A row from before the totals were stored has no duration yet
+        legacy = Appointment.objects.bulk_create([Appointment(
+            business=self.business,
+            staff=self.staff,
+            client_appointments=self.existing.client_appointments,
+            appointment_date=self.day,
+            appointment_time=time(10, 15),
+        )])[0]
+        legacy.services.set([self.service])
+        Appointment.objects.filter(pk=legacy.pk).update(total_amount=0, total_duration_mins=0, end_time=None)
+
+        with mock.patch("api.booking.find_conflict") as find_conflict:
+            response = APIClient().patch(f"/api/appointments/{legacy.id}/", {"status": "Completed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        find_conflict.assert_not_called()
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.status, "Completed")
+
+        # Moving it is checked
+        response = APIClient().patch(f"/api/appointments/{legacy.id}/", {"appointment_time": "12:00"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_returns_conflict(self):
+        data = {
+            "business_id": self.business.id,
+            "staff": self.staff.id,
+            "client_appointments": self.existing.client_appointments_id,
+            "services": [self.service.id],
+            "appointment_date": "2030-01-07",
+            "appointment_time": "10:15",
+        }
+        response = APIClient().post("/api/appointments/", data, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Appointment.objects.filter(staff=self.staff, appointment_date=self.day).count(), 1)
+
+        data["appointment_time"] = "11:00"
+        response = APIClient().post("/api/appointments/", data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+        # Moving it onto the existing appointment is a conflict too
+        response = APIClient().patch(f"/api/appointments/{response.data['id']}/", {"appointment_time": "10:30"}, format="json")
+        self.assertEqual(response.status_code, 409)
+
+    def test_customer_booking_picks_a_free_member(self):
+        api = customer_client("customer", "+919999999999")
+        data = {
+            "business_id": self.business.id,
+            "service_ids": [self.service.id],
+            "appointment_date": "2030-01-07",
+            "appointment_time": "10:00",
+        }
+        response = api.post("/api/bookings/create", data, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["staff"], self.other.id)
+        self.assertEqual(response.data["total_amount"], self.service.price)
+        self.assertTrue(Client.objects.filter(business=self.business, client_phone="+919999999999").exists())
+
+        response = api.post("/api/bookings/create", data, format="json")
+        self.assertEqual(response.status_code, 409)
+        response = api.post("/api/bookings/create", {**data, "appointment_time": "07:00"}, format="json")
+        self.assertEqual(response.status_code, 409)
+
+    def test_customer_booking_input_is_validated(self):
+        api = customer_client("customer", "+919999999999")
+        data = {
+            "business_id": self.business.id,
+            "service_ids": [self.service.id],
+            "appointment_date": "2030-01-07",
+            "appointment_time": "12:00",
+        }
+        for invalid in ({"service_ids": ["x"]}, {"package_ids": ["x"]}, {"staff_id": "abc"}, {"business_id": "abc"}, {"service_ids": []}):
+            with self.subTest(invalid=invalid):
+                self.assertEqual(api.post("/api/bookings/create", {**data, **invalid}, format="json").status_code, 400)
+                self.assertEqual(api.post("/api/bookings/hold", {**data, **invalid}, format="json").status_code, 400)
+
+
+def customer_client(username, phone_number):
+    user = User.objects.create_user(username=username)
+    Customer.objects.create(
+        user=user,
+        unique_id=username.upper()[:8],
+        name=username,
+        email=f"{username}@example.com",
+        phone_number=phone_number,
+        date_of_birth=date(1990, 1, 1),
+    )
+    api = APIClient()
+    api.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+    return api
+
+
+class SlotHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 2)
+        cls.staff, cls.other = TeamMember.objects.filter(business=cls.business).order_by("id")
+        cls.service = Services.objects.filter(business=cls.business).first()
+        cls.service.duration_in_mins = 30
+        cls.service.save()
+
+    def setUp(self):
+        cache.clear()
+        self.alice = customer_client("alice", "+919999999991")
+        self.bob = customer_client("bob", "+919999999992")
+        self.booking = {
+            "business_id": self.business.id,
+            "service_ids": [self.service.id],
+            "appointment_date": "2030-01-07",
+            "appointment_time": "10:00",
+        }
+
+    def free_slots(self, staff):
+        response = APIClient().get(
+            "/api/availability",
+            {"business_id": self.business.id, "start_date": "2030-01-07", "days": 1, "staff_id": staff.id},
+        )
+        return response.data["staff"][0]["days"][0]["slots"]
+
+    def test_hold_and_confirm(self):
+        response = self.alice.post("/api/bookings/hold", {**self.booking, "staff_id": self.staff.id}, format="json")
+        self.assertEqual(response.status_code, 201)
+        hold_id = response.data["hold_id"]
+        self.assertNotIn("10:00", self.free_slots(self.staff))
+        self.assertNotIn("10:15", self.free_slots(self.staff))
+        self.assertIn("10:30", self.free_slots(self.staff))
+
+        # Bob cannot hold or book Alice's slot, but gets the other stylist
+        response = self.bob.post("/api/bookings/hold", {**self.booking, "staff_id": self.staff.id}, format="json")
+        self.assertEqual(response.status_code, 409)
+        response = self.bob.post("/api/bookings/create", {**self.booking, "staff_id": self.staff.id}, format="json")
+        self.assertEqual(response.status_code, 409)
+        response = self.bob.post("/api/bookings/hold", self.booking, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["staff_id"], self.other.id)
+
+        self.assertEqual(self.bob.post(f"/api/bookings/hold/{hold_id}/confirm").status_code, 404)
+        response = self.alice.post(f"/api/bookings/hold/{hold_id}/confirm")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["staff"], self.staff.id)
+        self.assertEqual(response.data["appointment_time"], "10:00:00")
+        self.assertIsNone(slot_holds.get(hold_id))
+        self.assertNotIn("10:00", self.free_slots(self.staff))
+        self.assertEqual(self.alice.post(f"/api/bookings/hold/{hold_id}/confirm").status_code, 404)
+
+    def test_release(self):
+        response = self.alice.post("/api/bookings/hold", {**self.booking, "staff_id": self.staff.id}, format="json")
+        hold_id = response.data["hold_id"]
+        self.assertEqual(self.alice.get(f"/api/bookings/hold/{hold_id}").status_code, 200)
+        self.assertEqual(self.alice.delete(f"/api/bookings/hold/{hold_id}").status_code, 204)
+        self.assertIn("10:00", self.free_slots(self.staff))
+        response = self.bob.post("/api/bookings/hold", {**self.booking, "staff_id": self.staff.id}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_hold_minutes_are_validated(self):
+        for minutes in ("abc", 0, 16, [5]):
+            with self.subTest(minutes=minutes):
+                response = self.alice.post("/api/bookings/hold", {**self.booking, "minutes": minutes}, format="json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("minutes", response.data)
+        response = self.alice.post("/api/bookings/hold", {**self.booking, "minutes": "10"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertAlmostEqual(
+            (response.data["expires_at"] - timezone.now()).total_seconds(), 600, delta=5
+        )
+
+    def test_expired_hold_frees_the_slot(self):
+        hold = slot_holds.hold(1, self.staff.id, date(2030, 1, 7), [40, 41])
+        self.assertIsNone(slot_holds.hold(2, self.staff.id, date(2030, 1, 7), [41, 42]))
+        # A failed hold does not keep the slots it managed to take
+        self.assertIsNotNone(slot_holds.hold(2, self.staff.id, date(2030, 1, 7), [42]))
+        cache.delete_many([f"hold:{self.staff.id}:2030-01-07:{slot}" for slot in (40, 41)])
+        self.assertIsNotNone(slot_holds.hold(2, self.staff.id, date(2030, 1, 7), [40, 41]))
+        # Releasing the stale hold leaves the new one alone
+        slot_holds.release(hold)
+        self.assertIsNone(slot_holds.hold(3, self.staff.id, date(2030, 1, 7), [40]))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_slot_holds", threads=2, operations=50, stdout=out)
+        self.assertIn("holds/s", out.getvalue())
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel requests for the same slot, each on its own connection."""
+
+    def setUp(self):
+        self.business = create_business()
+        populate_business(self.business, 1)
+        self.staff = TeamMember.objects.get(business=self.business)
+        self.service = Services.objects.get(business=self.business)
+
+    def race(self, workers=8):
+        barrier = threading.Barrier(workers)
+        results = []
+
+        def attempt():
+            try:
+                barrier.wait()
+                book(self.staff, date(2030, 1, 7), time(10, 0), [self.service])
+                results.append("booked")
+            except BookingConflict:
+                results.append("conflict")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), ["booked"] + ["conflict"] * (workers - 1))
+        self.assertEqual(Appointment.objects.filter(staff=self.staff, appointment_date=date(2030, 1, 7)).count(), 1)
+
+    def test_parallel_bookings(self):
+        # The exclusion constraint where it is installed, row locks otherwise
+        self.race()
+
+    def test_parallel_bookings_with_row_locks(self):
+        with mock.patch("api.booking.has_overlap_constraint", return_value=False):
+            self.race()
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 3)
+        cls.other = create_business("+911234567899")
+        populate_business(cls.other, 1)
+
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset()
+        self.client = APIClient()
+
+    def test_responses_are_cached_per_business(self):
+        urls = [
+            f"/api/business/{self.business.id}/",
+            f"/api/business/{self.business.id}/?view=summary",
+            f"/api/services/?business_id={self.business.id}",
+            f"/api/team-members/?business_id={self.business.id}",
+            f"/api/service-categories/?business_id={self.business.id}",
+        ]
+        first = [self.client.get(url).json() for url in urls]
+        with self.assertNumQueries(0):
+            second = [self.client.get(url).json() for url in urls]
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.get("/api/cache-stats/").status_code, 403)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        stats = self.client.get("/api/cache-stats/").json()
+        self.assertEqual((stats["hits"], stats["misses"]), (5, 5))
+        self.assertEqual(stats["views"]["ServicesListCreateView"], {"hits": 1, "misses": 1})
+
+    def test_writes_invalidate_one_business(self):
+        services_url = f"/api/services/?business_id={self.business.id}"
+        other_url = f"/api/services/?business_id={self.other.id}"
+        self.client.get(services_url)
+        self.client.get(other_url)
+        other_version = business_version(self.other.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/services/",
+                {"business_id": self.business.id, "service_name": "New", "service_type": "Basic", "duration_in_mins": 30, "price": 10},
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.client.get(services_url).json()), 4)
+        self.assertEqual(business_version(self.other.id), other_version)
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+    def test_related_writes_invalidate(self):
+        url = f"/api/business/{self.business.id}/"
+        appointment = Appointment.objects.filter(business=self.business).first()
+        service = Services.objects.filter(business=self.business).last()
+        for write in (
+            lambda: appointment.services.remove(service),
+            lambda: TeamMember.objects.filter(business=self.business).first().delete(),
+            lambda: Business.objects.filter(pk=self.business.pk).first().save(),
+        ):
+            self.client.get(url)
+            version = business_version(self.business.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(business_version(self.business.id), version)
+
+    def test_version_survives_eviction(self):
+        version = business_version(self.business.id)
+        cache.delete(f"business:{self.business.id}:version")
+        self.assertNotEqual(business_version(self.business.id), version)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        populate_business(cls.business, 2)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def revalidate(self, url, queries=0):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        with self.assertNumQueries(queries):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], etag)
+        return etag
+
+    def test_business_scoped_endpoints(self):
+        business_id = self.business.id
+        for url in (
+            f"/api/business/{business_id}/",
+            f"/api/business/{business_id}/clients/",
+            f"/api/services/?business_id={business_id}",
+            f"/api/packages/?business_id={business_id}",
+            f"/api/appointments/?business_id={business_id}",
+            f"/api/salons/{business_id}",
+            f"/api/salons/{business_id}/services",
+            "/api/business/",
+        ):
+            with self.subTest(url=url):
+                etag = self.revalidate(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Client.objects.filter(business=self.business).first().save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_row_detail_uses_updated_at(self):
+        service = Services.objects.filter(business=self.business).first()
+        url = f"/api/services/{service.id}/"
+        # Only the row's updated_at is read
+        etag = self.revalidate(url, queries=1)
+        # Writes to other rows of the business leave it alone
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.filter(business=self.business).first().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(url, {"price": 999}, format="json")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_appointment_detail_follows_services(self):
+        appointment = Appointment.objects.filter(business=self.business).first()
+        url = f"/api/appointments/{appointment.id}/"
+        etag = self.revalidate(url, queries=1)
+        appointment.services.add(*Services.objects.filter(business=self.business))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_rows_are_not_found(self):
+        self.assertEqual(self.client.get("/api/services/999999/", HTTP_IF_NONE_MATCH="*").status_code, 404)
+
+
+class ORJSONRendererTests(TestCase):
+    def render_both(self, data):
+        return ORJSONRenderer().render(data), JSONRenderer().render(data)
+
+    def test_matches_drf(self):
+        data = {
+            "date": date(2025, 1, 2),
+            "time": time(9, 30, 15, 123456),
+            "utc": timezone.now().replace(microsecond=654321),
+            "naive": timezone.now().replace(tzinfo=None),
+            "duration": timedelta(minutes=90),
+            "amount": Decimal("12.50"),
+            "id": uuid.UUID(int=1),
+            "lazy": gettext_lazy("Scheduled"),
+            "text": "café \u2028 line",
+            "nested": [{"count": 2, "ratio": 0.5, "none": None}],
+        }
+        fast, stdlib = self.render_both(data)
+        self.assertEqual(fast, stdlib)
+
+    def test_phone_numbers(self):
+        phone = PhoneNumber.from_string("+919876543210")
+        data = {"phone": phone, "parsed": parse("+919876543210")}
+        expected = {"phone": "+919876543210", "parsed": "+919876543210"}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), expected)
+        # So does the fallback to DRF's renderer
+        self.assertEqual(json.loads(ORJSONRenderer().render(data, renderer_context={"indent": 2})), expected)
+
+    def test_falls_back_where_orjson_differs(self):
+        for data in ({"bitmap": 1 << 80}, {"count": -(1 << 70)}):
+            with self.subTest(data=data):
+                self.assertEqual(*self.render_both(data))
+        self.assertEqual(
+            ORJSONRenderer().render({"a": 1}, renderer_context={"indent": 4}),
+            JSONRenderer().render({"a": 1}, renderer_context={"indent": 4}),
+        )
+
+    def test_responses(self):
+        business = create_business()
+        populate_business(business, 3)
+        for url in (f"/api/business/{business.id}/", f"/api/appointments/?business_id={business.id}"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parser(self):
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(BytesIO('{"name": "Café", "price": 1.5}'.encode())), {"name": "Café", "price": 1.5})
+        for body in (b"{", b"NaN", b""):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                parser.parse(BytesIO(body))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_renderers", appointments=50, repeat=1, stdout=out)
+        self.assertIn("appointment list", out.getvalue())
+        self.assertFalse(Business.objects.filter(owner_name="Benchmark").exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        populate_business(self.business, 5)
+        other = create_business(phone_number="+919999999999")
+        populate_business(other, 2)
+
+    def download(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_clients_csv(self):
+        response = self.client.get(f"/api/business/{self.business.id}/clients/export.csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn(f'filename="clients-{self.business.id}.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        clients = Client.objects.filter(business=self.business).order_by("id")
+        self.assertEqual([int(row["id"]) for row in rows], [client.id for client in clients])
+        self.assertEqual(rows[0]["client_email"], clients[0].client_email)
+        self.assertNotIn("business_id", rows[0])
+
+    def test_appointments_jsonl_match_the_list(self):
+        url = f"/api/business/{self.business.id}/appointments/"
+        listed = self.client.get(url, {"start_date": "2025-01-02", "end_date": "2025-01-04"}).json()["results"]
+        lines = self.download(f"{url}export.jsonl?start_date=2025-01-02&end_date=2025-01-04").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], listed)
+        self.assertEqual(len(lines), 3)
+
+    def test_appointments_csv_join_services(self):
+        content = self.download(f"/api/business/{self.business.id}/appointments/export.csv")
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        appointment = Appointment.objects.get(pk=rows[-1]["id"])
+        self.assertEqual(rows[-1]["services"], ";".join(str(pk) for pk in appointment.services.values_list("pk", flat=True)))
+
+    def test_rows_are_read_in_chunks(self):
+        url = f"/api/business/{self.business.id}/appointments/export.jsonl"
+        # The business check and one cursor over the rows, then the services
+        # and packages of each chunk of 2 rows
+        with mock.patch.object(views.BusinessAppointmentsExportView, "chunk_size", 2), self.assertNumQueries(2 + 3 * 2):
+            self.assertEqual(len(self.download(url).splitlines()), 5)
+
+    def test_any_accept_header(self):
+        content = self.download(f"/api/business/{self.business.id}/clients/export.csv", HTTP_ACCEPT="text/csv")
+        self.assertTrue(content.startswith("id,"))
+
+    def test_not_found(self):
+        for url in (f"/api/business/{self.business.id}/clients/export.xlsx", "/api/business/999999/clients/export.csv"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ClientImportTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        Client.objects.create(
+            business=self.business, client_name="Existing", client_type="Regular",
+            client_email="existing@example.com", client_phone="5550000", client_gender="Female",
+        )
+        other = create_business(phone_number="+919999999999")
+        Client.objects.create(
+            business=other, client_name="Elsewhere", client_type="Regular",
+            client_email="elsewhere@example.com", client_phone="5559999", client_gender="Male",
+        )
+        self.url = f"/api/business/{self.business.id}/clients/import/"
+        self.client = APIClient()
+
+    def csv_file(self, rows, name="clients.csv"):
+        lines = ["client_name,client_type,client_email,client_phone,client_dob,client_gender"]
+        lines += [",".join(row) for row in rows]
+        upload = BytesIO("\n".join(lines).encode())
+        upload.name = name
+        return upload
+
+    def rows(self, count, start=0):
+        return [
+            (f"Client {i}", "Regular", f"client{i}@example.com", f"555{i:04d}", "", "Female")
+            for i in range(start + 1, start + count + 1)
+        ]
+
+    def test_csv_reports_bad_rows_and_imports_the_rest(self):
+        rows = self.rows(3) + [
+            ("Bad", "Regular", "not-an-email", "5558001", "", "Female"),
+            ("Twin", "Regular", "client1@example.com", "5558002", "", "Female"),
+            ("Same", "Regular", "existing@example.com", "5550000", "", "Female"),
+            ("Other", "Regular", "other@example.com", "5559999", "1990-05-01", "Male"),
+            ("Dated", "Premium", "dated@example.com", "5558003", "1990-05-01", "Male"),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {"file": self.csv_file(rows)})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["created"], 4)
+        self.assertEqual(report["failed"], 4)
+        errors = {error["row"]: error["errors"] for error in report["errors"]}
+        self.assertEqual(list(errors), [4, 5, 6, 7])
+        self.assertIn("client_email", errors[4])
+        self.assertEqual(list(errors[5]), ["client_email"])
+        self.assertEqual(set(errors[6]), {"client_email", "client_phone"})
+        self.assertEqual(list(errors[7]), ["client_phone"])
+        self.assertEqual(Client.objects.filter(business=self.business).count(), 5)
+        self.assertEqual(Client.objects.get(client_email="dated@example.com").client_dob, date(1990, 5, 1))
+
+    def test_queries_per_chunk(self):
+        version = business_version(self.business.id)
+
+        def post(count, start):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, {"file": self.csv_file(self.rows(count, start))})
+            self.assertEqual(response.json()["created"], count)
+
+        # Business, the existing addresses, then per chunk the addresses
+        # taken elsewhere and one insert in a savepoint
+        with mock.patch.object(ClientImport, "batch_size", 100), self.assertNumQueries(2 + 4):
+            post(100, 0)
+        with mock.patch.object(ClientImport, "batch_size", 100), self.assertNumQueries(2 + 4 * 3):
+            post(250, 100)
+        self.assertNotEqual(business_version(self.business.id), version)
+
+    def test_saved_chunks_invalidate_the_cache_when_the_file_breaks_off(self):
+        version = business_version(self.business.id)
+
+        def rows():
+            yield from (
+                {field: value for field, value in zip(ClientImportSerializer.Meta.fields, row) if value}
+                for row in self.rows(2)
+            )
+            raise ParseError("Invalid CSV: truncated")
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ParseError):
+            ClientImport(self.business, batch_size=2).run(rows())
+        self.assertEqual(Client.objects.filter(business=self.business).count(), 3)
+        self.assertNotEqual(business_version(self.business.id), version)
+
+    def test_json(self):
+        rows = [
+            {"client_name": "A", "client_type": "Regular", "client_email": "a@example.com",
+             "client_phone": "5551111", "client_gender": "Female"},
+            "not a client",
+            {"client_name": "B"},
+        ]
+        response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual([error["row"] for error in response.json()["errors"]], [2, 3])
+        upload = BytesIO(json.dumps(rows[:1]).encode().replace(b"5551111", b"5552222").replace(b"a@", b"b@"))
+        upload.name = "clients.json"
+        self.assertEqual(self.client.post(self.url, {"file": upload}).json()["created"], 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post(self.url, {"client_name": "A"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"file": self.csv_file([], name="clients.xlsx")}).status_code, 400)
+        self.assertEqual(self.client.post("/api/business/999999/clients/import/", [], format="json").status_code, 404)
+
+    def test_concurrent_insert_falls_back_to_single_rows(self):
+        save = ClientImport.save
+
+        def racing_save(importer, clients):
+            # Another request takes an address after the chunk was checked
+            Client.objects.create(
+                business=create_business(phone_number="+918888888888"), client_name="Racer", client_type="Regular",
+                client_email="client2@example.com", client_phone="5557777", client_gender="Male",
+            )
+            return save(importer, clients)
+
+        with mock.patch.object(ClientImport, "save", racing_save):
+            report = ClientImport(self.business).run(
+                {field: value for field, value in zip(ClientImportSerializer.Meta.fields, row) if value}
+                for row in self.rows(3)
+            )
+        self.assertEqual(report["created"], 2)
+        self.assertEqual([error["row"] for error in report["errors"]], [2])
+
+    def test_command(self):
+        path = os.path.join(tempfile.mkdtemp(), "clients.csv")
+        with open(path, "wb") as file:
+            file.write(self.csv_file(self.rows(2) + [("Same", "Regular", "existing@example.com", "5550000", "", "Female")]).read())
+        out, err = StringIO(), StringIO()
+        call_command("import_clients", self.business.id, path, stdout=out, stderr=err)
+        self.assertIn("Imported 2 clients, skipped 1 rows", out.getvalue())
+        self.assertIn("row 3: client_email", err.getvalue())
+
+
+class BulkMutationTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        populate_business(self.business, 3)
+        self.client = APIClient()
+
+    def bulk(self, resource, body, status=200):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/business/{self.business.id}/{resource}/bulk/", body, format="json")
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def test_services(self):
+        category = ServiceCategory.objects.filter(business=self.business, parent__isnull=True).get()
+        existing = list(Services.objects.filter(business=self.business).order_by("id"))
+        version = business_version(self.business.id)
+        create = [
+            {"service_name": f"Cut {i}", "service_type": "Basic", "duration_in_mins": 30, "price": 200 + i, "category_id": category.id}
+            for i in range(20)
+        ]
+        # Business, the rows to update and delete, the categories, then in a
+        # savepoint the delete (with the appointments' links), the totals of
+        # the appointments that had the deleted service, update and insert
+        with self.assertNumQueries(15):
+            result = self.bulk("services", {
+                "create": create,
+                "update": [{"id": existing[0].id, "price": 999}],
+                "delete": [existing[1].id],
+            })
+        self.assertEqual(len(result["created"]), 20)
+        self.assertEqual(result["created"][0]["category"], category.id)
+        self.assertEqual(result["updated"][0]["price"], 999)
+        self.assertEqual(result["deleted"], [existing[1].id])
+        self.assertEqual(Services.objects.filter(business=self.business).count(), 3 + 20 - 1)
+        existing[0].refresh_from_db()
+        self.assertEqual(existing[0].price, 999)
+        self.assertGreater(existing[0].updated_at, existing[2].updated_at)
+        self.assertNotEqual(business_version(self.business.id), version)
+
+    def test_invalid_items_write_nothing(self):
+        other = create_business(phone_number="+919999999999")
+        foreign_category = ServiceCategory.objects.create(business=other, name="Elsewhere")
+        foreign_service = Services.objects.create(
+            business=other, service_name="Theirs", service_type="Basic", duration_in_mins=10, price=1,
+        )
+        service = Services.objects.filter(business=self.business).first()
+        errors = self.bulk("services", {
+            "create": [
+                {"service_name": "Fine", "service_type": "Basic", "duration_in_mins": 30, "price": 100},
+                {"service_name": "No price", "service_type": "Basic", "duration_in_mins": 30},
+                {"service_name": "Stolen", "service_type": "Basic", "duration_in_mins": 30, "price": 1, "category_id": foreign_category.id},
+                {"service_name": "Zero", "service_type": "Basic", "duration_in_mins": 30, "price": 1, "category_id": 0},
+            ],
+            "update": [{"id": foreign_service.id, "price": 1}, {"id": service.id, "price": -1}],
+            "delete": [service.id, "x"],
+        }, status=400)
+        self.assertEqual(errors["create"][0], {})
+        self.assertEqual(list(errors["create"][1]), ["price"])
+        self.assertEqual(list(errors["create"][2]), ["category_id"])
+        self.assertEqual(list(errors["create"][3]), ["category_id"])
+        self.assertEqual([list(item) for item in errors["update"]], [["id"], ["price"]])
+        self.assertEqual([list(item) for item in errors["delete"]], [["id"], ["id"]])
+        self.assertFalse(Services.objects.filter(service_name="Fine").exists())
+        self.assertTrue(Services.objects.filter(pk=service.pk).exists())
+
+    def test_bad_bodies(self):
+        for body in ([], {"create": {}}, {"upsert": []}, {"create": [{}] * 501}):
+            with self.subTest(body=str(body)[:20]):
+                self.bulk("packages", body, status=400)
+        response = self.client.post("/api/business/999999/packages/bulk/", {"create": []}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_packages(self):
+        package = Packages.objects.filter(business=self.business).first()
+        result = self.bulk("packages", {
+            "create": [{"package_name": "Bridal", "package_duration_in_mins": 240, "package_price": 9000}],
+            "update": [{"id": package.id, "package_name": "Renamed"}],
+        })
+        self.assertEqual(result["created"][0]["package_name"], "Bridal")
+        self.assertEqual(result["updated"][0]["package_name"], "Renamed")
+        self.assertEqual(result["updated"][0]["package_price"], package.package_price)
+
+    def test_categories(self):
+        root = ServiceCategory.objects.filter(business=self.business, parent__isnull=True).get()
+        leaf = ServiceCategory.objects.filter(business=self.business).order_by("-depth").first()
+        result = self.bulk("service-categories", {
+            "create": [{"name": "Nails"}, {"name": "Colour", "parent_id": root.id}],
+            "update": [{"id": leaf.id, "parent_id": root.id}],
+        })
+        nails = ServiceCategory.objects.get(pk=result["created"][0]["id"])
+        colour = ServiceCategory.objects.get(pk=result["created"][1]["id"])
+        self.assertEqual((nails.path, nails.depth), (ServiceCategory.path_segment(nails.id), 0))
+        self.assertEqual((colour.path, colour.depth), (root.path + ServiceCategory.path_segment(colour.id), 1))
+        leaf.refresh_from_db()
+        self.assertEqual((leaf.parent_id, leaf.depth), (root.id, 1))
+        # The subtree moved with it
+        self.assertEqual(
+            ServiceCategory.objects.filter(business=self.business, path__startswith=root.path).count(),
+            ServiceCategory.objects.filter(business=self.business).count() - 1,
+        )
+
+        child = ServiceCategory.objects.get(parent=root, name="Level 0")
+        errors = self.bulk("service-categories", {
+            "create": [{"name": "Orphan", "parent_id": child.id}],
+            "update": [{"id": child.id, "name": "Gone"}],
+            "delete": [root.id],
+        }, status=400)
+        self.assertEqual(list(errors["create"][0]), ["parent_id"])
+        self.assertEqual(errors["update"], [{"id": ["Deleted with its parent in this request."]}])
+        errors = self.bulk("service-categories", {
+            "update": [{"id": root.id, "parent_id": child.id}],
+            "delete": [root.id],
+        }, status=400)
+        self.assertEqual(list(errors["update"][0]), ["parent_id"])
+        self.assertEqual(errors["delete"], [{"id": ["Also updated in this request."]}])
+        errors = self.bulk("service-categories", {"create": [{"name": "Zero", "parent_id": 0}]}, status=400)
+        self.assertEqual(list(errors["create"][0]), ["parent_id"])
+
+        self.bulk("service-categories", {"delete": [root.id]})
+        self.assertFalse(ServiceCategory.objects.filter(path__startswith=root.path).exists())
+
+    def test_team_members(self):
+        member = TeamMember.objects.filter(business=self.business).order_by("id").first()
+        other = create_business(phone_number="+919999999999")
+        TeamMember.objects.create(
+            business=other, first_name="Else", last_name="Where", phone_number="5550000",
+            member_email="taken@example.com", date_of_joining=date(2024, 1, 1), access_type="Admin",
+        )
+
+        def new(phone, email):
+            return {"first_name": "New", "last_name": phone, "phone_number": phone, "member_email": email,
+                    "date_of_joining": "2024-02-01", "access_type": "Admin"}
+
+        errors = self.bulk("team-members", {
+            "create": [new("5551111", "a@example.com"), new("5551111", "b@example.com"), new("5552222", "taken@example.com")],
+            "update": [{"id": member.id, "phone_number": "5550000"}],
+        }, status=400)
+        self.assertEqual([list(item) for item in errors["create"]], [[], ["phone_number"], ["member_email"]])
+        self.assertEqual(list(errors["update"][0]), ["phone_number"])
+
+        # A value freed by an update or a delete in the same request can be reused
+        result = self.bulk("team-members", {
+            "create": [new(member.phone_number, "c@example.com")],
+            "update": [{"id": member.id, "phone_number": "5553333"}],
+        })
+        self.assertEqual(result["updated"][0]["phone_number"], "5553333")
+        second = TeamMember.objects.filter(business=self.business).order_by("id")[1]
+        self.bulk("team-members", {"create": [new("5554444", second.member_email)], "delete": [second.id]})
+        self.assertEqual(TeamMember.objects.filter(business=self.business).count(), 4)
+
+
+class CustomerJWTTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        customer_client("jwtuser", "+919800000001")
+        self.user = User.objects.get(username="jwtuser")
+        self.client = APIClient()
+
+    def sign_in(self):
+        response = self.client.post(
+            "/api/auth/signup", {"method": "email", "email": "jwtuser@example.com", "password": "x"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def bearer(self, access):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return api
+
+    def test_login_issues_tokens_checked_without_queries(self):
+        tokens = self.sign_in()
+        self.assertIn("token", tokens)
+        api = self.bearer(tokens["access"])
+        with self.assertNumQueries(0):
+            self.assertEqual(api.get("/api/auth/test_token").status_code, 200)
+        # Only the profile itself is loaded
+        with self.assertNumQueries(1):
+            response = api.get("/api/profile/view")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["email"], "jwtuser@example.com")
+
+    def test_verify_otp_issues_tokens(self):
+        with mock.patch.object(views.otp_service, "verify", return_value=VERIFIED):
+            response = self.client.post("/api/auth/verify-otp", {"phone_number": "+919800000001", "otp": "1234"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.bearer(response.json()["access"]).get("/api/profile/view").status_code, 200)
+
+    def test_refresh(self):
+        tokens = self.sign_in()
+        response = self.client.post("/api/auth/token/refresh", {"refresh": tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.bearer(response.json()["access"]).get("/api/profile/view").status_code, 200)
+        self.assertEqual(self.client.post("/api/auth/token/refresh", {"refresh": "junk"}, format="json").status_code, 401)
+        # An access token is not a refresh token
+        self.assertEqual(
+            self.client.post("/api/auth/token/refresh", {"refresh": tokens["access"]}, format="json").status_code, 401
+        )
+
+    def test_logout_revokes_both_tokens(self):
+        tokens = self.sign_in()
+        other = self.sign_in()
+        api = self.bearer(tokens["access"])
+        self.assertEqual(api.post("/api/auth/logout", {"refresh": tokens["refresh"]}, format="json").status_code, 204)
+        self.assertEqual(api.get("/api/profile/view").status_code, 401)
+        self.assertEqual(self.client.post("/api/auth/token/refresh", {"refresh": tokens["refresh"]}, format="json").status_code, 401)
+        # Other sessions stay signed in
+        self.assertEqual(self.bearer(other["access"]).get("/api/profile/view").status_code, 200)
+
+    def test_deactivating_revokes_every_token(self):
+        tokens = self.sign_in()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.bearer(tokens["access"]).get("/api/profile/view").status_code, 401)
+        self.assertEqual(self.client.post("/api/auth/token/refresh", {"refresh": tokens["refresh"]}, format="json").status_code, 401)
+
+    def test_opaque_tokens_still_work(self):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get(user=self.user).key}")
+        self.assertEqual(api.get("/api/profile/view").status_code, 200)
+        self.assertEqual(api.post("/api/auth/logout").status_code, 204)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = customer_client("cacheduser", "+919800000002")
+        self.user = User.objects.get(username="cacheduser")
+
+    def test_token_user_and_profile_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.api.get("/api/profile/view").status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.api.get("/api/profile/view")
+        self.assertEqual(response.json()["name"], "cacheduser")
+
+    def test_jwt_customer_is_cached(self):
+        tokens = tokens_for(self.user)
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with self.assertNumQueries(1):
+            api.get("/api/profile/view")
+        with self.assertNumQueries(0):
+            self.assertEqual(api.get("/api/profile/view").status_code, 200)
+
+    def test_profile_updates_are_seen(self):
+        self.api.get("/api/profile/view")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.patch("/api/profile/update", {"name": "Renamed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.api.get("/api/profile/view").json()["name"], "Renamed")
+
+    def test_deleted_token_is_rejected(self):
+        self.api.get("/api/profile/view")
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.api.get("/api/profile/view").status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.api.get("/api/profile/view")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.api.get("/api/profile/view").status_code, 401)
+
+    def test_unknown_token(self):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION="Token nope")
+        self.assertEqual(api.get("/api/profile/view").status_code, 401)
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        route_stats.reset()
+        self.business = create_business()
+        populate_business(self.business, 3)
+
+    def test_server_timing_and_log_line(self):
+        url = f"/api/business/{self.business.id}/"
+        with self.assertLogs("api.requests", level="INFO") as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(timing, r"db;dur=[\d.]+;.*view;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+")
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["route"], "GET /api/business/<int:id>/")
+        self.assertEqual((line["status"], line["queries"], line["bytes"]), (200, len(queries), len(response.content)))
+        self.assertGreater(line["view_ms"], 0)
+        self.assertGreater(line["render_ms"], 0)
+        self.assertLessEqual(line["view_ms"] + line["render_ms"] + line["db_ms"], line["total_ms"])
+
+    def test_route_percentiles(self):
+        for _ in range(5):
+            self.client.get(f"/api/business/{self.business.id}/clients/")
+        self.client.get("/api/business/999999/clients/")
+        self.assertEqual(self.client.get("/api/request-stats/").status_code, 403)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        stats = self.client.get("/api/request-stats/").json()
+        route = stats["routes"]["GET /api/business/<int:business_id>/clients/"]
+        self.assertEqual((route["sampled"], route["window"]), (6, 6))
+        self.assertEqual(set(route["queries"]), {"p50", "p95", "p99", "max"})
+        self.assertLessEqual(route["total_ms"]["p50"], route["total_ms"]["p99"])
+
+    def test_window(self):
+        with override_settings(REQUEST_METRICS_WINDOW=3):
+            route_stats.reset()
+            for _ in range(5):
+                self.client.get("/api/cache-stats/")
+        route = route_stats.snapshot()["routes"]["GET /api/cache-stats/"]
+        self.assertEqual((route["sampled"], route["window"]), (5, 3))
+
+    def test_streamed_responses_have_no_size(self):
+        self.client.get(f"/api/business/{self.business.id}/clients/export.csv")
+        route = route_stats.snapshot()["routes"]["GET /api/business/<int:business_id>/clients/export.<str:file_format>"]
+        self.assertNotIn("bytes", route)
+        self.assertNotIn("render_ms", route)
+
+    def test_serializers_are_not_patched(self):
+        self.client.get(f"/api/business/{self.business.id}/")
+        self.assertEqual(Serializer.data.fget.__module__, "rest_framework.serializers")
+        self.assertEqual(ListSerializer.data.fget.__module__, "rest_framework.serializers")
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_left_alone(self):
+        response = self.client.get(f"/api/business/{self.business.id}/")
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(route_stats.snapshot()["routes"], {})
+
+
+def seed_business(business, clients, appointments, category_depth, staff=10):
+    """
+    Give a business realistic volumes, inserted in bulk: a category tree
+    `category_depth` levels deep with two children per category and two
+    services in each, packages, staff working Monday to Saturday, `clients`
+    clients and `appointments` one hour appointments of two services and a
+    package, booked back to back across the staff from 2025-01-06.
+    """
+    prefix = f"+91{business.id:04d}"
+    categories, level = [], [None]
+    for depth in range(category_depth):
+        level = [
+            ServiceCategory.objects.create(business=business, name=f"Category {depth}.{i}", parent=parent)
+            for parent in level
+            for i in range(2)
+        ]
+        categories += level
+    services = Services.objects.bulk_create(
+        Services(business=business, service_name=f"Service {i}", service_type="Basic", duration_in_mins=15, price=100 + i, category=category)
+        for category in categories
+        for i in range(2)
+    )
+    packages = Packages.objects.bulk_create(
+        Packages(business=business, package_name=f"Package {i}", package_duration_in_mins=30, package_price=500)
+        for i in range(5)
+    )
+    members = TeamMember.objects.bulk_create(
+        TeamMember(
+            business=business,
+            first_name="Staff",
+            last_name=str(i),
+            phone_number=f"{prefix}9{i:05d}",
+            member_email=f"staff{business.id}-{i}@example.com",
+            date_of_joining=date(2024, 1, 1),
+            access_type="Admin",
+        )
+        for i in range(staff)
+    )
+    WorkingHours.objects.bulk_create(
+        WorkingHours(business=business, staff=member, weekday=weekday, start_time=time(9), end_time=time(17))
+        for member in members
+        for weekday in range(6)
+    )
+    customers = Client.objects.bulk_create(
+        Client(
+            business=business,
+            client_name=f"Client {i}",
+            client_type="Regular",
+            client_email=f"client{business.id}-{i}@example.com",
+            client_phone=f"{prefix}{i:06d}",
+            client_gender="Female",
+        )
+        for i in range(clients)
+    )
+
+    rows = []
+    first = datetime.combine(date(2025, 1, 6), time(9))
+    for i in range(appointments):
+        slot, member = divmod(i, staff)
+        # Eight one hour slots a day, six days a week
+        day, hour = divmod(slot, 8)
+        week, day = divmod(day, 6)
+        starts = first + timedelta(days=7 * week + day, hours=hour)
+        rows.append(Appointment(
+            business=business,
+            staff=members[member],
+            client_appointments=customers[i % clients],
+            appointment_date=starts.date(),
+            appointment_time=starts.time(),
+            total_amount=services[i % len(services)].price + services[(i + 1) % len(services)].price + 500,
+            total_duration_mins=60,
+            end_time=(starts + timedelta(hours=1)).time(),
+        ))
+    rows = Appointment.objects.bulk_create(rows)
+    Appointment.services.through.objects.bulk_create(
+        Appointment.services.through(appointment_id=appointment.id, services_id=services[(i + offset) % len(services)].id)
+        for i, appointment in enumerate(rows)
+        for offset in range(2)
+    )
+    Appointment.packages.through.objects.bulk_create(
+        Appointment.packages.through(appointment_id=appointment.id, packages_id=packages[i % len(packages)].id)
+        for i, appointment in enumerate(rows)
+    )
+    return SimpleNamespace(
+        business=business,
+        category=categories[0],
+        service=services[0],
+        package=packages[0],
+        staff=members[0],
+        hours=WorkingHours.objects.filter(staff=members[0]).first(),
+        client=customers[0],
+        appointment=rows[0],
+    )
+
+
+def measured(route, method, bound, customer=False, staff=False):
+    """
+    Register a request builder of EndpointQueryCountTests for a route of
+    api/urls.py, sent by the seeded customer or a staff user if asked.
+    """
+
+    def register(build):
+        build.endpoint = (route, method, bound, "customer" if customer else "staff" if staff else None)
+        return build
+
+    return register
+
+
+@override_settings(OTP_AUDIT_LOG=False, SMS_GATEWAY="api.sms.LocalGateway")
+class EndpointQueryCountTests(TestCase):
+    """
+    Every route of api/urls.py with an upper bound on its queries, checked
+    against a small business and one with hundreds of clients, thousands of
+    appointments and a deep category tree. The count must also be the same
+    for both: a query per row shows up as a difference long before it hits
+    the bound. Requests run with an empty cache, each in a transaction that
+    is rolled back afterwards.
+
+    A new route needs a request builder here, test_every_route_is_measured
+    fails until it has one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sizes = {
+            "small": seed_business(create_business("+911000000101"), clients=5, appointments=20, category_depth=2),
+            "large": seed_business(create_business("+911000000102"), clients=300, appointments=2000, category_depth=4),
+        }
+        for seeded in cls.sizes.values():
+            username = f"cust{seeded.business.id}"
+            customer_client(username, seeded.client.client_phone)
+            seeded.user = User.objects.get(username=username)
+            # auth/login takes the customer's email as the username
+            seeded.user.username = seeded.user.customer_profile.email
+            seeded.user.set_password("secret")
+            seeded.user.save()
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+
+    @classmethod
+    def builders(cls):
+        return [
+            getattr(cls, name) for name in dir(cls)
+            if name.startswith("request_") and hasattr(getattr(cls, name), "endpoint")
+        ]
+
+    def api(self, seeded, user):
+        api = APIClient()
+        if user == "customer":
+            api.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get(user=seeded.user).key}")
+        elif user == "staff":
+            api.force_authenticate(self.staff)
+        return api
+
+    def measure(self, build, seeded):
+        _, method, _, user = build.endpoint
+        cache.clear()
+        with transaction.atomic():
+            path, data = build(self, seeded)
+            api = self.api(seeded, user)
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(api, method)(path, data, format="json")
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {path}: {getattr(response, 'data', '')}")
+        return [query["sql"] for query in queries.captured_queries]
+
+    def test_query_counts_are_bounded_and_constant(self):
+        for build in self.builders():
+            route, method, bound, _ = build.endpoint
+            with self.subTest(route=route, method=method):
+                # Leaves out work done once per process, e.g. loading the coordinate index
+                self.measure(build, self.sizes["small"])
+                small = self.measure(build, self.sizes["small"])
+                large = self.measure(build, self.sizes["large"])
+                self.assertLessEqual(len(large), bound, "\n".join(large))
+                self.assertEqual(len(small), len(large), "\n".join(large))
+
+    def test_every_route_is_measured(self):
+        routes = {str(pattern.pattern) for pattern in api_urls.urlpatterns}
+        measured_routes = {build.endpoint[0] for build in self.builders()}
+        self.assertEqual(routes - measured_routes, set())
+        self.assertEqual(measured_routes - routes, set())
+
+    # Services and categories
+
+    @measured("services/", "get", 1)
+    def request_services_list(self, s):
+        return f"/api/services/?business_id={s.business.id}", None
+
+    @measured("services/", "post", 2)
+    def request_services_create(self, s):
+        data = {"business_id": s.business.id, "service_name": "New", "service_type": "Basic", "duration_in_mins": 30, "price": 10}
+        return "/api/services/", data
+
+    @measured("services/<int:pk>/", "patch", 2)
+    def request_services_update(self, s):
+        return f"/api/services/{s.service.id}/", {"price": 150}
+
+    @measured("services/<int:pk>/", "delete", 8)
+    def request_services_delete(self, s):
+        return f"/api/services/{s.service.id}/", None
+
+    @measured("services/filter", "get", 1)
+    def request_services_filter(self, s):
+        return "/api/services/filter?category=Category&priceMin=100", None
+
+    @measured("service-categories/", "get", 2)
+    def request_categories_list(self, s):
+        return f"/api/service-categories/?business_id={s.business.id}", None
+
+    @measured("service-categories/", "post", 8)
+    def request_categories_create(self, s):
+        return "/api/service-categories/", {"business_id": s.business.id, "name": "New", "parent": s.category.id}
+
+    @measured("service-categories/<int:pk>/", "get", 5)
+    def request_categories_detail(self, s):
+        return f"/api/service-categories/{s.category.id}/", None
+
+    @measured("service-categories/<int:pk>/", "patch", 6)
+    def request_categories_update(self, s):
+        return f"/api/service-categories/{s.category.id}/", {"name": "Renamed"}
+
+    # Businesses
+
+    @measured("business/", "get", 10)
+    def request_business_list(self, s):
+        return "/api/business/", None
+
+    @measured("business/", "post", 9)
+    def request_business_create(self, s):
+        data = {"phone_number": "+911000000199", "owner_name": "Owner", "salon_name": "New", "owner_email": "new@example.com",
+                "latitude": 12.9, "longitude": 77.6}
+        return "/api/business/", data
+
+    @measured("business/<int:id>/", "get", 10)
+    def request_business_detail(self, s):
+        return f"/api/business/{s.business.id}/", None
+
+    @measured("business/<int:id>/", "patch", 12)
+    def request_business_update(self, s):
+        return f"/api/business/{s.business.id}/", {"salon_name": "Renamed"}
+
+    @measured("business/<int:business_id>/clients/", "get", 3)
+    def request_business_clients(self, s):
+        return f"/api/business/{s.business.id}/clients/", None
+
+    @measured("business/<int:business_id>/team-members/", "get", 3)
+    def request_business_team_members(self, s):
+        return f"/api/business/{s.business.id}/team-members/", None
+
+    @measured("business/<int:business_id>/services/", "get", 3)
+    def request_business_services(self, s):
+        return f"/api/business/{s.business.id}/services/", None
+
+    @measured("business/<int:business_id>/packages/", "get", 3)
+    def request_business_packages(self, s):
+        return f"/api/business/{s.business.id}/packages/", None
+
+    @measured("business/<int:business_id>/service-categories/", "get", 6)
+    def request_business_categories(self, s):
+        return f"/api/business/{s.business.id}/service-categories/", None
+
+    @measured("business/<int:business_id>/appointments/", "get", 5)
+    def request_business_appointments(self, s):
+        return f"/api/business/{s.business.id}/appointments/", None
+
+    @measured("business/<int:business_id>/clients/export.<str:file_format>", "get", 2)
+    def request_business_clients_export(self, s):
+        return f"/api/business/{s.business.id}/clients/export.csv", None
+
+    @measured("business/<int:business_id>/appointments/export.<str:file_format>", "get", 4)
+    def request_business_appointments_export(self, s):
+        return f"/api/business/{s.business.id}/appointments/export.jsonl", None
+
+    @measured("business/<int:business_id>/clients/import/", "post", 6)
+    def request_business_clients_import(self, s):
+        rows = [
+            {"client_name": f"Imported {i}", "client_type": "Regular", "client_email": f"imported{s.business.id}-{i}@example.com",
+             "client_phone": f"+91{s.business.id:04d}8{i:05d}", "client_gender": "Male"}
+            for i in range(10)
+        ]
+        return f"/api/business/{s.business.id}/clients/import/", rows
+
+    @measured("business/<int:business_id>/services/bulk/", "post", 7)
+    def request_business_services_bulk(self, s):
+        data = {
+            "create": [{"service_name": f"Bulk {i}", "service_type": "Basic", "duration_in_mins": 30, "price": 10, "category_id": s.category.id} for i in range(10)],
+            "update": [{"id": s.service.id, "price": 120}],
+        }
+        return f"/api/business/{s.business.id}/services/bulk/", data
+
+    @measured("business/<int:business_id>/packages/bulk/", "post", 13)
+    def request_business_packages_bulk(self, s):
+        data = {
+            "create": [{"package_name": f"Bulk {i}", "package_duration_in_mins": 60, "package_price": 900} for i in range(10)],
+            "delete": [s.package.id],
+        }
+        return f"/api/business/{s.business.id}/packages/bulk/", data
+
+    @measured("business/<int:business_id>/service-categories/bulk/", "post", 19)
+    def request_business_categories_bulk(self, s):
+        data = {"create": [{"name": f"Bulk {i}", "parent_id": s.category.id} for i in range(10)]}
+        return f"/api/business/{s.business.id}/service-categories/bulk/", data
+
+    @measured("business/<int:business_id>/team-members/bulk/", "post", 7)
+    def request_business_team_members_bulk(self, s):
+        data = {
+            "create": [
+                {"first_name": "Bulk", "last_name": str(i), "phone_number": f"+91{s.business.id:04d}7{i:05d}",
+                 "member_email": f"bulk{s.business.id}-{i}@example.com", "date_of_joining": "2025-01-01", "access_type": "Admin"}
+                for i in range(10)
+            ],
+            "update": [{"id": s.staff.id, "last_name": "Renamed"}],
+        }
+        return f"/api/business/{s.business.id}/team-members/bulk/", data
+
+    # Clients, team members, packages and appointments
+
+    @measured("clients/", "get", 1)
+    def request_clients_list(self, s):
+        return f"/api/clients/?business_id={s.business.id}", None
+
+    @measured("clients/", "post", 4)
+    def request_clients_create(self, s):
+        data = {"business_id": s.business.id, "client_name": "New", "client_type": "Regular", "client_email": "new@example.com",
+                "client_phone": "+919000000001", "client_gender": "Male"}
+        return "/api/clients/", data
+
+    @measured("clients/<int:pk>/", "patch", 2)
+    def request_clients_update(self, s):
+        return f"/api/clients/{s.client.id}/", {"client_name": "Renamed"}
+
+    @measured("client-metadata/", "get", 0)
+    def request_client_metadata(self, s):
+        return "/api/client-metadata/", None
+
+    @measured("team-members/", "get", 1)
+    def request_team_members_list(self, s):
+        return f"/api/team-members/?business_id={s.business.id}", None
+
+    @measured("team-members/", "post", 4)
+    def request_team_members_create(self, s):
+        data = {"business_id": s.business.id, "first_name": "New", "last_name": "Member", "phone_number": "+919000000002",
+                "member_email": "member@example.com", "date_of_joining": "2025-01-01", "access_type": "Admin"}
+        return "/api/team-members/", data
+
+    @measured("team-members/<int:pk>/", "get", 2)
+    def request_team_members_detail(self, s):
+        return f"/api/team-members/{s.staff.id}/", None
+
+    @measured("packages/", "get", 1)
+    def request_packages_list(self, s):
+        return f"/api/packages/?business_id={s.business.id}", None
+
+    @measured("packages/", "post", 2)
+    def request_packages_create(self, s):
+        data = {"business_id": s.business.id, "package_name": "New", "package_duration_in_mins": 60, "package_price": 900}
+        return "/api/packages/", data
+
+    @measured("packages/<int:pk>/", "get", 2)
+    def request_packages_detail(self, s):
+        return f"/api/packages/{s.package.id}/", None
+
+    @measured("appointments/", "get", 3)
+    def request_appointments_list(self, s):
+        return f"/api/appointments/?business_id={s.business.id}", None
+
+    @measured("appointments/", "post", 18)
+    def request_appointments_create(self, s):
+        data = {"business_id": s.business.id, "services": [s.service.id], "packages": [s.package.id], "staff": s.staff.id,
+                "client_appointments": s.client.id, "appointment_date": "2026-01-05", "appointment_time": "10:00"}
+        return "/api/appointments/", data
+
+    @measured("appointments/<int:pk>/", "get", 4)
+    def request_appointments_detail(self, s):
+        return f"/api/appointments/{s.appointment.id}/", None
+
+    @measured("appointments/<int:pk>/", "patch", 13)
+    def request_appointments_update(self, s):
+        return f"/api/appointments/{s.appointment.id}/", {"services": [s.service.id], "notes": "Moved"}
+
+    # Working hours and free slots
+
+    @measured("working-hours/", "get", 1)
+    def request_working_hours_list(self, s):
+        return f"/api/working-hours/?business_id={s.business.id}", None
+
+    @measured("working-hours/", "post", 2)
+    def request_working_hours_create(self, s):
+        return "/api/working-hours/", {"staff": s.staff.id, "weekday": 6, "start_time": "10:00", "end_time": "14:00"}
+
+    @measured("working-hours/<int:pk>/", "get", 2)
+    def request_working_hours_detail(self, s):
+        return f"/api/working-hours/{s.hours.id}/", None
+
+    @measured("availability", "get", 4)
+    def request_availability(self, s):
+        return f"/api/availability?business_id={s.business.id}&start_date=2025-01-06&service_ids={s.service.id}", None
+
+    @measured("cache-stats/", "get", 0, staff=True)
+    def request_cache_stats(self, s):
+        return "/api/cache-stats/", None
+
+    @measured("request-stats/", "get", 0, staff=True)
+    def request_request_stats(self, s):
+        return "/api/request-stats/", None
+
+    # Business sign in
+
+    @measured("check-business/", "post", 1)
+    def request_check_business(self, s):
+        return "/api/check-business/", {"phone_number": str(s.business.phone_number)}
+
+    @measured("send-otp/", "post", 0)
+    def request_send_otp(self, s):
+        return "/api/send-otp/", {"phone_number": str(s.business.phone_number)}
+
+    @measured("verify-otp/", "post", 10)
+    def request_verify_otp(self, s):
+        phone_number = str(s.business.phone_number)
+        return "/api/verify-otp/", {"phone_number": phone_number, "otp": otp_service.issue(phone_number)}
+
+    # Customer app
+
+    @measured("post", "post", 1)
+    def request_customer_create(self, s):
+        data = {"unique_id": "NEW", "name": "New", "email": "newcustomer@example.com", "phone_number": "+919000000003", "date_of_birth": "1990-01-01"}
+        return "/api/post", data
+
+    @measured("get", "get", 1)
+    def request_customer_list(self, s):
+        return "/api/get", None
+
+    @measured("auth/signup", "post", 4)
+    def request_signup(self, s):
+        return "/api/auth/signup", {"method": "phone", "phone_number": s.client.client_phone}
+
+    @measured("auth/signup_create_user", "post", 3)
+    def request_signup_create_user(self, s):
+        data = {"name": "new", "email": "newuser@example.com", "phone_number": "+919000000004", "date_of_birth": "1990-01-01", "password": "secret"}
+        return "/api/auth/signup_create_user", data
+
+    @measured("auth/login", "post", 5)
+    def request_login(self, s):
+        return "/api/auth/login", {"method": "email", "email": s.user.customer_profile.email, "password": "secret"}
+
+    @measured("auth/verify-otp", "post", 2)
+    def request_customer_verify_otp(self, s):
+        phone_number = s.client.client_phone
+        return "/api/auth/verify-otp", {"phone_number": phone_number, "otp": otp_service.issue(phone_number)}
+
+    @measured("auth/test_token", "get", 1, customer=True)
+    def request_test_token(self, s):
+        return "/api/auth/test_token", None
+
+    @measured("auth/token/refresh", "post", 0)
+    def request_token_refresh(self, s):
+        return "/api/auth/token/refresh", {"refresh": tokens_for(s.user)["refresh"]}
+
+    @measured("auth/logout", "post", 2, customer=True)
+    def request_logout(self, s):
+        return "/api/auth/logout", None
+
+    @measured("profile/view", "get", 1, customer=True)
+    def request_profile_view(self, s):
+        return "/api/profile/view", None
+
+    @measured("profile/update", "patch", 2, customer=True)
+    def request_profile_update(self, s):
+        return "/api/profile/update", {"name": "Renamed"}
+
+    @measured("profile/delete", "delete", 2, customer=True)
+    def request_profile_delete(self, s):
+        return "/api/profile/delete", None
+
+    @measured("salons/", "get", 2, customer=True)
+    def request_salons_nearby(self, s):
+        return "/api/salons/?latitude=12.97&longitude=77.59&radius=5", None
+
+    @measured("salons/<int:salon_id>", "get", 10)
+    def request_salon_detail(self, s):
+        return f"/api/salons/{s.business.id}", None
+
+    @measured("salons/<int:salon_id>/services", "get", 2)
+    def request_salon_services(self, s):
+        return f"/api/salons/{s.business.id}/services", None
+
+    # Bookings
+
+    def booking(self, s):
+        return {"business_id": s.business.id, "service_ids": [s.service.id], "package_ids": [s.package.id],
+                "appointment_date": "2026-01-05", "appointment_time": "10:00"}
+
+    def hold(self, s):
+        response = self.api(s, "customer").post("/api/bookings/hold", self.booking(s), format="json")
+        return response.json()["hold_id"]
+
+    @measured("bookings/create", "post", 21, customer=True)
+    def request_booking_create(self, s):
+        return "/api/bookings/create", self.booking(s)
+
+    @measured("bookings/hold", "post", 7, customer=True)
+    def request_booking_hold(self, s):
+        return "/api/bookings/hold", self.booking(s)
+
+    @measured("bookings/hold/<str:hold_id>", "get", 0, customer=True)
+    def request_booking_hold_detail(self, s):
+        return f"/api/bookings/hold/{self.hold(s)}", None
+
+    @measured("bookings/hold/<str:hold_id>/confirm", "post", 17, customer=True)
+    def request_booking_hold_confirm(self, s):
+        return f"/api/bookings/hold/{self.hold(s)}/confirm", None
+
+    @measured("bookings/<int:booking_id>/cancel", "delete", 3, customer=True)
+    def request_booking_cancel(self, s):
+        return f"/api/bookings/{s.appointment.id}/cancel", None
+
+    @measured("bookings/status", "get", 4, customer=True)
+    def request_booking_status(self, s):
+        return f"/api/bookings/status?userId={s.user.id}", None
+
+
+class SeedBenchmarkDataTests(TestCase):
+    options = {
+        "businesses": 2,
+        "category_depth": 3,
+        "category_breadth": 2,
+        "services_per_category": 2,
+        "packages": 3,
+        "team_members": 3,
+        "clients": 10,
+        "appointments": 60,
+        "customers": 5,
+        "otps": 8,
+        "start_date": date(2025, 1, 6),
+        "batch_size": 25,
+    }
+
+    def seed(self, **options):
+        out = StringIO()
+        call_command("seed_benchmark_data", stdout=out, **{**self.options, **options})
+        return out.getvalue()
+
+    def snapshot(self):
+        return [
+            list(Business.objects.order_by("id").values_list("salon_name", "latitude", "longitude")),
+            list(ServiceCategory.objects.order_by("id").values_list("name", "depth")),
+            list(Client.objects.order_by("id").values_list("client_name", "client_dob")),
+            list(Appointment.objects.order_by("id").values_list("appointment_date", "appointment_time", "status", "total_amount", "end_time")),
+            list(Appointment.services.through.objects.order_by("id").values_list("services__service_name", flat=True)),
+        ]
+
+    def test_volumes(self):
+        output = self.seed()
+
+        self.assertEqual(Business.objects.count(), 2)
+        # 2 + 4 + 8 categories a business
+        self.assertEqual(ServiceCategory.objects.count(), 28)
+        self.assertEqual(Services.objects.count(), 56)
+        self.assertEqual(TeamMember.objects.count(), 6)
+        self.assertEqual(WorkingHours.objects.count(), 36)
+        self.assertEqual(Client.objects.count(), 20)
+        self.assertEqual(Appointment.objects.count(), 120)
+        self.assertEqual(Customer.objects.filter(user__isnull=False).count(), 5)
+        self.assertEqual(OTP.objects.count(), 8)
+        self.assertGreaterEqual(Appointment.services.through.objects.count(), 120)
+        self.assertIn("120 appointments", output)
+
+    def test_columns_save_would_set(self):
+        self.seed()
+
+        for business in Business.objects.all():
+            self.assertEqual(business.geo_cell, geo_cell(business.latitude, business.longitude))
+        for category in ServiceCategory.objects.select_related("parent"):
+            parent_path = category.parent.path if category.parent else ""
+            self.assertEqual(category.path, parent_path + ServiceCategory.path_segment(category.pk))
+            self.assertEqual(category.depth, category.parent.depth + 1 if category.parent else 0)
+        self.assertFalse(WorkingHours.objects.exclude(business_id=F("staff__business_id")).exists())
+        for appointment in Appointment.objects.prefetch_related("services", "packages"):
+            stored = (appointment.total_amount, appointment.total_duration_mins, appointment.end_time)
+            appointment.calculate_totals(appointment.services.all(), appointment.packages.all())
+            self.assertEqual(stored, (appointment.total_amount, appointment.total_duration_mins, appointment.end_time))
+
+    def test_staff_are_never_double_booked(self):
+        self.seed()
+
+        previous = None
+        for appointment in Appointment.objects.order_by("staff_id", "appointment_date", "appointment_time"):
+            if previous is not None and (previous.staff_id, previous.appointment_date) == (appointment.staff_id, appointment.appointment_date):
+                self.assertLessEqual(previous.end_time, appointment.appointment_time)
+            previous = appointment
+
+    def test_same_seed_same_data(self):
+        snapshots = []
+        for seed in (3, 3, 4):
+            with transaction.atomic():
+                self.seed(seed=seed)
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertNotEqual(snapshots[0], snapshots[2])
+
+    def test_appointments_need_services_and_staff(self):
+        with self.assertRaises(CommandError):
+            self.seed(team_members=0)
@@ -7,12 +7,30 @@ from .views import (
     ServiceCategoryDetailView,
     BusinessListCreateView,
     BusinessDetailView,
+    BusinessClientsView,
+    BusinessTeamMembersView,
+    BusinessServicesListView,
+    BusinessPackagesView,
+    BusinessCategoriesView,
+    BusinessAppointmentsView,
+    BusinessClientsExportView,
+    BusinessAppointmentsExportView,
+    BusinessClientsImportView,
+    BusinessServicesBulkView,
+    BusinessPackagesBulkView,
+    BusinessCategoriesBulkView,
+    BusinessTeamMembersBulkView,
     ClientListCreateView,
     ClientDetailView,
     TeamMemberListCreateView,
     TeamMemberDetailView,
     AppointmentListCreateView,
     AppointmentDetailView,
+    WorkingHoursListCreateView,
+    WorkingHoursDetailView,
+    AvailabilityView,
+    CacheStatsView,
+    RequestStatsView,
     SendOTPView,
     CheckBusinessView,
     VerifyOTPView,
@@ -21,9 +39,10 @@ from .views import (
     client_metadata_view
 )
 from django.urls import path
-from .views import CustomerView, CustomerListView, signup_create_user, login, test_token, verify_otp, signup
+from .views import CustomerView, CustomerListView, signup_create_user, login, test_token, verify_otp, signup, refresh_token, logout
 from .views import CustomerProfileView, CustomerProfileUpdateView, CustomerProfileDeleteView, get_Business_by_location, ServiceFilterView
-from .views import BusinessDetailView, BusinessServicesView, AppointmentCreateView, AppointmentStatusView, AppointmentCancelView
+from .views import SalonDetailView, BusinessServicesView, AppointmentCreateView, AppointmentStatusView, AppointmentCancelView
+from .views import SlotHoldView, SlotHoldDetailView, SlotHoldConfirmView
 
 urlpatterns = [
     # Services
@@ -37,6 +56,19 @@ urlpatterns = [
     # Business
     path('business/', BusinessListCreateView.as_view(), name='business-list-create'),
     path('business/<int:id>/', BusinessDetailView.as_view(), name='business-detail'),
+    path('business/<int:business_id>/clients/', BusinessClientsView.as_view(), name='business-clients'),
+    path('business/<int:business_id>/team-members/', BusinessTeamMembersView.as_view(), name='business-team-members'),
+    path('business/<int:business_id>/services/', BusinessServicesListView.as_view(), name='business-services'),
+    path('business/<int:business_id>/packages/', BusinessPackagesView.as_view(), name='business-packages'),
+    path('business/<int:business_id>/service-categories/', BusinessCategoriesView.as_view(), name='business-categories'),
+    path('business/<int:business_id>/appointments/', BusinessAppointmentsView.as_view(), name='business-appointments'),
+    path('business/<int:business_id>/clients/export.<str:file_format>', BusinessClientsExportView.as_view(), name='business-clients-export'),
+    path('business/<int:business_id>/clients/import/', BusinessClientsImportView.as_view(), name='business-clients-import'),
+    path('business/<int:business_id>/services/bulk/', BusinessServicesBulkView.as_view(), name='business-services-bulk'),
+    path('business/<int:business_id>/packages/bulk/', BusinessPackagesBulkView.as_view(), name='business-packages-bulk'),
+    path('business/<int:business_id>/service-categories/bulk/', BusinessCategoriesBulkView.as_view(), name='business-categories-bulk'),
+    path('business/<int:business_id>/team-members/bulk/', BusinessTeamMembersBulkView.as_view(), name='business-team-members-bulk'),
+    path('business/<int:business_id>/appointments/export.<str:file_format>', BusinessAppointmentsExportView.as_view(), name='business-appointments-export'),
 
     # Clients
     path('clients/', ClientListCreateView.as_view(), name='client-list-create'),
@@ -50,6 +82,15 @@ urlpatterns = [
     # Appointments
     path('appointments/', AppointmentListCreateView.as_view(), name='appointment-list-create'),
     path('appointments/<int:pk>/', AppointmentDetailView.as_view(), name='appointment-detail'),
+
+    # Working hours and free slots
+    path('working-hours/', WorkingHoursListCreateView.as_view(), name='working-hours-list-create'),
+    path('working-hours/<int:pk>/', WorkingHoursDetailView.as_view(), name='working-hours-detail'),
+    path('availability', AvailabilityView.as_view(), name='availability'),
+
+    # Response cache
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('request-stats/', RequestStatsView.as_view(), name='request-stats'),
     
     # Packages
     path('packages/', PackagesListCreateView.as_view(), name='packages-list-create'),
@@ -69,14 +110,19 @@ urlpatterns = [
     path('auth/login', login),
     path('auth/verify-otp', verify_otp ),
     path('auth/test_token', test_token),
+    path('auth/token/refresh', refresh_token),
+    path('auth/logout', logout),
     path('profile/view', CustomerProfileView.as_view(), name='view-profile'),
     path('profile/update', CustomerProfileUpdateView.as_view(), name='update-profile'),
     path('profile/delete', CustomerProfileDeleteView.as_view(), name='delete-profile'),
     path('salons/', get_Business_by_location, name='get_salons_by_location'),
     path('services/filter', ServiceFilterView.as_view(), name='service_filter'),
-    path('salons/<int:salon_id>', BusinessDetailView.as_view(), name='salon_detail'),
+    path('salons/<int:salon_id>', SalonDetailView.as_view(), name='salon_detail'),
     path('salons/<int:salon_id>/services', BusinessServicesView.as_view(), name='salon_services'),
     path('bookings/create', AppointmentCreateView.as_view(), name='create_booking'),
+    path('bookings/hold', SlotHoldView.as_view(), name='hold_slot'),
+    path('bookings/hold/<str:hold_id>', SlotHoldDetailView.as_view(), name='slot_hold'),
+    path('bookings/hold/<str:hold_id>/confirm', SlotHoldConfirmView.as_view(), name='confirm_slot_hold'),
     path('bookings/<int:booking_id>/cancel', AppointmentCancelView.as_view(), name='cancel_booking'),
     path('bookings/status', AppointmentStatusView.as_view(), name='booking_status'),
 ]
@@ -2,30 +2,31 @@
 from rest_framework import generics, status, request
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Business, OTP, ServiceCategory, Services, Client, TeamMember, Appointment, Packages
-from .serializers import BusinessSerializer, OTPSerializer, ServiceCategorySerializer, ServicesSerializer, ClientSerializer, TeamMemberSerializer, AppointmentSerializer, PackagesSerializer
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
+from .models import Business, OTP, ServiceCategory, Services, Client, TeamMember, WorkingHours, Appointment, Packages
+from .serializers import BusinessSerializer, BusinessSummarySerializer, OTPSerializer, ServiceCategorySerializer, ServicesSerializer, ClientSerializer, TeamMemberSerializer, WorkingHoursSerializer, AppointmentSerializer, PackagesSerializer
 from django.utils import timezone
-from datetime import timedelta
-from rest_framework.permissions import AllowAny
+from datetime import date, timedelta
+from rest_framework.permissions import AllowAny, IsAdminUser
 from django.http import JsonResponse
 from phonenumbers import parse, is_valid_number, format_number, PhoneNumberFormat
-from twilio.rest import Client as cl
+from .sms import send_otp_sms
+from .otp import otp_service, VERIFIED, INVALID, EXPIRED, TOO_MANY_ATTEMPTS
+from .pagination import KeysetPagination
+from .cache import BusinessResponseCacheMixin, ConditionalGetMixin, cache_stats
+from .authentication import STAFF_AUTHENTICATION_CLASSES
+from .instrumentation import route_stats
+from .availability import bits, free_bitmaps, slot_minutes, time_span, week_availability
+from .booking import BookingConflict, save_appointment
+from .holds import slot_holds
+from .exports import StreamingExportMixin
+from .imports import ClientImport, read_csv, read_json
+from .bulk import CategoriesBulk, PackagesBulk, ServicesBulk, TeamMembersBulk
+import math
 import os
 from django.conf import settings
 
-def send_otp_twilio(otp, number):
-    account_sid = settings.TWILIO_ACCOUNT_SID
-    auth_token = settings.TWILIO_AUTH_TOKEN
-    client = cl(account_sid, auth_token)
-    
-    message = client.messages.create(
-        body = f"Your otp for wavvy login is {otp}",
-        from_="+16206788254",
-        to= f"{number}"
-    )
-    
-    print(message.body)
-
 class SendOTPView(APIView):
     permission_classes = [AllowAny]
 
@@ -34,16 +35,11 @@ class SendOTPView(APIView):
         if not phone_number:
             return Response({'error': 'Phone number is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create a new OTP record
-        otp = OTP(phone_number=phone_number)
-        otp.generate_otp()
-        otp.save()
-        
-        # Here you would send the OTP to the user's phone number
-        # For now, we'll just print it to the console
-        print(f"OTP for {phone_number} is {otp.otp}")
-        
-        
+        otp = otp_service.issue(phone_number)
+
+        # Delivered in the background, the response does not wait for the gateway
+        send_otp_sms(phone_number, otp)
+
         return Response({'message': 'OTP sent successfully'}, status=status.HTTP_200_OK)
 
 class VerifyOTPView(APIView):
@@ -56,27 +52,13 @@ class VerifyOTPView(APIView):
         if not phone_number or not otp:
             return Response({'error': 'Phone number and OTP are required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Fetch the most recent OTP record for the given phone number
-        otp_record = OTP.objects.filter(phone_number=phone_number).order_by('-created_at').first()
-        
-        if not otp_record:
-            return Response({'error': 'No OTP found for this phone number'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Debugging: Print OTP creation time and current time
-        print(f"OTP created at: {otp_record.created_at}")
-        print(f"Current time: {timezone.now()}")
-        
-        # Check if the OTP matches
-        if otp_record.otp != otp:
+        result = otp_service.verify(phone_number, otp)
+        if result == INVALID:
             return Response({'error': 'Invalid OTP'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check if the OTP is expired
-        if otp_record.created_at < timezone.now() - timedelta(minutes=5):
-            return Response({'error': 'OTP expired'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Mark the OTP as verified
-        otp_record.is_verified = True
-        otp_record.save()
+        if result == EXPIRED:
+            return Response({'error': 'OTP expired or not requested'}, status=status.HTTP_400_BAD_REQUEST)
+        if result == TOO_MANY_ATTEMPTS:
+            return Response({'error': 'Too many attempts, request a new OTP'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
         
         # Store the verified phone number in the session
         request.session['verified_phone_number'] = phone_number
@@ -99,35 +81,193 @@ class CheckBusinessView(APIView):
             return Response({'exists': False, 'redirect': '/register'}, status=status.HTTP_200_OK)
 
 # CRUD Views for Business
-class BusinessListCreateView(generics.ListCreateAPIView):
+class BusinessListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Business.objects.all()
     serializer_class = BusinessSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
 
-class BusinessDetailView(generics.RetrieveUpdateDestroyAPIView):
+    def get_queryset(self):
+        return BusinessSerializer.setup_eager_loading(Business.objects.all())
+
+class BusinessDetailView(ConditionalGetMixin, BusinessResponseCacheMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Business.objects.all()
     serializer_class = BusinessSerializer
     lookup_field = 'id'
     permission_classes = [AllowAny]  # Allow unauthenticated access
 
+    def get_scope_business_id(self):
+        return str(self.kwargs['id'])
+
+    def is_summary(self):
+        return self.request.method == 'GET' and self.request.query_params.get('view') == 'summary'
+
+    def get_queryset(self):
+        # ?view=summary only needs the profile row plus per-collection counts
+        if self.is_summary():
+            return BusinessSummarySerializer.annotate_counts(Business.objects.all())
+        if self.request.method == 'GET':
+            return BusinessSerializer.setup_eager_loading(Business.objects.all())
+        return Business.objects.all()
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return BusinessSummarySerializer
+        return BusinessSerializer
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # The response nests every collection, load them the way GET does
+        serializer.instance = BusinessSerializer.setup_eager_loading(Business.objects.all()).get(pk=serializer.instance.pk)
+
+
+# Paginated slices of the collections embedded in the full business payload
+class BusinessCollectionPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class BusinessCollectionView(ConditionalGetMixin, generics.ListAPIView):
+    permission_classes = [AllowAny]
+    pagination_class = BusinessCollectionPagination
+    model = None
+    ordering = ('id',)
+
+    def get_queryset(self):
+        return self.model.objects.filter(business_id=self.kwargs['business_id']).order_by(*self.ordering)
+
+    def list(self, request, *args, **kwargs):
+        # An unknown business is a 404 like the detail view, not an empty page
+        get_object_or_404(Business, pk=self.kwargs['business_id'])
+        return super().list(request, *args, **kwargs)
+
+class BusinessClientsView(BusinessCollectionView):
+    model = Client
+    serializer_class = ClientSerializer
+
+class BusinessTeamMembersView(BusinessCollectionView):
+    model = TeamMember
+    serializer_class = TeamMemberSerializer
+
+class BusinessServicesListView(BusinessCollectionView):
+    model = Services
+    serializer_class = ServicesSerializer
+
+class BusinessPackagesView(BusinessCollectionView):
+    model = Packages
+    serializer_class = PackagesSerializer
+
+class BusinessCategoriesView(BusinessCollectionView):
+    model = ServiceCategory
+    serializer_class = ServiceCategorySerializer
+    ordering = ('path',)
+
+    def get_queryset(self):
+        # Only the roots are paginated, subcategories are nested under them
+        return super().get_queryset().filter(parent__isnull=True).prefetch_related('services')
+
+class BusinessAppointmentsView(BusinessCollectionView):
+    model = Appointment
+    serializer_class = AppointmentSerializer
+    ordering = ('appointment_date', 'appointment_time', 'id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        try:
+            start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else None
+            end_date = date.fromisoformat(params['end_date']) if params.get('end_date') else None
+        except ValueError:
+            raise ValidationError({'error': 'start_date and end_date must be YYYY-MM-DD'})
+        if start_date:
+            queryset = queryset.filter(appointment_date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(appointment_date__lte=end_date)
+        return queryset.prefetch_related('services', 'packages')
+
+# CSV and JSON Lines downloads of a whole collection, with the list's filters
+class BusinessClientsExportView(StreamingExportMixin, BusinessClientsView):
+    export_name = 'clients'
+
+class BusinessAppointmentsExportView(StreamingExportMixin, BusinessAppointmentsView):
+    export_name = 'appointments'
+
+class BusinessClientsImportView(APIView):
+    """
+    Import clients from a CSV or JSON file uploaded as `file`, or from a JSON
+    array body. Bad rows are skipped and listed in the report, see api.imports.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, business_id):
+        business = Business.objects.filter(pk=business_id).first()
+        if business is None:
+            raise NotFound('Business not found')
+        upload = request.FILES.get('file')
+        if upload is not None:
+            name = upload.name.lower()
+            if name.endswith('.csv') or upload.content_type == 'text/csv':
+                rows = read_csv(upload)
+            elif name.endswith('.json') or upload.content_type == 'application/json':
+                rows = read_json(upload)
+            else:
+                raise ParseError('Upload a .csv or .json file.')
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            raise ParseError('Upload a CSV or JSON file as "file", or send a JSON array of clients.')
+        return Response(ClientImport(business).run(rows))
+
+class BusinessBulkView(APIView):
+    """
+    Create, update and delete many rows of a collection in one transaction,
+    see api.bulk. 400 with per item errors, and nothing written, if any item
+    is invalid.
+    """
+    permission_classes = [AllowAny]
+    bulk_class = None
+
+    def post(self, request, business_id):
+        business = Business.objects.filter(pk=business_id).first()
+        if business is None:
+            raise NotFound('Business not found')
+        return Response(self.bulk_class(business).run(request.data))
+
+class BusinessServicesBulkView(BusinessBulkView):
+    bulk_class = ServicesBulk
+
+class BusinessPackagesBulkView(BusinessBulkView):
+    bulk_class = PackagesBulk
+
+class BusinessCategoriesBulkView(BusinessBulkView):
+    bulk_class = CategoriesBulk
+
+class BusinessTeamMembersBulkView(BusinessBulkView):
+    bulk_class = TeamMembersBulk
+
 # CRUD Views for other models (ServiceCategory, Services, Client, TeamMember, Appointment)
-class ServiceCategoryListCreateView(generics.ListCreateAPIView):
+class ServiceCategoryListCreateView(ConditionalGetMixin, BusinessResponseCacheMixin, generics.ListCreateAPIView):
     queryset = ServiceCategory.objects.all()
     serializer_class = ServiceCategorySerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
     
     def get_queryset(self):
         business_id = self.request.query_params.get('business_id')
+        queryset = ServiceCategory.objects.prefetch_related('services').order_by('path')
         if business_id:
-            return ServiceCategory.objects.filter(business_id=business_id)
-        return ServiceCategory.objects.all()
+            return queryset.filter(business_id=business_id)
+        return queryset
 
-class ServiceCategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = ServiceCategory.objects.all()
+class ServiceCategoryDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = ServiceCategory.objects.prefetch_related('services')
     serializer_class = ServiceCategorySerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
 
-class ServicesListCreateView(generics.ListCreateAPIView):
+    def get_scope_business_id(self):
+        # The subcategories and services are nested, so any write to the business counts
+        business_id = ServiceCategory.objects.filter(pk=self.kwargs['pk']).values_list('business_id', flat=True).first()
+        return str(business_id) if business_id else None
+
+class ServicesListCreateView(ConditionalGetMixin, BusinessResponseCacheMixin, generics.ListCreateAPIView):
     queryset = Services.objects.all()
     serializer_class = ServicesSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
@@ -143,12 +283,13 @@ class ServicesListCreateView(generics.ListCreateAPIView):
             queryset = queryset.filter(category_id=category_id)  # Filter services by category
         return queryset
 
-class ServicesDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ServicesDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Services.objects.all()
     serializer_class = ServicesSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
+    etag_from_row = True
     
-class PackagesListCreateView(generics.ListCreateAPIView):
+class PackagesListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Packages.objects.all()
     serializer_class = PackagesSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
@@ -159,12 +300,13 @@ class PackagesListCreateView(generics.ListCreateAPIView):
             return Packages.objects.filter(business_id=business_id)
         return Packages.objects.all()
 
-class PackagesDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PackagesDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Packages.objects.all()
     serializer_class = PackagesSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
+    etag_from_row = True
 
-class ClientListCreateView(generics.ListCreateAPIView):
+class ClientListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
@@ -175,10 +317,11 @@ class ClientListCreateView(generics.ListCreateAPIView):
             return Client.objects.filter(business_id=business_id)
         return Client.objects.all()
 
-class ClientDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ClientDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
+    etag_from_row = True
 
 def client_metadata_view(request):
     metadata = {}
@@ -197,7 +340,7 @@ def client_metadata_view(request):
     return JsonResponse(metadata)
 
 
-class TeamMemberListCreateView(generics.ListCreateAPIView):
+class TeamMemberListCreateView(ConditionalGetMixin, BusinessResponseCacheMixin, generics.ListCreateAPIView):
     queryset = TeamMember.objects.all()
     serializer_class = TeamMemberSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
@@ -209,14 +352,35 @@ class TeamMemberListCreateView(generics.ListCreateAPIView):
             return TeamMember.objects.filter(business_id=business_id)
         return TeamMember.objects.all()
 
-class TeamMemberDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TeamMemberDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = TeamMember.objects.all()
     serializer_class = TeamMemberSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
+    etag_from_row = True
+
+class AppointmentPagination(KeysetPagination):
+    ordering = ('appointment_date', 'appointment_time', 'id')
 
-class AppointmentListCreateView(generics.ListCreateAPIView):
+class AppointmentListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [AllowAny]
     serializer_class = AppointmentSerializer
+    pagination_class = AppointmentPagination
+
+    def get_fields(self):
+        """The fields named by ?fields=a,b,c, or None for all of them."""
+        fields = self.request.query_params.get('fields')
+        if self.request.method != 'GET' or not fields:
+            return None
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        readable = AppointmentSerializer.readable_fields()
+        unknown = [name for name in fields if name not in readable]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
         business_id = self.request.query_params.get('business_id')
@@ -226,17 +390,114 @@ class AppointmentListCreateView(generics.ListCreateAPIView):
         queryset = Appointment.objects.all()
         if business_id:
             queryset = queryset.filter(business_id=business_id)
-        if start_date and end_date:
-            queryset = queryset.filter(
-                appointment_date__range=[start_date, end_date]
-            )
+        if start_date:
+            queryset = queryset.filter(appointment_date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(appointment_date__lte=end_date)
+
+        # Only load the columns and relations the response renders
+        fields = self.get_fields()
+        many_to_many = [name for name in ('services', 'packages') if fields is None or name in fields]
+        if many_to_many:
+            queryset = queryset.prefetch_related(*many_to_many)
+        if fields is not None:
+            columns = {field.name for field in Appointment._meta.concrete_fields}
+            queryset = queryset.only(*AppointmentPagination.ordering, *(name for name in fields if name in columns))
         return queryset
 
 
-class AppointmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AppointmentDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
+    etag_from_row = True
+
+class CacheStatsView(APIView):
+    """Hit and miss counts of the per-business response cache in this process, for staff."""
+    authentication_classes = STAFF_AUTHENTICATION_CLASSES
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats.snapshot())
+
+class RequestStatsView(APIView):
+    """Percentiles of the sampled requests' timings per route in this process, for staff."""
+    authentication_classes = STAFF_AUTHENTICATION_CLASSES
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(route_stats.snapshot())
+
+class WorkingHoursListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    serializer_class = WorkingHoursSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        queryset = WorkingHours.objects.all()
+        business_id = self.request.query_params.get('business_id')
+        staff_id = self.request.query_params.get('staff_id')
+        if business_id:
+            queryset = queryset.filter(business_id=business_id)
+        if staff_id:
+            queryset = queryset.filter(staff_id=staff_id)
+        return queryset
+
+class WorkingHoursDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = WorkingHours.objects.all()
+    serializer_class = WorkingHoursSerializer
+    permission_classes = [AllowAny]
+    etag_from_row = True
+
+class AvailabilityView(APIView):
+    """
+    Free time of a salon's team, GET /api/availability?business_id=1
+
+    Optional: start_date (today by default), days (7 by default), staff_id
+    (comma separated), and either duration (minutes) or service_ids and
+    package_ids (comma separated) to list the start times where that fits.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            business_id = int(params['business_id'])
+            start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else timezone.localdate()
+            days = int(params.get('days', 7))
+            staff_ids = self.id_list(params.get('staff_id'))
+            service_ids = self.id_list(params.get('service_ids'))
+            package_ids = self.id_list(params.get('package_ids'))
+            duration = int(params['duration']) if params.get('duration') else None
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'business_id is required, start_date must be YYYY-MM-DD and the other parameters numbers'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        days = min(max(days, 1), settings.AVAILABILITY_MAX_DAYS)
+
+        if duration is None and (service_ids or package_ids):
+            services = Services.objects.filter(business_id=business_id, id__in=service_ids or [])
+            packages = Packages.objects.filter(business_id=business_id, id__in=package_ids or [])
+            if len(services) != len(set(service_ids or [])) or len(packages) != len(set(package_ids or [])):
+                return Response({'error': 'Unknown service or package for this business'}, status=status.HTTP_400_BAD_REQUEST)
+            duration = sum(service.duration_in_mins for service in services) + sum(
+                package.package_duration_in_mins for package in packages
+            )
+
+        return Response({
+            'business_id': business_id,
+            'start_date': start_date,
+            'days': days,
+            'slot_minutes': slot_minutes(),
+            'duration_mins': duration,
+            'staff': week_availability(business_id, start_date, days, staff_ids, duration),
+        })
+
+    @staticmethod
+    def id_list(value):
+        if not value:
+            return None
+        return [int(part) for part in value.split(',') if part.strip()]
     
     
     
@@ -248,7 +509,7 @@ from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponse , request
 from rest_framework import generics, status
 from .models import Customer, Business, Services, Appointment
-from .serializers import CustomerSerializer, ServicesSerializer, BusinessSerializer, AppointmentSerializer
+from .serializers import CustomerSerializer, ServicesSerializer, BusinessSerializer, AppointmentSerializer, BookingRequestSerializer
 from rest_framework.decorators import api_view, APIView
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_201_CREATED, HTTP_200_OK, HTTP_204_NO_CONTENT
@@ -260,15 +521,19 @@ from django.contrib.auth import authenticate
 from django.db.models import Q
 import time
 import random 
-from twilio.rest import Client
 import os 
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.generics import RetrieveAPIView, UpdateAPIView, DestroyAPIView
 from rest_framework.decorators import authentication_classes, permission_classes
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-import math
+from .geo import coordinate_index
+from rest_framework import serializers
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .authentication import CUSTOMER_AUTHENTICATION_CLASSES, is_revoked, revoke_token, tokens_for
 class CustomerView(generics.CreateAPIView) :
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
@@ -282,7 +547,7 @@ class CustomerListView(generics.ListAPIView) :
 class CustomerProfileView(RetrieveAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = CUSTOMER_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
@@ -297,7 +562,7 @@ class CustomerProfileView(RetrieveAPIView):
 class CustomerProfileUpdateView(UpdateAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = CUSTOMER_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
     def get_object(self):
         try:
@@ -314,49 +579,16 @@ from rest_framework.generics import DestroyAPIView
 class CustomerProfileDeleteView(DestroyAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = CUSTOMER_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
     def get_object(self):
         try:
             return self.request.user.customer_profile
         except Customer.DoesNotExist:
             raise NotFound(detail="Profile Not Found")
-def generate_otp() : 
-    return random.randint(1000, 9999)
-
-def send_otp(otp, phone_number) : 
-    account_sid = os.environ["TWILIO_ACCOUNT_SID"]
-    auth_token = os.environ["TWILIO_AUTH_TOKEN"]
-    client = Client(account_sid, auth_token)
-    message = client.messages.create(
-        body="Your Login OTP for wavvy application is {otp}. Welcome aboard!",
-        from_="+16206788254 ",
-        to=f"{phone_number}",
-    )
-
-    # print(message.body)
-    print(f"{otp} sent to number {phone_number}")
-
 def user_exists(phone_number = None, email = None):
     return Customer.objects.filter(phone_number=phone_number).exists() or Customer.objects.filter(email=email).exists()
 
-#TO CALCUATE DISTANCE 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c  
-    return distance
-
-
-
-
 @api_view(['POST']) 
 def login(request):
     if request.data["method"] == "phone" :
@@ -364,12 +596,8 @@ def login(request):
         if not phone_number : 
             return Response({"error" : "Phone number is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        #GENERATE 4 DIGIT OTP CODE 
-        otp = generate_otp()
-        print(otp)
-        cache.set(f"otp_{phone_number}", otp, timeout=300)
-        #send OTP through twilio 
-        send_otp(otp, phone_number)
+        otp = otp_service.issue(phone_number)
+        send_otp_sms(phone_number, otp)
         return Response({"message" : "otp sent to number ", }, status=status.HTTP_200_OK)
 
     elif request.data["method"] == "email":
@@ -384,7 +612,7 @@ def login(request):
             user = authenticate(request, username=email, password=password)
             if user is not None:
                 token, created = Token.objects.get_or_create(user=user)
-                return Response({"message": "Login successful", "token": token.key}, status=status.HTTP_200_OK)
+                return Response({"message": "Login successful", "token": token.key, **tokens_for(user)}, status=status.HTTP_200_OK)
             else:
                 return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -399,10 +627,10 @@ def verify_otp(request):
     otp = request.data.get("otp")
     if not phone_number or not otp:
         return Response({"error": "Phone number and OTP are required"}, status=status.HTTP_400_BAD_REQUEST)
-    cached_otp = cache.get(f"otp_{phone_number}")
-    if cached_otp and str(cached_otp) == str(otp):
-        if user_exists(phone_number=phone_number) :
-            return Response({"message": "Verification successful"}, status=status.HTTP_202_ACCEPTED)
+    if otp_service.verify(phone_number, otp) == VERIFIED:
+        user = User.objects.filter(customer_profile__phone_number=phone_number).first()
+        if user is not None :
+            return Response({"message": "Verification successful", **tokens_for(user)}, status=status.HTTP_202_ACCEPTED)
         else : 
             return Response({"message" : "New User, proceed to signup"})
     else:
@@ -419,14 +647,11 @@ def signup(request) :
             user = User.objects.filter(customer_profile__phone_number=phone_number).first()
             token, created = Token.objects.get_or_create(user=user)
             return Response(
-                {"message": "User already exists, logged in", "token": token.key},
+                {"message": "User already exists, logged in", "token": token.key, **tokens_for(user)},
                 status=status.HTTP_200_OK
             )
-        otp = generate_otp()
-        print(otp)
-        cache.set(f"otp_{phone_number}", otp, timeout=300)
-        #send OTP through twilio 
-        send_otp(otp, phone_number)
+        otp = otp_service.issue(phone_number)
+        send_otp_sms(phone_number, otp)
         return Response({"message" : "otp sent to number ", }, status=status.HTTP_200_OK)  
     elif request.data["method"] == "email" : 
         email = request.data["email"]
@@ -439,7 +664,7 @@ def signup(request) :
             user = User.objects.filter(customer_profile__email__iexact=email).first()
             token, created = Token.objects.get_or_create(user=user)
             return Response(
-                {"message": "User already exists, logged in", "token": token.key},
+                {"message": "User already exists, logged in", "token": token.key, **tokens_for(user)},
                 status=status.HTTP_200_OK
             )
         return Response({"email" : email, "password" : password, "message" : "new user proceed to signup"}, status=status.HTTP_200_OK)
@@ -456,12 +681,45 @@ def signup_create_user(request):
         )
         customer = serializer.save(user=user)
         token = Token.objects.create(user=user)
-        return Response({"token" : token.key, "customer" : serializer.data})
+        return Response({"token" : token.key, **tokens_for(user, customer), "customer" : serializer.data})
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh_token(request):
+    try:
+        refresh = RefreshToken(request.data.get("refresh"))
+    except TokenError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+    if is_revoked(refresh):
+        return Response({"error": "Token has been revoked"}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({"access": str(refresh.access_token)})
+
+
+@api_view(['POST'])
+@authentication_classes(CUSTOMER_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def logout(request):
+    # The access token of the request, and the refresh token if one is sent
+    if isinstance(request.auth, AccessToken):
+        revoke_token(request.auth)
+    elif isinstance(request.auth, Token):
+        request.auth.delete()
+    if request.data.get("refresh"):
+        try:
+            refresh = RefreshToken(request.data["refresh"])
+        except TokenError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if refresh["user_id"] != request.user.id:
+            return Response({"error": "Not your token"}, status=status.HTTP_400_BAD_REQUEST)
+        revoke_token(refresh)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes([SessionAuthentication, *CUSTOMER_AUTHENTICATION_CLASSES])
 @permission_classes([IsAuthenticated])
 def test_token(request):
     return Response({"passed for {}".format(request.user)})
@@ -469,24 +727,47 @@ def test_token(request):
 
 
 ### -----LOCATION API-------
+SALON_SEARCH_DEFAULT_RADIUS_KM = 10
+SALON_SEARCH_MAX_RADIUS_KM = 100
+SALON_SEARCH_DEFAULT_LIMIT = 20
+SALON_SEARCH_MAX_LIMIT = 100
+
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes(CUSTOMER_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 def get_Business_by_location(request):
-    latitude = float(request.query_params.get('latitude'))
-    longitude = float(request.query_params.get('longitude'))
-    
-    Business = Business.objects.all()
-    nearby_Business = []
-
-    for Business in Business:
-        distance = haversine(latitude, longitude, Business.latitude, Business.longitude)
-        if distance <= 10:  
-            nearby_Business.append({
-                'name': Business.name,
-                'address': Business.address,
-                'distance': distance
-            })
+    try:
+        latitude = float(request.query_params['latitude'])
+        longitude = float(request.query_params['longitude'])
+        radius = float(request.query_params.get('radius', SALON_SEARCH_DEFAULT_RADIUS_KM))
+        limit = int(request.query_params.get('limit', SALON_SEARCH_DEFAULT_LIMIT))
+    except (KeyError, ValueError):
+        return Response({"error": "latitude and longitude are required, radius and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    # float() also reads inf and nan, which the cell and distance maths cannot take
+    if not all(math.isfinite(value) for value in (latitude, longitude, radius)):
+        return Response({"error": "latitude, longitude and radius must be finite numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return Response({"error": "latitude must be between -90 and 90 and longitude between -180 and 180"}, status=status.HTTP_400_BAD_REQUEST)
+    if radius <= 0 or limit <= 0:
+        return Response({"error": "radius and limit must be positive"}, status=status.HTTP_400_BAD_REQUEST)
+
+    radius = min(radius, SALON_SEARCH_MAX_RADIUS_KM)
+    limit = min(limit, SALON_SEARCH_MAX_LIMIT)
+    nearest = coordinate_index.nearest(latitude, longitude, radius, limit)
+    businesses = Business.objects.in_bulk([business_id for business_id, _ in nearest])
+    nearby_Business = [
+        {
+            'id': business.id,
+            'salon_name': business.salon_name,
+            'salon_description': business.salon_description,
+            'latitude': business.latitude,
+            'longitude': business.longitude,
+            'distance': distance,
+        }
+        for business_id, distance in nearest
+        # The index can briefly list a salon another worker just deleted
+        if (business := businesses.get(business_id)) is not None
+    ]
 
     return Response(nearby_Business)
 
@@ -519,23 +800,29 @@ class ServiceFilterView(APIView):
 
 ###Business DETAILS API 
 
-class BusinessDetailView(APIView):
+class SalonDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     permission_classes = [AllowAny]
+    serializer_class = BusinessSerializer
+    lookup_field = 'id'
+    lookup_url_kwarg = 'salon_id'
 
-    def get(self, request, Business_id):
-        Business = get_object_or_404(Business, id=Business_id)
-        serializer = BusinessSerializer(Business)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return BusinessSerializer.setup_eager_loading(Business.objects.all())
+
+    def get_scope_business_id(self):
+        return str(self.kwargs['salon_id'])
 
 # View for fetching services for a Business
-class BusinessServicesView(APIView):
+class BusinessServicesView(ConditionalGetMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    serializer_class = ServicesSerializer
 
-    def get(self, request, Business_id):
-        Business = get_object_or_404(Business, id=Business_id)
-        services = Business.business_services.all() 
-        serializer = ServicesSerializer(services, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        business = get_object_or_404(Business, id=self.kwargs['salon_id'])
+        return business.business_services.all()
+
+    def get_scope_business_id(self):
+        return str(self.kwargs['salon_id'])
 
 
 
@@ -543,52 +830,210 @@ class BusinessServicesView(APIView):
 
 
 # POST /Appointments/create
-class AppointmentCreateView(APIView):
-    authentication_classes = [TokenAuthentication]
+class BookingRequestMixin:
+    """
+    Reads a customer booking request: business_id, service_ids and/or
+    package_ids, appointment_date, appointment_time and an optional staff_id.
+    """
+    authentication_classes = CUSTOMER_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        user = request.user
-        Business_id = request.data.get('Business_id')
-        service_id = request.data.get('service_id')
-        appointment_date = request.data.get('appointment_date')
-
-        # Validate input
-        if not Business_id or not service_id or not appointment_date:
-            return Response({"error": "Business_id, service_id, and appointment_date are required."}, status=HTTP_400_BAD_REQUEST)
-
-        Business = get_object_or_404(Business, id=Business_id)
-        service = get_object_or_404(Services, id=service_id)
-
-        # Create Appointment
-        Appointment = Appointment.objects.create(
-            user=user,
-            Business=Business,
-            service=service,
+    def read_booking(self, data):
+        """
+        The unsaved appointment with its totals, its services and packages,
+        and the ids of the staff members to try in order: the requested one,
+        or everyone whose free time covers the slot.
+        """
+        booking = BookingRequestSerializer(data=data)
+        booking.is_valid(raise_exception=True)
+        business_id = booking.validated_data['business_id']
+        service_ids = booking.validated_data.get('service_ids') or []
+        package_ids = booking.validated_data.get('package_ids') or []
+        staff_id = booking.validated_data.get('staff_id')
+        appointment_date = booking.validated_data['appointment_date']
+        appointment_time = booking.validated_data['appointment_time']
+
+        business = get_object_or_404(Business, id=business_id)
+        services = list(Services.objects.filter(business=business, id__in=service_ids))
+        packages = list(Packages.objects.filter(business=business, id__in=package_ids))
+        if len(services) != len(set(service_ids)) or len(packages) != len(set(package_ids)):
+            raise ParseError({"error": "Unknown service or package for this salon."})
+
+        appointment = Appointment(
+            business=business,
             appointment_date=appointment_date,
-            total_price=service.price
+            appointment_time=appointment_time,
         )
-        serializer = AppointmentSerializer(Appointment)
-        return Response(serializer.data, status=HTTP_201_CREATED)
+        appointment.calculate_totals(services, packages)
+        if staff_id:
+            if not TeamMember.objects.filter(business=business, id=staff_id).exists():
+                raise ParseError({"error": "Unknown staff member for this salon."})
+            staff_ids = [staff_id]
+        else:
+            staff_ids = list(TeamMember.objects.filter(business=business).order_by('id').values_list('id', flat=True))
+        needed = time_span(appointment.appointment_time, appointment.end_time)
+        free = free_bitmaps(business.id, staff_ids, [appointment_date], owner=self.request.user.id)
+        candidates = [staff_id for staff_id in staff_ids if free[staff_id][appointment_date] & needed == needed]
+        if staff_id and not candidates:
+            raise BookingConflict()
+        return appointment, services, packages, candidates
+
+    def get_client(self, business):
+        """The salon's client record of the customer, created on their first booking."""
+        try:
+            customer = self.request.user.customer_profile
+        except Customer.DoesNotExist:
+            raise NotFound(detail="Profile Not Found")
+        client = Client.objects.filter(business=business).filter(
+            Q(client_phone=customer.phone_number) | Q(client_email=customer.email)
+        ).first()
+        if client is not None:
+            return client
+        try:
+            with transaction.atomic():
+                return Client.objects.create(
+                    business=business,
+                    client_name=customer.name,
+                    client_type="Regular",
+                    client_email=customer.email,
+                    client_phone=customer.phone_number,
+                    client_dob=customer.date_of_birth,
+                    client_gender="Rather Not to Say",
+                )
+        except IntegrityError:
+            # Phone numbers and emails are unique across all salons' clients
+            raise ParseError({"error": "Your phone number or email is registered to a client of another salon."})
+
+
+class AppointmentCreateView(BookingRequestMixin, APIView):
+    """
+    Book services and packages at a salon for the signed in customer. Without
+    a staff_id the first team member who works then and is free gets it.
+    """
+
+    def post(self, request):
+        appointment, services, packages, candidates = self.read_booking(request.data)
+        appointment.client_appointments = self.get_client(appointment.business)
+        for candidate in candidates:
+            appointment.staff_id = candidate
+            try:
+                save_appointment(appointment, services, packages)
+            except BookingConflict:
+                continue
+            return Response(AppointmentSerializer(appointment).data, status=HTTP_201_CREATED)
+        raise BookingConflict("No staff member is free at that time.")
+
+
+class SlotHoldView(BookingRequestMixin, APIView):
+    """
+    POST bookings/hold takes the same fields as bookings/create plus an
+    optional `minutes`, and holds the slot for the customer until it is
+    confirmed, released or expires. Other customers do not see held slots
+    in the availability search and cannot hold or book them.
+    """
+
+    def post(self, request):
+        minutes = self.read_minutes(request.data)
+        appointment, services, packages, candidates = self.read_booking(request.data)
+        slots = list(bits(time_span(appointment.appointment_time, appointment.end_time)))
+        for candidate in candidates:
+            hold = slot_holds.hold(
+                request.user.id,
+                candidate,
+                appointment.appointment_date,
+                slots,
+                minutes=minutes,
+                business_id=appointment.business_id,
+                appointment_time=appointment.appointment_time.isoformat(),
+                service_ids=[service.id for service in services],
+                package_ids=[package.id for package in packages],
+            )
+            if hold is not None:
+                return Response(self.hold_data(hold), status=HTTP_201_CREATED)
+        raise BookingConflict("No staff member is free at that time.")
+
+    @staticmethod
+    def read_minutes(data):
+        field = serializers.IntegerField(min_value=1, max_value=slot_holds.max_minutes, allow_null=True)
+        try:
+            return field.run_validation(data.get('minutes'))
+        except ValidationError as exc:
+            raise ValidationError({'minutes': exc.detail})
+
+    @staticmethod
+    def hold_data(hold):
+        return {
+            'hold_id': hold['id'],
+            'business_id': hold['business_id'],
+            'staff_id': hold['staff_id'],
+            'appointment_date': hold['date'],
+            'appointment_time': hold['appointment_time'],
+            'service_ids': hold['service_ids'],
+            'package_ids': hold['package_ids'],
+            'expires_at': hold['expires_at'],
+        }
+
+
+class SlotHoldDetailView(BookingRequestMixin, APIView):
+    def get_hold(self, hold_id):
+        hold = slot_holds.get(hold_id)
+        if hold is None or hold['owner'] != self.request.user.id:
+            raise NotFound(detail="Hold not found or expired")
+        return hold
+
+    def get(self, request, hold_id):
+        return Response(SlotHoldView.hold_data(self.get_hold(hold_id)))
+
+    def delete(self, request, hold_id):
+        slot_holds.release(self.get_hold(hold_id))
+        return Response(status=HTTP_204_NO_CONTENT)
+
+
+class SlotHoldConfirmView(SlotHoldDetailView):
+    def post(self, request, hold_id):
+        hold = self.get_hold(hold_id)
+        business = get_object_or_404(Business, id=hold['business_id'])
+        services = list(Services.objects.filter(business=business, id__in=hold['service_ids']))
+        packages = list(Packages.objects.filter(business=business, id__in=hold['package_ids']))
+        appointment = Appointment(
+            business=business,
+            client_appointments=self.get_client(business),
+            staff_id=hold['staff_id'],
+            appointment_date=date.fromisoformat(hold['date']),
+            appointment_time=serializers.TimeField().to_internal_value(hold['appointment_time']),
+        )
+        save_appointment(appointment, services, packages)
+        slot_holds.release(hold)
+        return Response(AppointmentSerializer(appointment).data, status=HTTP_201_CREATED)
+
+def customer_appointments(customer):
+    """The appointments of the salon client records made for a customer, see get_client()."""
+    return Appointment.objects.filter(
+        Q(client_appointments__client_phone=customer.phone_number) | Q(client_appointments__client_email=customer.email)
+    )
 
 # DELETE /Appointments/{AppointmentId}/cancel
 class AppointmentCancelView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = CUSTOMER_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
-    def delete(self, request, Appointment_id):
-        Appointment = get_object_or_404(Appointment, id=Appointment_id, user=request.user)
+    def delete(self, request, booking_id):
+        try:
+            customer = request.user.customer_profile
+        except Customer.DoesNotExist:
+            raise NotFound(detail="Profile Not Found")
+        appointment = get_object_or_404(customer_appointments(customer), id=booking_id)
 
-        if Appointment.status == "completed":
+        if appointment.status == "Completed":
             return Response({"error": "Cannot cancel a completed Appointment."}, status=HTTP_400_BAD_REQUEST)
 
-        Appointment.status = "canceled"
-        Appointment.save()
+        appointment.status = "Cancelled"
+        appointment.save(update_fields=['status', 'updated_at'])
         return Response({"message": "Appointment canceled successfully."}, status=HTTP_200_OK)
 
 # GET /Appointments/status?userId={userId}
 class AppointmentStatusView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = CUSTOMER_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -596,6 +1041,10 @@ class AppointmentStatusView(APIView):
         if not user_id or int(user_id) != request.user.id:
             return Response({"error": "Invalid or unauthorized userId."}, status=HTTP_400_BAD_REQUEST)
 
-        Appointments = Appointment.objects.filter(user=request.user)
+        try:
+            customer = request.user.customer_profile
+        except Customer.DoesNotExist:
+            raise NotFound(detail="Profile Not Found")
+        Appointments = customer_appointments(customer).prefetch_related('services', 'packages')
         serializer = AppointmentSerializer(Appointments, many=True)
-        return Response(serializer.data, status=HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=HTTP_200_OK)
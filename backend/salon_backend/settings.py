@@ -55,6 +55,16 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (),
     'DEFAULT_PERMISSION_CLASSES': (),
+    # orjson when installed, DRF's JSON classes otherwise (see api.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 from datetime import timedelta
@@ -66,6 +76,8 @@ SIMPLE_JWT = {
 
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole stack
+    "api.instrumentation.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -101,12 +113,75 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "salon_backend.wsgi.application"
 
+# Seconds before a worker rebuilds its in-memory salon coordinate index
+GEO_INDEX_MAX_AGE = 300
+
+# Availability grid (see api/availability.py)
+AVAILABILITY_SLOT_MINUTES = 15  # must divide 60
+AVAILABILITY_MAX_DAYS = 14
+# Shift of team members without any WorkingHours rows
+DEFAULT_WORKING_HOURS = ("09:00", "21:00")
+# Customers can hold a slot while checking out (see api/holds.py)
+SLOT_HOLD_MINUTES = 5
+SLOT_HOLD_MAX_MINUTES = 15
+
+# Seconds a cached per-business GET response is kept (see api/cache.py). Writes
+# invalidate a business's responses straight away, this only bounds memory.
+RESPONSE_CACHE_TIMEOUT = 600
+
+# Seconds an opaque API token's user and customer profile are cached (see
+# api/authentication.py). Deleting the token or saving the user or customer
+# drops the entry straight away.
+AUTH_CACHE_TIMEOUT = 300
+
+# Share of requests whose queries, DB, serializer and total time and size are
+# measured, sent as Server-Timing and logged as JSON at INFO to the
+# 'api.requests' logger (give it a handler in LOGGING to keep them), and the
+# number of samples per route kept for the request-stats/ percentiles (see
+# api/instrumentation.py)
+REQUEST_METRICS_SAMPLE_RATE = 0.1
+REQUEST_METRICS_WINDOW = 1000
+
 from decouple import config
 
 TWILIO_ACCOUNT_SID = config("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = config("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = config("TWILIO_PHONE_NUMBER")
 
+# OTP and other SMS are sent by background threads (see api/sms.py).
+# api.sms.ConsoleGateway and api.sms.LocalGateway send nothing.
+SMS_GATEWAY = config("SMS_GATEWAY", default="api.sms.TwilioGateway")
+SMS_GATEWAY_TIMEOUT = 10  # seconds per HTTP request
+SMS_BATCH_CONCURRENCY = 8
+
+# Live OTPs are kept in the cache (see api/otp.py), the OTP table is an audit log
+OTP_TTL_SECONDS = 300
+OTP_MAX_ATTEMPTS = 5
+OTP_AUDIT_LOG = True
+OTP_AUDIT_BATCH_SIZE = 100
+OTP_AUDIT_FLUSH_INTERVAL = 60  # seconds
+OTP_AUDIT_RETENTION_DAYS = 30  # see the purge_otps command
+
+# OTPs and other short lived state must be shared between workers in
+# production, so point REDIS_URL at a Redis server there
+REDIS_URL = config("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+SMS_DISPATCH_WORKERS = 2
+SMS_MAX_RETRIES = 3
+SMS_RETRY_BACKOFF = 1.0  # seconds, doubled on every retry
+
 
 # Database
 # MongoEngine is used instead of Django's default database
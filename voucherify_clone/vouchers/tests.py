@@ -1,3 +1,144 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from rest_framework.test import APIClient
+
+from . import urls as voucher_urls
+from .models import Redemption, Voucher
+
+
+def seed_vouchers(prefix, vouchers, redemptions_per_voucher, users=20):
+    """`vouchers` vouchers, each redeemed `redemptions_per_voucher` times, inserted in bulk."""
+    people = User.objects.bulk_create(User(username=f"{prefix}-user-{i}") for i in range(users))
+    expires = date.today() + timedelta(days=30)
+    rows = Voucher.objects.bulk_create(
+        Voucher(
+            code=f"{prefix}-{i}",
+            discount_type="percent" if i % 2 else "fixed",
+            discount_value=10 + i % 40,
+            expiration_date=expires,
+        )
+        for i in range(vouchers)
+    )
+    Redemption.objects.bulk_create(
+        Redemption(voucher=voucher, user=people[(i + j) % users])
+        for i, voucher in enumerate(rows)
+        for j in range(redemptions_per_voucher)
+    )
+    return {"voucher": rows[0], "user": people[0], "prefix": prefix}
+
+
+def routes(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from routes(pattern.url_patterns)
+        elif "format" not in pattern.pattern.regex.groupindex:
+            yield str(pattern.pattern)
+
+
+class EndpointQueryCountTests(TestCase):
+    """
+    Every route of vouchers/urls.py with an upper bound on its queries,
+    checked against a few vouchers and against thousands of vouchers with
+    tens of thousands of redemptions. The count has to be the same for both.
+    """
+
+    # route, method, bound
+    ENDPOINTS = [
+        ("^$", "get", 0),
+        ("^vouchers/$", "get", 1),
+        ("^vouchers/$", "post", 2),
+        ("^vouchers/(?P<pk>[^/.]+)/$", "get", 1),
+        ("^vouchers/(?P<pk>[^/.]+)/$", "patch", 2),
+        ("^vouchers/(?P<pk>[^/.]+)/$", "delete", 3),
+        ("redeem/<str:voucher_code>/", "post", 2),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sizes = {
+            "small": seed_vouchers("small", vouchers=5, redemptions_per_voucher=2),
+            "large": seed_vouchers("large", vouchers=2000, redemptions_per_voucher=10),
+        }
+
+    def request(self, route, method, seeded):
+        voucher = seeded["voucher"]
+        if route == "^$":
+            return "/api/", None
+        if route == "^vouchers/$" and method == "post":
+            data = {"code": f"{seeded['prefix']}-new", "discount_type": "fixed", "discount_value": "5.00", "expiration_date": "2030-01-01"}
+            return "/api/vouchers/", data
+        if route == "^vouchers/$":
+            return "/api/vouchers/", None
+        if route == "redeem/<str:voucher_code>/":
+            return f"/api/redeem/{voucher.code}/", None
+        return f"/api/vouchers/{voucher.id}/", {"discount_value": "15.00"} if method == "patch" else None
+
+    def measure(self, route, method, seeded):
+        api = APIClient()
+        api.force_authenticate(seeded["user"])
+        with transaction.atomic():
+            path, data = self.request(route, method, seeded)
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(api, method)(path, data, format="json")
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {path}: {response.content[:200]}")
+        return [query["sql"] for query in queries.captured_queries]
+
+    def test_query_counts_are_bounded_and_constant(self):
+        for route, method, bound in self.ENDPOINTS:
+            with self.subTest(route=route, method=method):
+                small = self.measure(route, method, self.sizes["small"])
+                large = self.measure(route, method, self.sizes["large"])
+                self.assertLessEqual(len(large), bound, "\n".join(large))
+                self.assertEqual(len(small), len(large), "\n".join(large))
+
+    def test_every_route_is_measured(self):
+        self.assertEqual(set(routes(voucher_urls.urlpatterns)), {route for route, _, _ in self.ENDPOINTS})
+
+
+class SeedBenchmarkDataTests(TestCase):
+    options = {"users": 5, "vouchers": 7, "redemptions": 30, "start_date": date(2025, 1, 6), "batch_size": 4}
+
+    def seed(self, **options):
+        out = StringIO()
+        call_command("seed_benchmark_data", stdout=out, **{**self.options, **options})
+        return out.getvalue()
+
+    def snapshot(self):
+        return [
+            list(Voucher.objects.order_by("id").values_list("code", "discount_type", "discount_value", "expiration_date")),
+            list(Redemption.objects.order_by("id").values_list("voucher__code", "user__username")),
+        ]
+
+    def test_volumes(self):
+        output = self.seed()
+
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Voucher.objects.count(), 7)
+        self.assertEqual(Redemption.objects.count(), 30)
+        self.assertIn("7 vouchers, 30 redemptions", output)
+        for expires in Voucher.objects.values_list("expiration_date", flat=True):
+            self.assertTrue(date(2025, 2, 5) <= expires < date(2026, 1, 6))
+
+    def test_same_seed_same_data(self):
+        snapshots = []
+        for seed in (3, 3, 4):
+            with transaction.atomic():
+                self.seed(seed=seed)
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertNotEqual(snapshots[0], snapshots[2])
 
-# Create your tests here.
+    def test_second_run_adds_rows(self):
+        self.seed()
+        self.seed()
+        self.assertEqual(Voucher.objects.count(), 14)
+        self.assertEqual(Redemption.objects.count(), 60)